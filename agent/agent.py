@@ -1,11 +1,24 @@
 from uagents import Agent, Bureau, Context, Model, Protocol
 from singer import generate_song
+from suno import generate_audio, poll_until_complete
+from client import get_http_client, close_http_client
+from local_provider import local_pool
+from jobs import JobQueue
+from lyric_buffer import LyricBuffer
+from model_stats import model_stats
+from metrics import metrics
+from log import get_logger
+from batch import BatchOrchestrator, BATCH_MAX_SONGS
 from dotenv import load_dotenv
+from typing import Dict, List
 import os
-import json
+import sys
 import time
-import requests
+import httpx
 import sentry_sdk
+sys.path.insert(0, os.path.abspath("../common"))
+from stations import STATIONS, get_random_station
+import tracing
 ENV = os.getenv("ENV", "dev")
 
 if ENV == "production":
@@ -13,12 +26,23 @@ if ENV == "production":
 
 load_dotenv()
 
+# Deployment mode: "all" runs both agents in one process; "lyricist" or "singer" runs
+# just that agent so each can be scaled to its own replicas.
+AGENT_ROLE = os.getenv("AGENT_ROLE", "all").lower()
+AGENT_PORT = int(os.getenv("AGENT_PORT", "8258"))
+AGENT_ENDPOINT = os.getenv("AGENT_ENDPOINT", "https://rhythmiqagent.255labs.xyz/submit")
+LYRICIST_HOST = os.getenv("LYRICIST_HOST", "http://localhost:8259")  # Where a singer-only process asks for lyrics
+if AGENT_ROLE not in ("all", "lyricist", "singer"):
+    raise ValueError(f"Unsupported AGENT_ROLE '{AGENT_ROLE}'. Supported roles are 'all', 'lyricist' and 'singer'.")
+tracing.configure(f"rhythmiq-agent-{AGENT_ROLE}")
+
+log = get_logger("agent")
+
 lyricist_seed = os.getenv("FET_LYRICIST_SEED", "RhythmIQ Lyricist seed phrase")
 mailbox_key = os.getenv("FET_LYRICIST_MAILBOX", "RhythmIQ Lyricist mail")
 # Create a single agent - RhythmIQ Lyricist
 lyricist = Agent(name="RhythmIQ Lyricist", seed=lyricist_seed)#, mailbox=f"{mailbox_key}@https://agentverse.ai")
 
-fox_api_key = os.getenv("FOX_API_KEY")
 singer_seed = os.getenv("FET_SINGER_SEED", "RhythmIQ Singer seed phrase")
 singer = Agent(name="RhythmIQ Singer", seed=singer_seed)
 
@@ -34,19 +58,45 @@ class Response(Model):
     agent_address: str
 
 # Define the models
+# traceparent fields carry the caller's trace context; uagents REST handlers cannot read headers.
+# generation_uuid is set on the handler spans, since attributes do not cross processes with the traceparent.
 class WriteSongRequest(Model):
     instruction: str
     artist_name: str
     model_name: str
     station: str
+    traceparent: str = ""
+    generation_uuid: str = ""
 
 class WriteSongResponse(Model):
     title: str
     lyrics: str
     style: str
     negative_style: str
-
-GenerateAudioRequest = WriteSongResponse
+    model_name: str = ""
+    artist_name: str = ""
+
+class LyricBufferStatsResponse(Model):
+    depth: int
+    stations: Dict[str, dict]
+    hits: int
+    misses: int
+    hit_rate: float
+    refill_failures: int
+    served_age_avg: float
+
+class ModelStatsResponse(Model):
+    models: Dict[str, Dict[str, float]]
+
+class MetricsResponse(Model):
+    uptime: float
+    counters: Dict[str, float]
+    gauges: Dict[str, float]
+    histograms: Dict[str, Dict[str, float]]
+
+class GenerateAudioRequest(WriteSongResponse):
+    traceparent: str = ""
+    generation_uuid: str = ""
 
 class GenerateAudioResponse(Model):
     status: str
@@ -60,6 +110,70 @@ class GenerateAudioResponse(Model):
     video_url_2: str
     image_large_url_2: str
 
+class JobSubmitResponse(Model):
+    job_id: str
+    status: str
+
+class SingJobRequest(GenerateAudioRequest):
+    song_ids: List[str] = []
+
+class JobStatusRequest(Model):
+    job_id: str
+
+class JobStatusResponse(GenerateAudioResponse):
+    job_id: str
+    song_ids: List[str] = []
+
+class JobBatchStatusRequest(Model):
+    job_ids: List[str]
+
+class JobBatchStatusResponse(Model):
+    jobs: List[JobStatusResponse]
+
+class OrchestrateBatchRequest(Model):
+    count: int = 0
+    stations: Dict[str, int] = {}
+
+class OrchestrateBatchResponse(Model):
+    batch_id: str
+    status: str
+    total: int
+    error: str = ""
+
+class BatchStatusRequest(Model):
+    batch_id: str
+    after: int = 0
+
+class BatchSongResult(GenerateAudioResponse):
+    index: int
+    station: str
+    model_name: str
+    artist_name: str
+    title: str
+    lyrics: str
+    style: str
+    negative_style: str
+
+class BatchStatusResponse(Model):
+    batch_id: str
+    status: str
+    total: int
+    completed: int
+    failed: int
+    songs: List[BatchSongResult]
+    next_cursor: int
+
+EMPTY_MEDIA = {
+    "audio_url_1": "",
+    "image_url_1": "",
+    "video_url_1": "",
+    "image_large_url_1": "",
+    "audio_url_2": "",
+    "image_url_2": "",
+    "video_url_2": "",
+    "image_large_url_2": ""
+}
+
 # Define protocol
 proto = Protocol(name="SongwriterProtocol", version="1.0")
 
@@ -70,7 +184,7 @@ async def handle_song_request(ctx: Context, sender: str, msg: WriteSongRequest):
     model_name = msg.model_name
     artist = msg.artist_name
     station = msg.station
-    song_data = generate_song(instruction, model_name, artist, station)
+    song_data = await generate_song(instruction, model_name, artist, station)
 
     if song_data:
         response = WriteSongResponse(
@@ -81,127 +195,87 @@ async def handle_song_request(ctx: Context, sender: str, msg: WriteSongRequest):
         )
         await ctx.send(sender, response)
     else:
-        ctx.logger.error("Failed to generate song.")
+        log.error("protocol.no_song", sender=sender, station=station)
 
 
 # Include protocol in the lyricist agent
 lyricist.include(proto)
 
 
+# Pre-written songs per station, refilled in the background
+lyric_buffer = LyricBuffer(generate_song)
+
+@lyricist.on_event("startup")
+async def start_lyric_buffer(ctx: Context):
+    lyric_buffer.start()
+
+@lyricist.on_event("shutdown")
+async def stop_lyric_buffer(ctx: Context):
+    await lyric_buffer.stop()
+    await close_http_client()
+    await local_pool.close()
+    await tracing.shutdown()
+
 @lyricist.on_rest_post("/write_song", WriteSongRequest, WriteSongResponse)
 async def handle_post(ctx: Context, req: WriteSongRequest) -> WriteSongResponse:
-    ctx.logger.info("Writing song")
     instruction = req.instruction
     model_name = req.model_name
     artist = req.artist_name
     station = req.station
-    song_data = generate_song(instruction, model_name, artist, station)
+    with tracing.start_span("write_song", traceparent=req.traceparent, generation_uuid=req.generation_uuid or None,
+                            station=station, model_name=model_name) as span:
+        # Custom instructions always need a fresh song; otherwise serve a pre-written one
+        buffered = None if instruction else lyric_buffer.take(station, model_name)
+        span.set_attribute("buffered", bool(buffered))
+        if buffered:
+            log.info("lyric_buffer.served", station=station, model=buffered.model_name, age=round(buffered.age))
+            song_data = buffered.song_data
+            model_name = buffered.model_name
+            artist = buffered.artist
+        else:
+            log.info("song.writing", station=station, model=model_name)
+            song_data = await generate_song(instruction, model_name, artist, station)
+            # A hedged or failed-over request may have been answered by another model
+            model_name = song_data.get('model_name', model_name)
+            artist = song_data.get('artist_name', artist)
     return WriteSongResponse(
         title=song_data.get('title', ''),
         lyrics=song_data.get('lyrics', ''),
         style=song_data.get('style', ''),
-        negative_style=song_data.get('negative_style', '')
+        negative_style=song_data.get('negative_style', ''),
+        model_name=model_name,
+        artist_name=artist
     )
 
-# Define protocol for Singer agent
-audio_proto = Protocol(name="AudioGenerationProtocol", version="1.0")
+@lyricist.on_rest_get("/lyric_buffer", LyricBufferStatsResponse)
+async def handle_lyric_buffer_stats(ctx: Context) -> LyricBufferStatsResponse:
+    return LyricBufferStatsResponse(**lyric_buffer.stats())
 
-# Function to generate audio using the API
-def generate_audio(title, lyrics, style, negative_style):
-
-    headers = {
-        'Content-Type': 'application/json',
-        'api-key': fox_api_key
-    }
-    data = {
-        'title': title,
-        'tags': style,
-        'generation_type': 'TEXT',
-        'prompt': lyrics,
-        'negative_tags': negative_style,
-        'mv': 'chirp-v4'
-    }
-    response = requests.post('https://api.sunoaiapi.com/api/v1/gateway/generate/music', json=data, headers=headers)
-    print("response", response.status_code, response.text)
-    if response.status_code == 200:
-        resp_data = response.json()
-        if resp_data['code'] == 0:
-            song_ids = [item['song_id'] for item in resp_data['data']]
-            return song_ids
-    return None
-
-def poll_for_audio(song_ids):
-    headers = {
-        'Content-Type': 'application/json',
-        'api-key': fox_api_key  # Make sure fox_api_key is defined elsewhere
-    }
-    params = {
-        'ids': ','.join(song_ids)
-    }
-    
-    max_attempts = 3   # Number of times to try
-    delay_seconds = 1  # Delay in seconds between attempts
+@lyricist.on_rest_get("/model_stats", ModelStatsResponse)
+async def handle_model_stats(ctx: Context) -> ModelStatsResponse:
+    return ModelStatsResponse(models=model_stats.summary())
 
-    for attempt in range(1, max_attempts + 1):
-        try:
-            response = requests.get('https://api.sunoaiapi.com/api/v1/gateway/query',
-                                    params=params, headers=headers)
-            #print(f"Polling attempt {attempt}, response: {response.status_code}")
-            response_data = response.json()
-            #print(json.dumps(response_data, indent=2))
-            
-            if response.status_code == 200:
-                return response_data
-            else:
-                print(f"Attempt {attempt} failed with status code {response.status_code}.")
-        except Exception as e:
-            print(f"Attempt {attempt} encountered an exception: {e}")
-        
-        # Only sleep if there are more attempts to try
-        if attempt < max_attempts:
-            print(f"Waiting for {delay_seconds} seconds before retrying...")
-            time.sleep(delay_seconds)
-
-    print("All attempts failed. Returning None.")
-    return None
-
-# Function to wait until all songs are complete
-def poll_until_complete(song_ids):
-    while True:
-        print("Polling for song status...")
-        time.sleep(5)  # Wait before polling again
-        resp_data = poll_for_audio(song_ids)
-        if resp_data:
-            statuses = [item['status'] for item in resp_data]
-            print(f"Current statuses: {statuses}")
-            if all(status == 'complete' for status in statuses):
-                print("All songs completed.")
-                return resp_data
-            elif any(status == 'error' for status in statuses):
-                errors = [item for item in resp_data if item['status'] == 'error']
-                error_messages = [item['meta_data'].get('error_message', 'Unknown error') for item in errors]
-                raise Exception(f"Generation error(s): {error_messages}")
-            else:
-                continue
-        else:
-            raise Exception("Failed to poll for audio.")
+# Define protocol for Singer agent
+audio_proto = Protocol(name="AudioGenerationProtocol", version="1.0")
 
 @singer.on_rest_post("/sing", GenerateAudioRequest, GenerateAudioResponse)
 async def handle_sing_post(ctx: Context, req: GenerateAudioRequest) -> GenerateAudioResponse:
-    ctx.logger.info(f"Received /sing POST request with data: {req}")
+    log.info("sing.received", title=req.title)
     # Use the song data from the request
     song_data = {
         'title': req.title,
         'lyrics': req.lyrics,
         'style': req.style,
-        'negative_style': req.negative_style
+        'negative_style': req.negative_style,
+        'traceparent': req.traceparent,
+        'generation_uuid': req.generation_uuid
     }
     # Generate the audio response
     return await generate_audio_response(ctx, song_data)
 
 @audio_proto.on_message(model=GenerateAudioRequest, replies=GenerateAudioResponse)
 async def handle_generate_audio(ctx: Context, sender: str, msg: GenerateAudioRequest):
-    ctx.logger.info(f"Received audio generation request with data: {msg}")
+    log.info("sing.received", title=msg.title, sender=sender)
     # Use the song data from the message
     song_data = {
         'title': msg.title,
@@ -216,17 +290,30 @@ async def handle_generate_audio(ctx: Context, sender: str, msg: GenerateAudioReq
     # Send the response back to the sender
     await ctx.send(sender, response)
 
+@metrics.timed("sing", ok=lambda response: response.status == "complete")
 async def generate_audio_response(ctx: Context, song_data: dict) -> GenerateAudioResponse:
-    song_ids = generate_audio(
+    # Continues the trace of whoever asked for the song (the app sends its traceparent along)
+    with tracing.start_span("sing", traceparent=song_data.get('traceparent'),
+                            generation_uuid=song_data.get('generation_uuid') or None,
+                            resumed=bool(song_data.get('song_ids'))) as span:
+        response = await sing_song(ctx, song_data)
+        span.set_attribute("status", response.status)
+        return response
+
+async def sing_song(ctx: Context, song_data: dict) -> GenerateAudioResponse:
+    # Resuming a generation Suno already accepted: just poll the known ids
+    song_ids = song_data.get('song_ids') or await generate_audio(
         title=song_data.get('title', ''),
         lyrics=song_data.get('lyrics', ''),
         style=song_data.get('style', ''),
         negative_style=song_data.get('negative_style', '')
     )
     if song_ids:
-        ctx.logger.info(f"Song IDs received: {song_ids}")
+        log.info("sing.song_ids", song_ids=song_ids)
+        # Recorded on the job's song_data so status queries can report them mid-flight
+        song_data['song_ids'] = song_ids
         try:
-            song_data_list = poll_until_complete(song_ids)
+            song_data_list = await poll_until_complete(song_ids)
             # Extract required information
             audio_url_1 = song_data_list[0].get('audio_url')
             image_url_1 = song_data_list[0].get('image_url')
@@ -249,7 +336,7 @@ async def generate_audio_response(ctx: Context, song_data: dict) -> GenerateAudi
                 image_large_url_2=image_large_url_2
             )
         except Exception as e:
-            ctx.logger.error(f"Error during polling: {e}")
+            log.error("sing.poll_failed", song_ids=song_ids, error=e)
             return GenerateAudioResponse(
                 status="error",
                 error=f"Error during polling: {e}",
@@ -263,7 +350,7 @@ async def generate_audio_response(ctx: Context, song_data: dict) -> GenerateAudi
                 image_large_url_2=""
             )
     else:
-        ctx.logger.error("Failed to initiate audio generation.")
+        log.error("sing.submit_failed", title=song_data.get('title', ''))
         return GenerateAudioResponse(
             status="error",
             error="Failed to intiate audio generation.",
@@ -285,17 +372,138 @@ async def handle_heartbeat(ctx: Context) -> Response:
                 timestamp=int(time.time()),
    )
 
+# Job API: /sing without holding the caller's connection open while Suno renders.
+# With a shared JOB_STORE_URL every singer replica takes work from the same queue.
+sing_jobs = JobQueue(generate_audio_response)
+
+@singer.on_event("startup")
+async def start_sing_jobs(ctx: Context):
+    sing_jobs.start(ctx)
+
+def job_status_response(job_id, job):
+    if job is None:
+        return JobStatusResponse(job_id=job_id, status="unknown", error="Unknown job id", **EMPTY_MEDIA)
+    song_ids = job.payload.get('song_ids') or []
+    if job.result is not None:
+        return JobStatusResponse(job_id=job.id, song_ids=song_ids, **job.result)
+    return JobStatusResponse(job_id=job.id, song_ids=song_ids, status=job.status, error=job.error, **EMPTY_MEDIA)
+
+@singer.on_rest_post("/jobs", SingJobRequest, JobSubmitResponse)
+async def handle_job_submit(ctx: Context, req: SingJobRequest) -> JobSubmitResponse:
+    song_data = {
+        'title': req.title,
+        'lyrics': req.lyrics,
+        'style': req.style,
+        'negative_style': req.negative_style,
+        'song_ids': req.song_ids,
+        'traceparent': req.traceparent,
+        'generation_uuid': req.generation_uuid
+    }
+    job = await sing_jobs.submit(song_data)
+    counts = await sing_jobs.counts()
+    log.info("jobs.queued", job_id=job.id, waiting=counts['queued'])
+    return JobSubmitResponse(job_id=job.id, status=job.status)
+
+@singer.on_rest_post("/jobs/status", JobStatusRequest, JobStatusResponse)
+async def handle_job_status(ctx: Context, req: JobStatusRequest) -> JobStatusResponse:
+    return job_status_response(req.job_id, await sing_jobs.get(req.job_id))
+
+@singer.on_rest_post("/jobs/batch_status", JobBatchStatusRequest, JobBatchStatusResponse)
+async def handle_job_batch_status(ctx: Context, req: JobBatchStatusRequest) -> JobBatchStatusResponse:
+    return JobBatchStatusResponse(
+        jobs=[job_status_response(job_id, await sing_jobs.get(job_id)) for job_id in req.job_ids]
+    )
+
+async def write_song_remote(instruction=None, model_name=None, artist=None, station=None):
+    """
+    generate_song for a singer-only process: asks the lyricist pool over REST.
+
+    Returns:
+        dict: The song data, or None if the lyricist failed.
+    """
+    try:
+        response = await get_http_client().post(f"{LYRICIST_HOST}/write_song", json={
+            "instruction": instruction or "",
+            "model_name": model_name or "",
+            "artist_name": artist or "",
+            "station": station or ""
+        })
+        response.raise_for_status()
+        return response.json()
+    except (httpx.HTTPError, ValueError) as e:
+        log.warning("lyricist.request_failed", host=LYRICIST_HOST, error=e)
+        return None
+
+# The singer's orchestrate endpoints write lyrics in-process unless the lyricist runs separately
+write_lyrics = write_song_remote if AGENT_ROLE == "singer" else generate_song
+
+# Batch orchestration: lyrics for the next songs are written while earlier ones are sung
+batches = BatchOrchestrator(write_lyrics, generate_audio_response)
+
+def batch_song_result(song):
+    media = song.result.dict() if song.result is not None else dict(EMPTY_MEDIA)
+    media.update(status=song.status, error=song.error)
+    return BatchSongResult(
+        index=song.index,
+        station=song.station,
+        model_name=song.model_name,
+        artist_name=song.artist,
+        title=song.song_data.get('title', ''),
+        lyrics=song.song_data.get('lyrics', ''),
+        style=song.song_data.get('style', ''),
+        negative_style=song.song_data.get('negative_style', ''),
+        **media
+    )
+
+@singer.on_rest_post("/orchestrate_batch", OrchestrateBatchRequest, OrchestrateBatchResponse)
+async def handle_orchestrate_batch(ctx: Context, req: OrchestrateBatchRequest) -> OrchestrateBatchResponse:
+    known = {station["id"] for station in STATIONS}
+    unknown = [station for station in req.stations if station not in known]
+    if unknown:
+        return OrchestrateBatchResponse(batch_id="", status="error", total=0, error=f"Unknown stations: {unknown}")
+    stations = [station for station, count in req.stations.items() for _ in range(max(count, 0))]
+    stations += [get_random_station() for _ in range(max(req.count, 0))]
+    if not stations or len(stations) > BATCH_MAX_SONGS:
+        return OrchestrateBatchResponse(
+            batch_id="", status="error", total=len(stations),
+            error=f"A batch needs between 1 and {BATCH_MAX_SONGS} songs"
+        )
+    batch = batches.submit(ctx, stations)
+    log.info("batch.started", batch_id=batch.id, songs=len(stations))
+    return OrchestrateBatchResponse(batch_id=batch.id, status="running", total=len(stations))
+
+@singer.on_rest_post("/orchestrate_batch/status", BatchStatusRequest, BatchStatusResponse)
+async def handle_orchestrate_batch_status(ctx: Context, req: BatchStatusRequest) -> BatchStatusResponse:
+    """
+    Returns the songs finished since the caller's cursor, in completion order.
+    Pass next_cursor back as after to receive only newer songs.
+    """
+    batch = batches.get(req.batch_id)
+    if batch is None:
+        return BatchStatusResponse(batch_id=req.batch_id, status="unknown", total=0, completed=0, failed=0,
+                                   songs=[], next_cursor=req.after)
+    finished = batch.completed[req.after:]
+    return BatchStatusResponse(
+        batch_id=batch.id,
+        status="complete" if batch.done else "running",
+        total=len(batch.songs),
+        completed=len(batch.completed),
+        failed=batch.failed,
+        songs=[batch_song_result(song) for song in finished],
+        next_cursor=req.after + len(finished)
+    )
+
 # Combined endpoint that takes no arguments, runs lyricist and singer in sequence
 @singer.on_rest_post("/orchestrate", EmptyRequest, GenerateAudioResponse)
 async def handle_orchestrate_post(ctx: Context, req: EmptyRequest) -> GenerateAudioResponse:
-    ctx.logger.info("Received orchestrate request")
+    log.info("orchestrate.received")
 
     # Step 1: Generate lyrics using the lyricist
     # We'll call generate_song without any arguments
-    song_data = generate_song()
+    song_data = await write_lyrics()
 
     if not song_data:
-        ctx.logger.error("Failed to generate song data in lyricist.")
+        log.error("orchestrate.lyrics_failed")
         return GenerateAudioResponse(
             status="error",
             error="Failed to generate song data",
@@ -314,11 +522,39 @@ async def handle_orchestrate_post(ctx: Context, req: EmptyRequest) -> GenerateAu
 # Include protocol in the singer agent
 singer.include(audio_proto)
 
-
-# Initialize the bureau and add the lyricist agent
-bureau = Bureau(port=8258, endpoint="https://rhythmiqagent.255labs.xyz/submit")
-bureau.add(lyricist)
-bureau.add(singer)
+@singer.on_event("shutdown")
+async def close_provider_client(ctx: Context):
+    await sing_jobs.stop()
+    await batches.stop()
+    await close_http_client()
+    await local_pool.close()
+    await tracing.shutdown()
+
+
+# Process-wide metrics, served by whichever agent this process runs (both share them in "all" mode)
+metrics_agent = lyricist if AGENT_ROLE == "lyricist" else singer
+
+@metrics_agent.on_rest_get("/metrics", MetricsResponse)
+async def handle_metrics(ctx: Context) -> MetricsResponse:
+    snapshot = metrics.snapshot()
+    gauges = snapshot["gauges"]
+    if AGENT_ROLE in ("all", "lyricist"):
+        gauges["lyric_buffer_depth"] = lyric_buffer.stats()["depth"]
+    if AGENT_ROLE in ("all", "singer"):
+        counts = await sing_jobs.counts()
+        gauges["sing_jobs_queued"] = counts["queued"]
+        gauges["sing_jobs_running"] = counts["running"]
+        gauges["batch_songs_pending"] = sum(
+            1 for batch in batches.batches.values() for song in batch.songs if not song.done
+        )
+    return MetricsResponse(**snapshot)
+
+# Initialize the bureau with the agents this process runs
+bureau = Bureau(port=AGENT_PORT, endpoint=AGENT_ENDPOINT)
+if AGENT_ROLE in ("all", "lyricist"):
+    bureau.add(lyricist)
+if AGENT_ROLE in ("all", "singer"):
+    bureau.add(singer)
 
 if __name__ == "__main__":
     bureau.run()
@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+import uuid
+import asyncio
+from jobs import JOB_TTL
+from model_stats import model_stats
+sys.path.insert(0, os.path.abspath("../common"))
+from model_selector import get_weighted_model_name, get_model_nickname
+
+# Configuration for batch orchestration
+BATCH_LYRIC_CONCURRENCY = int(os.getenv("BATCH_LYRIC_CONCURRENCY", "2"))  # Songs having lyrics written at once, across batches
+BATCH_AUDIO_CONCURRENCY = int(os.getenv("BATCH_AUDIO_CONCURRENCY", "4"))  # Songs being sung at once, across batches
+BATCH_MAX_SONGS = int(os.getenv("BATCH_MAX_SONGS", "200"))  # Largest batch a single request may ask for
+
+class BatchSong:
+    def __init__(self, index, station):
+        self.index = index
+        self.station = station
+        self.status = "queued"
+        self.error = ""
+        self.model_name = ""
+        self.artist = ""
+        self.song_data = {}
+        self.result = None
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.status in ("complete", "error")
+
+class Batch:
+    def __init__(self, stations):
+        self.id = str(uuid.uuid4())
+        self.songs = [BatchSong(index, station) for index, station in enumerate(stations)]
+        self.completed = []
+        self.created_at = time.time()
+        self.finished_at = None
+        self.tasks = []
+
+    @property
+    def done(self):
+        return len(self.completed) == len(self.songs)
+
+    @property
+    def failed(self):
+        return sum(1 for song in self.songs if song.status == "error")
+
+class BatchOrchestrator:
+    """
+    Writes and sings many songs at once with the two stages pipelined.
+
+    Every song runs as its own task: it waits for one of the lyric slots, writes
+    its lyrics, then waits for one of the audio slots. While one song is being
+    sung the next one's lyrics are already being written, and each stage's
+    provider sees at most its own concurrency limit. Finished songs are appended
+    to the batch's completed list in completion order, so callers can page
+    through results as they arrive.
+
+    Args:
+        write (coroutine function): generate_song(instruction, model_name, artist, station).
+        sing (coroutine function): Called with (ctx, song_data); returns a GenerateAudioResponse.
+        lyric_concurrency (int): Songs in the lyric stage at once.
+        audio_concurrency (int): Songs in the audio stage at once.
+        ttl (float): Seconds a finished batch stays queryable.
+    """
+    def __init__(self, write, sing, lyric_concurrency=BATCH_LYRIC_CONCURRENCY,
+                 audio_concurrency=BATCH_AUDIO_CONCURRENCY, ttl=JOB_TTL):
+        self.write = write
+        self.sing = sing
+        self.ttl = ttl
+        self.batches = {}
+        self._lyric_slots = asyncio.Semaphore(lyric_concurrency)
+        self._audio_slots = asyncio.Semaphore(audio_concurrency)
+
+    def submit(self, ctx, stations):
+        """
+        Starts a batch with one song per entry in stations. Must be called from the event loop.
+
+        Returns:
+            Batch: The running batch; its id can be used with get().
+        """
+        self._evict_expired()
+        batch = Batch(stations)
+        self.batches[batch.id] = batch
+        batch.tasks = [asyncio.create_task(self._run_song(ctx, batch, song)) for song in batch.songs]
+        return batch
+
+    def get(self, batch_id):
+        return self.batches.get(batch_id)
+
+    async def _run_song(self, ctx, batch, song):
+        try:
+            async with self._lyric_slots:
+                song.status = "writing"
+                song.model_name = get_weighted_model_name(model_stats.summary())
+                song.artist = get_model_nickname(song.model_name)[1]
+                song_data = await self.write(None, song.model_name, song.artist, song.station)
+            if not song_data:
+                raise RuntimeError("Failed to generate song data")
+            song.song_data = song_data
+            song.model_name = song_data.get("model_name", song.model_name)
+            song.artist = song_data.get("artist_name", song.artist)
+
+            async with self._audio_slots:
+                song.status = "singing"
+                song.result = await self.sing(ctx, dict(song_data))
+            song.status = song.result.status
+            song.error = song.result.error
+        except Exception as e:
+            song.status = "error"
+            song.error = str(e)
+        finally:
+            song.finished_at = time.time()
+            batch.completed.append(song)
+            if batch.done:
+                batch.finished_at = time.time()
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.ttl
+        expired = [batch_id for batch_id, batch in self.batches.items() if batch.done and batch.finished_at < cutoff]
+        for batch_id in expired:
+            del self.batches[batch_id]
+
+    async def stop(self):
+        tasks = [task for batch in self.batches.values() for task in batch.tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
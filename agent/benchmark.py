@@ -0,0 +1,250 @@
+"""
+Micro-benchmarks for the agent.
+
+Usage:
+    python benchmark.py prompt [--iterations N]
+    python benchmark.py local [--requests N] [--slots N] [--runaway-rate F]
+    python benchmark.py pipeline [--songs N] [--profile fast] [--concurrency N]
+"""
+import os
+import sys
+import json
+import time
+import random
+import timeit
+import asyncio
+import argparse
+import httpx
+from xml_tools import toolbox, formatter
+from prompts import PromptCorpus, PROMPT_DIR
+sys.path.insert(0, os.path.abspath("../common"))
+from stations import get_station_instructions, get_random_station
+
+def legacy_prompt(root, artist, station):
+    """The per-call prompt assembly generate_song used before the corpus existed."""
+    instruction_files = [f for f in os.listdir(os.path.join(root, "instructions")) if f.endswith('.txt')]
+    with open(os.path.join(root, "instructions", random.choice(instruction_files)), "r") as file:
+        instruction = file.read().strip()
+    station_instructions = get_station_instructions(station)
+    if station_instructions:
+        instruction += "\n\n" + station_instructions
+    song_files = [f for f in os.listdir(os.path.join(root, "songs")) if f.endswith('.xml')]
+    if not song_files:
+        raise FileNotFoundError("No song files found in songs directory")
+    with open(os.path.join(root, "base.txt"), "r") as file:
+        base_prompt = file.read().strip()
+    with open(os.path.join(root, "system.txt"), "r") as file:
+        system_prompt = file.read().strip()
+    user_prompt = formatter.usage_prompt(toolbox) + "\n\n" + base_prompt + f"\n\nAdditional Instructions:\n{instruction}"
+    if artist:
+        user_prompt += f"\n\nYou are the artist: {artist}"
+    return system_prompt, user_prompt
+
+def corpus_prompt(corpus, artist, station):
+    corpus.refresh()
+    return corpus.build(corpus.random_instruction(), artist=artist, station=station)
+
+def report(name, seconds, iterations):
+    print(f"{name:<24} {seconds / iterations * 1e6:10.1f} us/call")
+
+def bench_prompt(iterations):
+    corpus = PromptCorpus(PROMPT_DIR)
+    station = get_random_station()
+    legacy = timeit.timeit(lambda: legacy_prompt(PROMPT_DIR, "Ozone 3", station), number=iterations)
+    cached = timeit.timeit(lambda: corpus_prompt(corpus, "Ozone 3", station), number=iterations)
+    report("legacy (per-call I/O)", legacy, iterations)
+    report("prompt corpus", cached, iterations)
+    print(f"speedup: {legacy / cached:.1f}x")
+
+SONG_XML = """<use_tool>
+<name>song</name>
+<title>Stand-in Song</title>
+<lyrics>Tokens in, tokens out</lyrics>
+<style>synthwave</style>
+<negative_style>country</negative_style>
+</use_tool>"""
+
+class StandInServer:
+    """
+    An OpenAI-compatible chat completions server that behaves like a GPU box
+    running continuous batching: up to `slots` sequences decode together, each
+    token takes token_time, and requests beyond that wait for a slot.
+
+    A fraction of generations "run away" (loop in the lyrics without closing the
+    song) and only stop at the request's max_tokens, as local models sometimes do.
+    """
+    def __init__(self, slots, token_time, song_tokens, runaway_rate, seed=0):
+        self.slots = slots
+        self.token_time = token_time
+        self.song_tokens = song_tokens
+        self.runaway_rate = runaway_rate
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        self.rng = random.Random(self.seed)
+        self.connections = 0
+        self.tokens = 0
+        self._slots = asyncio.Semaphore(self.slots)
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _generate(self, max_tokens):
+        tokens = max_tokens if self.rng.random() < self.runaway_rate else min(self.song_tokens, max_tokens)
+        async with self._slots:
+            await asyncio.sleep(tokens * self.token_time)
+        self.tokens += tokens
+        return tokens
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = line.decode().split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                payload = json.loads(await reader.readexactly(int(headers.get("content-length", 0))))
+                tokens = await self._generate(payload.get("max_tokens", 8192))
+                body = json.dumps({
+                    "choices": [{"message": {"role": "assistant", "content": SONG_XML}}],
+                    "usage": {"completion_tokens": tokens}
+                }).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+async def legacy_send_payload(prompt, port):
+    """The local provider call before pooling: a fresh connection per song and an 8192 token cap."""
+    async with httpx.AsyncClient(timeout=600) as client:
+        response = await client.post(
+            f"http://127.0.0.1:{port}/v1/chat/completions",
+            json={"messages": [{"role": "user", "content": prompt}], "max_tokens": 8192},
+            headers={"Content-Type": "application/json"}
+        )
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+async def bench_local_async(requests, slots, token_time, song_tokens, runaway_rate):
+    import singer
+    from local_provider import LocalServerPool
+
+    server = StandInServer(slots, token_time, song_tokens, runaway_rate)
+    port = await server.start()
+    pool = LocalServerPool(max_inflight=slots)
+    singer.local_pool = pool
+
+    async def run(name, call):
+        server.reset()
+        started = time.perf_counter()
+        results = await asyncio.gather(*(call() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+        assert all(results)
+        print(f"{name:<24} {elapsed:7.2f}s  {requests / elapsed:6.1f} songs/s  "
+              f"{server.connections:4d} connections  {server.tokens:8d} tokens decoded")
+        return elapsed
+
+    legacy = await run("legacy (per-call)", lambda: legacy_send_payload("Write a song", port))
+    pooled = await run("pooled + token cap", lambda: singer.send_payload("Write a song", "127.0.0.1", port, stream=False))
+    print(f"speedup: {legacy / pooled:.1f}x (token cap {singer.LOCAL_MAX_TOKENS}, {slots} slots)")
+    await pool.close()
+    await server.stop()
+
+def bench_local(args):
+    asyncio.run(bench_local_async(args.requests, args.slots, args.token_time, args.song_tokens, args.runaway_rate))
+
+async def bench_pipeline_async(songs, profile, concurrency, seed):
+    import client
+    import singer
+    import suno
+    from simulator import ProviderSimulator, PROFILES
+
+    simulator = ProviderSimulator(PROFILES[profile], seed=seed)
+    scale = simulator.scale
+    client.set_http_client(httpx.AsyncClient(transport=simulator, timeout=singer.LLM_TIMEOUT))
+    suno.poller = suno.SunoPoller(first_delay=suno.POLL_FIRST_DELAY * scale, min_interval=suno.POLL_MIN_INTERVAL * scale,
+                                  max_interval=suno.POLL_MAX_INTERVAL * scale)
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = {}
+
+    async def one_song():
+        async with slots:
+            started = time.perf_counter()
+            try:
+                song = await singer.generate_song("Write a song")
+                if not song:
+                    raise RuntimeError("no song data")
+                song_ids = await suno.generate_audio(song["title"], song["lyrics"], song["style"], song["negative_style"])
+                if not song_ids:
+                    raise RuntimeError("audio submission failed")
+                items = await suno.poll_until_complete(song_ids)
+                if any(item.get("status") != "complete" for item in items):
+                    raise RuntimeError("audio generation failed")
+                latencies.append((time.perf_counter() - started) / scale)
+            except Exception as e:
+                failures[str(e)] = failures.get(str(e), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_song() for _ in range(songs)))
+    elapsed = time.perf_counter() - started
+    await client.close_http_client()
+
+    latencies.sort()
+    quantile = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else float("nan")
+    print(f"profile {profile} (time scale {scale}), {songs} songs, {concurrency} at once")
+    print(f"completed {len(latencies)}/{songs} in {elapsed:.2f}s wall, {songs / elapsed:.1f} songs/s")
+    print(f"latency (simulated seconds) p50 {quantile(0.5):.1f}  p90 {quantile(0.9):.1f}  p99 {quantile(0.99):.1f}")
+    print(f"failures {failures or 'none'}")
+    print(f"provider requests {simulator.requests}")
+
+def bench_pipeline(args):
+    asyncio.run(bench_pipeline_async(args.songs, args.profile, args.concurrency, args.seed))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    prompt = subparsers.add_parser("prompt", help="Prompt assembly cost per generate_song call")
+    prompt.add_argument("--iterations", type=int, default=2000)
+    local = subparsers.add_parser("local", help="Local provider throughput against a stand-in LLM server")
+    local.add_argument("--requests", type=int, default=64)
+    local.add_argument("--slots", type=int, default=4, help="Sequences the stand-in server decodes at once")
+    local.add_argument("--token-time", type=float, default=0.0002, help="Seconds per decoded token")
+    local.add_argument("--song-tokens", type=int, default=900, help="Tokens in a normal song completion")
+    local.add_argument("--runaway-rate", type=float, default=0.1, help="Fraction of completions that never close the song")
+    pipeline = subparsers.add_parser("pipeline", help="Whole generations against the offline provider simulator")
+    pipeline.add_argument("--songs", type=int, default=100)
+    pipeline.add_argument("--profile", default="fast", help="Simulator profile: realistic, fast, instant or degraded")
+    pipeline.add_argument("--concurrency", type=int, default=20, help="Generations in flight at once")
+    pipeline.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.benchmark == "prompt":
+        bench_prompt(args.iterations)
+    elif args.benchmark == "local":
+        bench_local(args)
+    elif args.benchmark == "pipeline":
+        bench_pipeline(args)
+
+if __name__ == "__main__":
+    main()
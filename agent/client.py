@@ -0,0 +1,51 @@
+import os
+import httpx
+from simulator import get_simulator
+
+# Configuration for the shared HTTP client
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "600"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+
+_client = None
+
+def get_http_client():
+    """
+    Returns the process-wide httpx.AsyncClient used for every provider call.
+
+    Sharing one client keeps connections to NanoGPT, the local server and Suno
+    alive between requests, and lets many jobs be in flight on one event loop.
+    With PROVIDER_SIMULATOR set, the client talks to the offline simulator instead.
+
+    Returns:
+        httpx.AsyncClient: The shared client, created on first use.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS
+            ),
+            transport=get_simulator()
+        )
+    return _client
+
+def set_http_client(client):
+    """
+    Replaces the shared client, e.g. with one using a mock transport in tests.
+
+    Args:
+        client (httpx.AsyncClient): The client to use for provider calls.
+    """
+    global _client
+    _client = client
+
+async def close_http_client():
+    """
+    Closes the shared client if it was opened.
+    """
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
@@ -0,0 +1,336 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+from collections import deque
+from log import get_logger
+
+# Configuration for the singer job queue
+SINGER_CONCURRENCY = int(os.getenv("SINGER_CONCURRENCY", "10"))  # Suno generations allowed in flight at once per process
+JOB_TTL = float(os.getenv("JOB_TTL", "3600"))  # Seconds a finished job stays queryable
+JOB_STORE_URL = os.getenv("JOB_STORE_URL", "memory://")  # memory:// or sqlite:///path/to/jobs.db shared by singer replicas
+JOB_LEASE = float(os.getenv("JOB_LEASE", "60"))  # Seconds a claimed job is reserved before another replica may take it over
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))  # Seconds an idle worker waits before checking a shared store again
+
+PENDING_STATUSES = ("queued", "running")
+
+log = get_logger("jobs")
+
+class Job:
+    def __init__(self, payload, id=None, status="queued", result=None, error="", created_at=None,
+                 started_at=None, finished_at=None, worker=None, lease_until=None):
+        self.id = id or str(uuid.uuid4())
+        self.payload = payload
+        self.status = status
+        self.result = result
+        self.error = error
+        self.created_at = created_at or time.time()
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.worker = worker
+        self.lease_until = lease_until
+
+    @property
+    def done(self):
+        return self.status not in PENDING_STATUSES
+
+class MemoryJobStore:
+    """
+    Jobs kept in this process. Only the process that accepted a job can run
+    it or report on it, which is all a single agent process needs.
+    """
+    def __init__(self):
+        self.jobs = {}
+        self._queued = deque()
+        self._work = asyncio.Event()
+
+    async def add(self, job):
+        self.jobs[job.id] = job
+        self._queued.append(job.id)
+        self._work.set()
+
+    async def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def claim(self, worker, lease):
+        while self._queued:
+            job = self.jobs.get(self._queued.popleft())
+            if job is not None and job.status == "queued":
+                job.status = "running"
+                job.worker = worker
+                job.started_at = time.time()
+                return job
+        self._work.clear()
+        return None
+
+    async def wait_for_work(self, timeout):
+        try:
+            await asyncio.wait_for(self._work.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def save(self, job, lease=None):
+        pass
+
+    async def counts(self):
+        queued = sum(1 for job in self.jobs.values() if job.status == "queued")
+        running = sum(1 for job in self.jobs.values() if job.status == "running")
+        return {"queued": queued, "running": running}
+
+    async def evict(self, cutoff):
+        expired = [job_id for job_id, job in self.jobs.items() if job.done and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def close(self):
+        pass
+
+class SQLiteJobStore:
+    """
+    Jobs kept in a SQLite file that every singer replica opens, so any replica
+    can accept a job, any replica can run it and any replica can report on it.
+
+    A worker claims a queued job by reserving it for a lease it keeps renewing
+    while the job runs. If a replica dies, its lease lapses and another replica
+    picks the job up again. The job's payload, including Suno ids recorded
+    mid-flight, is saved with every renewal, so a retry resumes polling instead
+    of starting a new generation. Blocking sqlite3 calls run in a thread.
+
+    Args:
+        path (str): Database file, created if missing.
+    """
+    COLUMNS = ("id", "payload", "status", "result", "error", "created_at", "started_at",
+               "finished_at", "worker", "lease_until")
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT NOT NULL DEFAULT '',
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                worker TEXT,
+                lease_until REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+        self._lock = asyncio.Lock()
+
+    async def _run(self, fn, *args):
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    def _to_job(self, row):
+        if row is None:
+            return None
+        fields = dict(zip(self.COLUMNS, row))
+        fields["payload"] = json.loads(fields["payload"])
+        fields["result"] = json.loads(fields["result"]) if fields["result"] else None
+        return Job(**fields)
+
+    def _add(self, job):
+        self._conn.execute(
+            "INSERT INTO jobs (id, payload, status, error, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job.id, json.dumps(job.payload), job.status, job.error, job.created_at)
+        )
+
+    async def add(self, job):
+        await self._run(self._add, job)
+
+    def _get(self, job_id):
+        row = self._conn.execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return self._to_job(row)
+
+    async def get(self, job_id):
+        return await self._run(self._get, job_id)
+
+    def _claim(self, worker, lease):
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                f"""
+                SELECT {', '.join(self.COLUMNS)} FROM jobs
+                WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)
+                ORDER BY created_at LIMIT 1
+                """,
+                (now,)
+            ).fetchone()
+            job = self._to_job(row)
+            if job is not None:
+                job.status = "running"
+                job.worker = worker
+                job.started_at = now
+                job.lease_until = now + lease
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, started_at = ?, lease_until = ? WHERE id = ?",
+                    (job.status, job.worker, job.started_at, job.lease_until, job.id)
+                )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return job
+
+    async def claim(self, worker, lease):
+        return await self._run(self._claim, worker, lease)
+
+    async def wait_for_work(self, timeout):
+        await asyncio.sleep(timeout)
+
+    def _save(self, job, lease):
+        lease_until = time.time() + lease if lease else job.lease_until
+        self._conn.execute(
+            """
+            UPDATE jobs SET payload = ?, status = ?, result = ?, error = ?, finished_at = ?, lease_until = ?
+            WHERE id = ? AND worker = ?
+            """,
+            (json.dumps(job.payload), job.status, json.dumps(job.result) if job.result is not None else None,
+             job.error, job.finished_at, lease_until, job.id, job.worker)
+        )
+
+    async def save(self, job, lease=None):
+        """
+        Writes the job back, renewing its lease if one is given. Ignored if
+        another worker has since taken the job over.
+        """
+        await self._run(self._save, job, lease)
+
+    def _counts(self):
+        rows = self._conn.execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY status"
+        ).fetchall()
+        counts = {"queued": 0, "running": 0}
+        counts.update(dict(rows))
+        return counts
+
+    async def counts(self):
+        return await self._run(self._counts)
+
+    def _evict(self, cutoff):
+        self._conn.execute(
+            "DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND finished_at < ?", (cutoff,)
+        )
+
+    async def evict(self, cutoff):
+        await self._run(self._evict, cutoff)
+
+    def close(self):
+        self._conn.close()
+
+def open_job_store(url=JOB_STORE_URL):
+    """
+    Returns the job store for a JOB_STORE_URL: memory:// or sqlite:///path.
+    """
+    if url.startswith("memory://"):
+        return MemoryJobStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteJobStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported JOB_STORE_URL '{url}'. Use memory:// or sqlite:///path.")
+
+class JobQueue:
+    """
+    Runs submitted jobs on a fixed pool of worker tasks and keeps their results
+    around for status queries.
+
+    Jobs live in a store. With the default in-memory store a job is run and
+    reported by the process that accepted it. With a shared store, every
+    process running a JobQueue on it claims work from the same queue.
+
+    Args:
+        handler (coroutine function): Called with the start() context arguments and
+                                      the job payload; its return value (a dict or a
+                                      Model) becomes the job result.
+        store: A MemoryJobStore or SQLiteJobStore; defaults to JOB_STORE_URL.
+        concurrency (int): Number of workers, i.e. jobs running at the same time.
+        ttl (float): Seconds a finished job is kept before it is forgotten.
+        lease (float): Seconds a claimed job is reserved; renewed while it runs.
+    """
+    def __init__(self, handler, store=None, concurrency=SINGER_CONCURRENCY, ttl=JOB_TTL, lease=JOB_LEASE,
+                 poll_interval=JOB_POLL_INTERVAL):
+        self.handler = handler
+        self.store = store or open_job_store()
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.context = ()
+        self._workers = []
+
+    def start(self, *context):
+        """
+        Starts the workers. context is passed to the handler before each job's payload.
+        """
+        if self._workers:
+            return
+        self.context = context
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def submit(self, payload):
+        """
+        Queues a job and returns without waiting for it.
+
+        Args:
+            payload (dict): JSON-serializable job arguments.
+
+        Returns:
+            Job: The queued job; its id can be used with get().
+        """
+        await self.store.evict(time.time() - self.ttl)
+        job = Job(payload)
+        await self.store.add(job)
+        return job
+
+    async def get(self, job_id):
+        return await self.store.get(job_id)
+
+    async def counts(self):
+        return await self.store.counts()
+
+    async def _heartbeat(self, job):
+        """Renews the job's lease and saves its payload while it runs."""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            await self.store.save(job, lease=self.lease)
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self.store.claim(self.worker_id, self.lease)
+            except Exception as e:
+                log.warning("jobs.claim_failed", error=e)
+                job = None
+            if job is None:
+                await self.store.wait_for_work(self.poll_interval)
+                continue
+            heartbeat = asyncio.create_task(self._heartbeat(job))
+            try:
+                result = await self.handler(*self.context, job.payload)
+                job.result = result.dict() if hasattr(result, "dict") else result
+                job.status = (job.result or {}).get("status", "complete")
+            except Exception as e:
+                job.status = "error"
+                job.error = str(e)
+            finally:
+                heartbeat.cancel()
+                job.finished_at = time.time()
+                await self.store.save(job)
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self.store.close()
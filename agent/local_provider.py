@@ -0,0 +1,90 @@
+import os
+import time
+import asyncio
+import httpx
+from contextlib import asynccontextmanager
+from client import HTTP_TIMEOUT
+from simulator import get_simulator
+
+LOCAL_MAX_INFLIGHT = int(os.getenv("LOCAL_MAX_INFLIGHT", "4"))  # Requests in flight to the local server, match its parallel slots
+
+class LocalServerPool:
+    """
+    Connections and request slots for the self-hosted LLM server.
+
+    The server batches whatever requests are running at once (continuous
+    batching), so the agent keeps up to max_inflight requests on that many
+    keep-alive connections and queues the rest here. The server's batch stays
+    full without oversubscribing it, and no request pays for a new connection.
+    The OpenAI-compatible API has no call that takes several conversations, so
+    requests are pipelined over the pool rather than merged into one.
+
+    Args:
+        max_inflight (int): Concurrent requests, and connections, to the server.
+        timeout (float): Per-request timeout in seconds.
+    """
+    def __init__(self, max_inflight=LOCAL_MAX_INFLIGHT, timeout=HTTP_TIMEOUT):
+        self.max_inflight = max_inflight
+        self.timeout = timeout
+        self.inflight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.queue_wait_total = 0.0
+        self._slots = asyncio.Semaphore(max_inflight)
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_inflight,
+                    max_keepalive_connections=self.max_inflight,
+                    keepalive_expiry=300
+                ),
+                transport=get_simulator()
+            )
+        return self._client
+
+    def set_client(self, client):
+        """
+        Replaces the pool's client, e.g. with one using a mock transport in tests.
+        """
+        self._client = client
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Waits for a free request slot and holds it for the duration of the block.
+        """
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.queue_wait_total += time.perf_counter() - queued_at
+        self.requests += 1
+        self.inflight += 1
+        try:
+            yield self.client
+        finally:
+            self.inflight -= 1
+            self._slots.release()
+
+    def stats(self):
+        return {
+            "max_inflight": self.max_inflight,
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "requests": self.requests,
+            "queue_wait_avg": self.queue_wait_total / self.requests if self.requests else 0.0
+        }
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+local_pool = LocalServerPool()
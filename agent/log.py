@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import queue
+import random
+import atexit
+import logging
+import contextlib
+import contextvars
+import logging.handlers
+sys.path.insert(0, os.path.abspath("../common"))
+import tracing
+
+# Configuration for agent logging
+ENV = os.getenv("ENV", "dev")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # DEBUG shows (sampled) prompts and responses
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json" if ENV == "production" else "text")  # json (one object per line) or text
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "300"))  # Longer field values are truncated
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")  # Per-event sampling, e.g. "llm.prompt=0.01,suno.status=0.1"
+LOG_FAILURE_PAYLOADS = os.getenv("LOG_FAILURE_PAYLOADS", "true").lower() == "true"  # Log full prompts and responses of failed generations
+
+def parse_sample_rates(value):
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        event, _, rate = item.partition("=")
+        rates[event.strip()] = float(rate)
+    return rates
+
+SAMPLE_RATES = parse_sample_rates(LOG_SAMPLE_RATES)
+
+def truncate(value, limit=LOG_MAX_FIELD_CHARS):
+    text = value if isinstance(value, str) else repr(value) if not isinstance(value, (int, float, bool)) else value
+    if isinstance(text, str) and len(text) > limit:
+        return f"{text[:limit]}...(+{len(text) - limit} chars)"
+    return text
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Renders records made by StructuredLogger: their event name and fields
+    as a JSON object, or as "event key=value ..." text.
+    """
+    def __init__(self, fmt=LOG_FORMAT):
+        super().__init__()
+        self.fmt = fmt
+
+    def format(self, record):
+        fields = getattr(record, "fields", {})
+        if self.fmt == "json":
+            entry = {"ts": round(record.created, 3), "level": record.levelname, "logger": record.name,
+                     "event": record.getMessage(), **fields}
+            return json.dumps(entry, default=str)
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.created))
+        rendered = " ".join(f"{key}={value}" for key, value in fields.items())
+        return f"{timestamp} {record.levelname} {record.name} {record.getMessage()} {rendered}".rstrip()
+
+_listener = None
+
+def setup_logging(level=LOG_LEVEL, stream=None):
+    """
+    Sends the agent's log records through a queue to a background thread that
+    formats and writes them, so the event loop never blocks on stdout. Safe to
+    call more than once.
+    """
+    global _listener
+    root = logging.getLogger("rhythmiq")
+    root.setLevel(level)
+    root.propagate = False
+    if _listener is not None:
+        return
+    records = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(records))
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(StructuredFormatter())
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+_payloads = contextvars.ContextVar("captured_payloads", default=None)
+
+class StructuredLogger:
+    """
+    Logs named events with fields instead of formatted strings.
+
+    Field values are truncated to LOG_MAX_FIELD_CHARS, events listed in
+    LOG_SAMPLE_RATES are only logged at that rate, and the current trace id is
+    attached so log lines can be matched to traces. Large payloads such as
+    prompts and responses go through payload(): they are only logged in full
+    if the generation they belong to fails (see capture_payloads).
+
+    Args:
+        name (str): Logger name under "rhythmiq", e.g. "singer".
+    """
+    def __init__(self, name):
+        self.logger = logging.getLogger(f"rhythmiq.{name}")
+
+    def log(self, level, event, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        rate = SAMPLE_RATES.get(event, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            return
+        fields = {key: truncate(value) for key, value in fields.items()}
+        span = tracing.current_span()
+        if span is not None:
+            fields["trace_id"] = span.trace_id
+        self.logger.log(level, event, extra={"fields": fields})
+
+    def debug(self, event, **fields):
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self.log(logging.ERROR, event, **fields)
+
+    def payload(self, event, **fields):
+        """
+        Keeps a full payload for the current capture_payloads block, and logs a
+        truncated, sampled copy at DEBUG.
+        """
+        captured = _payloads.get()
+        if captured is not None:
+            captured.append((self.logger.name, event, fields))
+        self.debug(event, **fields)
+
+@contextlib.contextmanager
+def capture_payloads():
+    """
+    Collects the payloads logged inside the block, including from tasks it
+    starts. Yields a function that logs them all untruncated at ERROR; call it
+    when the work failed, otherwise they are dropped.
+    """
+    captured = []
+    token = _payloads.set(captured)
+
+    def dump(reason, **fields):
+        if not LOG_FAILURE_PAYLOADS:
+            return
+        span = tracing.current_span()
+        if span is not None:
+            fields["trace_id"] = span.trace_id
+        for logger_name, event, payload in captured:
+            logging.getLogger(logger_name).error(
+                f"{event}.failed", extra={"fields": {"reason": reason, **fields, **payload}}
+            )
+    try:
+        yield dump
+    finally:
+        _payloads.reset(token)
+
+def get_logger(name):
+    setup_logging()
+    return StructuredLogger(name)
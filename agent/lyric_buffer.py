@@ -0,0 +1,161 @@
+import os
+import sys
+import time
+import random
+import asyncio
+from collections import deque
+sys.path.insert(0, os.path.abspath("../common"))
+from stations import STATIONS
+from model_selector import get_weighted_model_name, get_model_nickname
+from model_stats import model_stats
+from log import get_logger
+
+# Configuration for the pre-written lyric buffer
+LYRIC_BUFFER_DEPTH = int(os.getenv("LYRIC_BUFFER_DEPTH", "2"))  # Songs kept ready per station, 0 disables
+LYRIC_BUFFER_WORKERS = int(os.getenv("LYRIC_BUFFER_WORKERS", "2"))  # Concurrent refill generations
+LYRIC_BUFFER_MAX_AGE = float(os.getenv("LYRIC_BUFFER_MAX_AGE", "86400"))  # Seconds before a buffered song is discarded
+LYRIC_BUFFER_MATCH_MODEL = os.getenv("LYRIC_BUFFER_MATCH_MODEL", "false").lower() == "true"  # Only serve the requested model
+LYRIC_BUFFER_RETRY_DELAY = 30  # Seconds a worker waits after a failed refill
+
+log = get_logger("lyric_buffer")
+
+class BufferedSong:
+    def __init__(self, song_data, model_name, artist, station):
+        self.song_data = song_data
+        self.model_name = model_name
+        self.artist = artist
+        self.station = station
+        self.created_at = time.time()
+
+    @property
+    def age(self):
+        return time.time() - self.created_at
+
+class LyricBuffer:
+    """
+    Keeps a bounded number of pre-written songs per station so /write_song can
+    answer without waiting on the LLM.
+
+    Background workers refill the emptiest station, picking models by their
+    recent latency and failure rate like the app does. take() serves the oldest matching song and
+    records hit rate and the age of what was served.
+
+    Args:
+        generate (coroutine function): generate_song(instruction, model_name, artist, station).
+        stations (list): Station ids to buffer for.
+        depth (int): Songs to keep ready per station.
+        workers (int): Number of concurrent refill tasks.
+        max_age (float): Seconds after which a buffered song is dropped.
+        match_model (bool): Only serve a song written by the requested model.
+    """
+    def __init__(self, generate, stations=None, depth=LYRIC_BUFFER_DEPTH, workers=LYRIC_BUFFER_WORKERS,
+                 max_age=LYRIC_BUFFER_MAX_AGE, match_model=LYRIC_BUFFER_MATCH_MODEL):
+        self.generate = generate
+        self.stations = stations or [station["id"] for station in STATIONS]
+        self.depth = depth
+        self.workers = workers
+        self.max_age = max_age
+        self.match_model = match_model
+        self.retry_delay = LYRIC_BUFFER_RETRY_DELAY
+        self.entries = {station: deque() for station in self.stations}
+        self.filling = {station: 0 for station in self.stations}
+        self.hits = 0
+        self.misses = 0
+        self.refill_failures = 0
+        self.served_ages = deque(maxlen=100)
+        self._changed = asyncio.Event()
+        self._tasks = []
+
+    def start(self):
+        if self.depth <= 0 or self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def take(self, station, model_name=None):
+        """
+        Removes and returns a buffered song for the station, or None on a miss.
+        """
+        entries = self.entries.get(station)
+        self._evict_expired()
+        match = None
+        if entries:
+            match = next((entry for entry in entries if entry.model_name == model_name), None)
+            if match is None and not self.match_model:
+                match = entries[0]
+        if match is None:
+            self.misses += 1
+            return None
+        entries.remove(match)
+        self.hits += 1
+        self.served_ages.append(match.age)
+        self._changed.set()
+        return match
+
+    def _evict_expired(self):
+        for entries in self.entries.values():
+            while entries and entries[0].age > self.max_age:
+                entries.popleft()
+                self._changed.set()
+
+    def _next_station(self):
+        """The station furthest below its target depth, counting refills in progress."""
+        shortfall = {
+            station: self.depth - len(self.entries[station]) - self.filling[station]
+            for station in self.stations
+        }
+        station = max(self.stations, key=lambda s: (shortfall[s], random.random()))
+        return station if shortfall[station] > 0 else None
+
+    async def _worker(self):
+        while True:
+            self._evict_expired()
+            station = self._next_station()
+            if station is None:
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+            model_name = get_weighted_model_name(model_stats.summary())
+            artist = get_model_nickname(model_name)[1]
+            self.filling[station] += 1
+            try:
+                song_data = await self.generate(None, model_name, artist, station)
+            except Exception as e:
+                log.warning("lyric_buffer.refill_failed", station=station, error=e)
+                song_data = None
+            finally:
+                self.filling[station] -= 1
+            if song_data:
+                self.entries[station].append(BufferedSong(
+                    song_data,
+                    song_data.get("model_name", model_name),
+                    song_data.get("artist_name", artist),
+                    station
+                ))
+            else:
+                self.refill_failures += 1
+                await asyncio.sleep(self.retry_delay)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "depth": self.depth,
+            "stations": {
+                station: {
+                    "ready": len(entries),
+                    "filling": self.filling[station],
+                    "oldest_age": entries[0].age if entries else 0.0
+                }
+                for station, entries in self.entries.items()
+            },
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "refill_failures": self.refill_failures,
+            "served_age_avg": sum(self.served_ages) / len(self.served_ages) if self.served_ages else 0.0
+        }
@@ -0,0 +1,156 @@
+import os
+import time
+import asyncio
+import functools
+
+# Bucket upper bounds; lyric calls take seconds to minutes, Suno songs minutes
+LATENCY_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 90, 120, 180, 240, 300, 450, 600, 900)
+HISTOGRAM_BUCKETS = {
+    "suno_polls_per_song": (1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50),
+}
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"  # Turns every recording call into a no-op
+
+def metric_key(name, labels):
+    """Prometheus-style series name, e.g. calls_total{call="generate_audio",outcome="ok"}."""
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}"
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, fraction):
+        """
+        Estimates a quantile by interpolating inside the bucket it falls in.
+        Values past the last bucket are reported as the last bound.
+        """
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return float(self.buckets[-1])
+
+    def summary(self):
+        summary = {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99)
+        }
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            summary[f"le_{bound}"] = cumulative
+        summary["le_inf"] = self.count
+        return summary
+
+class Metrics:
+    """
+    In-process counters, gauges and histograms for the agent, read through the
+    /metrics endpoint. Series are keyed by name and labels the way Prometheus
+    names them, so the snapshot can be scraped into one later without renaming.
+    """
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.started_at = time.time()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        if self.enabled:
+            key = metric_key(name, labels)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge_add(self, name, value, **labels):
+        if self.enabled:
+            key = metric_key(name, labels)
+            self.gauges[key] = self.gauges.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        if self.enabled:
+            key = metric_key(name, labels)
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(HISTOGRAM_BUCKETS.get(name, LATENCY_BUCKETS))
+            histogram.observe(value)
+
+    def record_usage(self, model_name, usage):
+        """Adds a provider usage block (nano_info) to the token counters."""
+        for kind in ("prompt_tokens", "completion_tokens"):
+            tokens = (usage or {}).get(kind) or 0
+            if tokens:
+                self.inc("llm_tokens_total", tokens, model=model_name, kind=kind.split("_")[0])
+
+    def timed(self, call, provider=None, ok=lambda result: result is not None):
+        """
+        Decorates a coroutine function to track calls in flight, their latency
+        and their outcome. A call is "ok" if ok(result) is true, "error" if it
+        raises or ok(result) is false, and "cancelled" if it was cancelled (a
+        lost hedge, for example). With provider set it also counts as a request
+        to that provider.
+
+        Args:
+            call (str): The call label, usually the function name.
+            provider (str): "nanogpt", "local" or "suno" for provider requests.
+            ok (callable): Decides from the return value whether the call succeeded.
+        """
+        def decorate(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                self.gauge_add("in_flight", 1, call=call)
+                started = time.perf_counter()
+                outcome = "error"
+                try:
+                    result = await fn(*args, **kwargs)
+                    if ok(result):
+                        outcome = "ok"
+                    return result
+                except asyncio.CancelledError:
+                    outcome = "cancelled"
+                    raise
+                finally:
+                    self.gauge_add("in_flight", -1, call=call)
+                    self.observe("latency_seconds", time.perf_counter() - started, call=call)
+                    self.inc("calls_total", call=call, outcome=outcome)
+                    if provider:
+                        self.inc("provider_requests_total", provider=provider, outcome=outcome)
+            return wrapper
+        return decorate
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: "uptime", "counters", "gauges" and "histograms" (each summarised
+                  with count, sum, mean, estimated p50/p90/p99 and cumulative buckets).
+        """
+        return {
+            "uptime": time.time() - self.started_at,
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "histograms": {key: histogram.summary() for key, histogram in self.histograms.items()}
+        }
+
+metrics = Metrics()
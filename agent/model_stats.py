@@ -0,0 +1,174 @@
+import os
+import time
+from collections import deque
+from log import get_logger
+
+MODEL_STATS_WINDOW = int(os.getenv("MODEL_STATS_WINDOW", "200"))  # Most recent calls kept per model
+MODEL_STATS_MAX_AGE = float(os.getenv("MODEL_STATS_MAX_AGE", "21600"))  # Seconds before a call drops out of the window
+
+OUTCOMES = ("ok", "parse_failure", "http_error")
+
+log = get_logger("model_stats")
+
+class CallSample:
+    def __init__(self, latency, outcome, prompt_tokens=0, completion_tokens=0):
+        self.latency = latency
+        self.outcome = outcome
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.recorded_at = time.time()
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a list of numbers, 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[rank]
+
+class ModelStats:
+    """
+    Rolling per-model record of lyric generation calls: how long they took, how
+    many tokens they used and whether they failed at the HTTP level or returned
+    something parse_song_response could not turn into a song.
+
+    Args:
+        window (int): Calls kept per model.
+        max_age (float): Seconds after which a call is forgotten.
+    """
+    def __init__(self, window=MODEL_STATS_WINDOW, max_age=MODEL_STATS_MAX_AGE):
+        self.window = window
+        self.max_age = max_age
+        self.samples = {}
+
+    def record(self, model_name, latency, outcome="ok", usage=None):
+        """
+        Args:
+            model_name (str): The model that was called.
+            latency (float): Seconds from request to parsed song (or failure).
+            outcome (str): One of OUTCOMES.
+            usage (dict): The provider's usage block (nano_info), if any.
+        """
+        if outcome not in OUTCOMES:
+            raise ValueError(f"Unknown outcome '{outcome}'")
+        usage = usage or {}
+        samples = self.samples.setdefault(model_name, deque(maxlen=self.window))
+        samples.append(CallSample(
+            latency,
+            outcome,
+            prompt_tokens=usage.get("prompt_tokens", 0) or 0,
+            completion_tokens=usage.get("completion_tokens", 0) or 0
+        ))
+
+    def _recent(self, model_name):
+        samples = self.samples.get(model_name, ())
+        cutoff = time.time() - self.max_age
+        while samples and samples[0].recorded_at < cutoff:
+            samples.popleft()
+        return list(samples)
+
+    def latency_quantile(self, model_name, fraction, min_samples=1):
+        """
+        Latency of the model's successful calls at the given fraction (0.9 for
+        p90), or None with fewer than min_samples successes in the window.
+        """
+        latencies = [s.latency for s in self._recent(model_name) if s.outcome == "ok"]
+        return percentile(latencies, fraction) if len(latencies) >= min_samples else None
+
+    def model_summary(self, model_name):
+        samples = self._recent(model_name)
+        calls = len(samples)
+        ok = [s for s in samples if s.outcome == "ok"]
+        latencies = [s.latency for s in ok]
+        return {
+            "calls": calls,
+            "ok": len(ok),
+            "parse_failures": sum(1 for s in samples if s.outcome == "parse_failure"),
+            "http_errors": sum(1 for s in samples if s.outcome == "http_error"),
+            "failure_rate": (calls - len(ok)) / calls if calls else 0.0,
+            "latency_p50": percentile(latencies, 0.5),
+            "latency_p90": percentile(latencies, 0.9),
+            "latency_p99": percentile(latencies, 0.99),
+            "prompt_tokens_avg": sum(s.prompt_tokens for s in ok) / len(ok) if ok else 0.0,
+            "completion_tokens_avg": sum(s.completion_tokens for s in ok) / len(ok) if ok else 0.0
+        }
+
+    def summary(self):
+        """
+        Returns:
+            dict: Model name to its model_summary, for every model seen in the window.
+        """
+        return {model_name: self.model_summary(model_name) for model_name in list(self.samples)}
+
+model_stats = ModelStats()
+
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "10"))  # Recent calls a model's breaker looks at
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "4"))  # Calls needed before a breaker can open
+CIRCUIT_ERROR_RATE = float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))  # Failure rate that opens a breaker
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", "120"))  # Seconds an open breaker blocks a model
+
+class CircuitBreaker:
+    """
+    Stops sending lyric requests to a model whose recent calls mostly fail.
+
+    A model's breaker opens once at least min_calls of its last window calls
+    are recorded and the failure rate reaches error_rate. After the cooldown
+    one trial call is let through (half-open). Success closes the breaker;
+    failure keeps it open for another cooldown.
+
+    Args:
+        window (int): Recent outcomes kept per model.
+        min_calls (int): Outcomes needed before the breaker may open.
+        error_rate (float): Failure fraction that opens the breaker.
+        cooldown (float): Seconds to block a model once open.
+    """
+    def __init__(self, window=CIRCUIT_WINDOW, min_calls=CIRCUIT_MIN_CALLS, error_rate=CIRCUIT_ERROR_RATE,
+                 cooldown=CIRCUIT_COOLDOWN):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.outcomes = {}
+        self.opened_at = {}
+        self.trials = set()
+
+    def allow(self, model_name):
+        """
+        True if a call to the model may be made now. Claims the single trial
+        call when a breaker's cooldown has passed.
+        """
+        opened_at = self.opened_at.get(model_name)
+        if opened_at is None:
+            return True
+        if model_name in self.trials or time.monotonic() - opened_at < self.cooldown:
+            return False
+        self.trials.add(model_name)
+        return True
+
+    def is_open(self, model_name):
+        return model_name in self.opened_at
+
+    def record(self, model_name, ok):
+        outcomes = self.outcomes.setdefault(model_name, deque(maxlen=self.window))
+        outcomes.append(ok)
+        if model_name in self.trials:
+            self.trials.discard(model_name)
+            if ok:
+                self.opened_at.pop(model_name, None)
+                outcomes.clear()
+            else:
+                self.opened_at[model_name] = time.monotonic()
+            return
+        failures = outcomes.count(False)
+        if len(outcomes) >= self.min_calls and failures / len(outcomes) >= self.error_rate:
+            if model_name not in self.opened_at:
+                log.warning("llm.circuit_opened", model=model_name, failures=failures, calls=len(outcomes))
+            self.opened_at[model_name] = time.monotonic()
+
+    def release(self, model_name):
+        """Gives back a trial call that was cancelled before it finished."""
+        self.trials.discard(model_name)
+
+breaker = CircuitBreaker()
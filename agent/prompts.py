@@ -0,0 +1,216 @@
+import os
+import re
+import sys
+import math
+import time
+import random
+from collections import Counter
+from xml_tools import toolbox, formatter
+sys.path.insert(0, os.path.abspath("../common"))
+from stations import STATIONS, get_station_instructions
+
+PROMPT_DIR = os.getenv("PROMPT_DIR", os.path.dirname(os.path.abspath(__file__)))
+PROMPT_RELOAD_INTERVAL = float(os.getenv("PROMPT_RELOAD_INTERVAL", "10"))  # Seconds between mtime checks
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))  # Approximate tokens for system + user prompt
+
+WORD_RE = re.compile(r"[a-z][a-z']+")
+
+def approx_tokens(text):
+    """
+    Rough token count for budgeting, about four characters per token.
+    """
+    return (len(text) + 3) // 4
+
+def term_counts(text):
+    return Counter(WORD_RE.findall(text.lower()))
+
+class ExampleIndex:
+    """
+    TF-IDF vectors for the example songs, built once per corpus load, so few-shot
+    examples can be picked by similarity to the station and instruction.
+
+    Args:
+        songs (dict): Example file name to song XML.
+    """
+    def __init__(self, songs):
+        counts = {name: term_counts(text) for name, text in songs.items()}
+        document_frequency = Counter(term for terms in counts.values() for term in terms)
+        total = len(songs)
+        self.idf = {term: math.log((1 + total) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        self.vectors = {name: self._normalize(terms) for name, terms in counts.items()}
+
+    def _normalize(self, counts):
+        vector = {term: count * self.idf.get(term, 0) for term, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1
+        return {term: weight / norm for term, weight in vector.items() if weight}
+
+    def rank(self, query):
+        """
+        Returns example names ordered from most to least similar to the query.
+        Ties are shuffled so equally relevant examples rotate between calls.
+        """
+        query_vector = self._normalize(term_counts(query))
+        scored = []
+        for name, vector in self.vectors.items():
+            score = sum(weight * vector.get(term, 0) for term, weight in query_vector.items())
+            scored.append((score, random.random(), name))
+        scored.sort(reverse=True)
+        return [name for _, _, name in scored]
+
+class PromptCorpus:
+    """
+    The prompt files generate_song needs, loaded once.
+
+    base.txt, system.txt, instructions/*.txt and songs/*.xml are read into memory
+    along with the toolbox usage prompt, every station's instruction block and a
+    similarity index over the example songs.
+    refresh() re-stats the files at most once per reload interval and reloads
+    everything only if a file was added, removed or modified, so building a
+    prompt is a handful of string joins.
+
+    Args:
+        root (str): Directory containing the prompt files.
+        reload_interval (float): Minimum seconds between mtime checks.
+        token_budget (int): Approximate token ceiling for system + user prompt;
+                            few-shot examples are dropped to stay under it.
+    """
+    def __init__(self, root=PROMPT_DIR, reload_interval=PROMPT_RELOAD_INTERVAL, token_budget=PROMPT_TOKEN_BUDGET):
+        self.root = root
+        self.reload_interval = reload_interval
+        self.token_budget = token_budget
+        self.reloads = 0
+        self._mtimes = {}
+        self._checked_at = 0
+        self.load()
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def _list(self, directory, extension):
+        return sorted(f for f in os.listdir(self._path(directory)) if f.endswith(extension))
+
+    def _read(self, *parts):
+        with open(self._path(*parts), "r") as file:
+            return file.read().strip()
+
+    def _snapshot(self):
+        paths = [self._path("base.txt"), self._path("system.txt"),
+                 self._path("instructions"), self._path("songs")]
+        paths += [self._path("instructions", f) for f in self._list("instructions", ".txt")]
+        paths += [self._path("songs", f) for f in self._list("songs", ".xml")]
+        return {path: os.stat(path).st_mtime_ns for path in paths}
+
+    def load(self):
+        """
+        Reads every prompt file and precomputes the reusable prompt blocks.
+
+        Raises:
+            FileNotFoundError: If the instructions or songs are missing.
+            IOError: If a file cannot be read.
+        """
+        mtimes = self._snapshot()
+        instruction_files = self._list("instructions", ".txt")
+        if not instruction_files:
+            raise FileNotFoundError("No instruction files found in the instructions directory.")
+        song_files = self._list("songs", ".xml")
+        if not song_files:
+            raise FileNotFoundError("No song files found in songs directory")
+
+        self.base_prompt = self._read("base.txt")
+        self.system_prompt = self._read("system.txt")
+        self.instructions = [self._read("instructions", f) for f in instruction_files]
+        self.songs = {f: self._read("songs", f) for f in song_files}
+        self.examples = {
+            name: f"<use_tool>\n<name>song</name>\n{song}\n</use_tool>" for name, song in self.songs.items()
+        }
+        self.example_tokens = {name: approx_tokens(example) for name, example in self.examples.items()}
+        self.example_index = ExampleIndex(self.songs)
+        self.usage_prompt = formatter.usage_prompt(toolbox)
+        self.user_prefix = self.usage_prompt + "\n\n" + self.base_prompt
+        self.station_blocks = {station["id"]: get_station_instructions(station["id"]) for station in STATIONS}
+
+        self._mtimes = mtimes
+        self._checked_at = time.monotonic()
+        self.reloads += 1
+
+    def refresh(self):
+        """
+        Reloads the corpus if a file changed since the last load.
+        Checks the filesystem at most once per reload interval.
+        """
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        if self._snapshot() != self._mtimes:
+            self.load()
+
+    def random_instruction(self):
+        return random.choice(self.instructions)
+
+    def station_block(self, station):
+        return self.station_blocks.get(station, "")
+
+    def select_examples(self, query, n_shot, token_budget):
+        """
+        Picks up to n_shot example songs most similar to the query whose combined
+        size fits in token_budget.
+
+        Returns:
+            list: Example names, most similar first.
+        """
+        selected = []
+        for name in self.example_index.rank(query):
+            if len(selected) >= n_shot:
+                break
+            if self.example_tokens[name] <= token_budget:
+                selected.append(name)
+                token_budget -= self.example_tokens[name]
+        return selected
+
+    def build(self, instruction, artist=None, station=None, n_shot=0):
+        """
+        Assembles the system and user prompts without touching the filesystem.
+
+        Args:
+            instruction (str): The instruction for the song.
+            artist (str): Optional artist persona for the model.
+            station (str): Optional station id whose instructions are appended.
+            n_shot (int): Maximum number of example songs to include. Examples are
+                          chosen by similarity to the instruction and station and
+                          trimmed to fit the corpus token budget.
+
+        Returns:
+            tuple: (system_prompt, user_prompt)
+        """
+        station_block = self.station_block(station) if station else ""
+        if station_block:
+            instruction += "\n\n" + station_block
+        instructions = f"\n\nAdditional Instructions:\n{instruction}"
+        if artist:
+            instructions += f"\n\nYou are the artist: {artist}"
+
+        examples = ""
+        if n_shot > 0:
+            used = approx_tokens(self.system_prompt) + approx_tokens(self.user_prefix) + approx_tokens(instructions)
+            selected = self.select_examples(instruction, n_shot, self.token_budget - used)
+            examples = "".join(
+                f"\nExample {idx + 1}:\nSong:\n{self.examples[name]}" for idx, name in enumerate(selected)
+            )
+            if examples:
+                examples = "\n" + examples
+        return self.system_prompt, self.user_prefix + examples + instructions
+
+_corpus = None
+
+def get_prompt_corpus():
+    """
+    Returns the process-wide corpus, loading it on first use and refreshing it
+    if the prompt files have changed.
+    """
+    global _corpus
+    if _corpus is None:
+        _corpus = PromptCorpus()
+    else:
+        _corpus.refresh()
+    return _corpus
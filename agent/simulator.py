@@ -0,0 +1,260 @@
+import os
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import httpx
+
+# Configuration for the offline provider simulator
+PROVIDER_SIMULATOR = os.getenv("PROVIDER_SIMULATOR", "").lower()  # Profile name; empty talks to the real providers
+PROVIDER_SIMULATOR_SCALE = os.getenv("PROVIDER_SIMULATOR_SCALE")  # Overrides the profile's time scale, e.g. 0.01
+PROVIDER_SIMULATOR_SEED = os.getenv("PROVIDER_SIMULATOR_SEED")  # Makes a run reproducible
+
+# Latencies are (median seconds, lognormal sigma) at time scale 1, i.e. real-world speed.
+REALISTIC = {
+    "time_scale": 1.0,
+    "llm_ttft": (2.5, 0.6),
+    "llm_tokens_per_second": 60,
+    "llm_error_rate": 0.02,
+    "llm_parse_failure_rate": 0.03,
+    "llm_rate_limit": (10, 20),  # (requests per second, burst)
+    "llm_slow_models": {"deepseek-reasoner": 4.0, "r1-1776": 3.0, "o3-mini": 2.0, "gemini-2.0-flash-thinking-exp-01-21": 1.5},
+    "suno_submit": (1.5, 0.3),
+    "suno_streaming_after": (35.0, 0.3),
+    "suno_complete_after": (110.0, 0.3),
+    "suno_error_rate": 0.03,
+    "suno_submit_error_rate": 0.01,
+    "suno_rate_limit": (5, 10),
+}
+
+PROFILES = {
+    "realistic": REALISTIC,
+    # Same shape, compressed a hundredfold for load tests on a laptop
+    "fast": dict(REALISTIC, time_scale=0.01),
+    # No failures, no rate limits, near-zero latency: for functional checks
+    "instant": dict(
+        REALISTIC, time_scale=0.001, llm_error_rate=0.0, llm_parse_failure_rate=0.0, suno_error_rate=0.0,
+        suno_submit_error_rate=0.0, llm_rate_limit=None, suno_rate_limit=None
+    ),
+    # A bad day: slow models, frequent errors and tight rate limits
+    "degraded": dict(
+        REALISTIC, time_scale=0.01, llm_ttft=(8.0, 0.9), llm_error_rate=0.15, llm_parse_failure_rate=0.1,
+        llm_rate_limit=(2, 4), suno_complete_after=(240.0, 0.5), suno_error_rate=0.1,
+        suno_submit_error_rate=0.05, suno_rate_limit=(1, 3)
+    ),
+}
+
+TITLE_WORDS = ["Neon", "Midnight", "Echo", "Static", "Velvet", "Signal", "Gravity", "Silver", "Drift", "Pulse"]
+LYRIC_LINES = [
+    "We run the city on a borrowed heartbeat",
+    "Every light is humming in a minor key",
+    "Hold the frequency until the morning",
+    "Turn it up, the static sounds like home",
+    "Counting down the seconds in the afterglow",
+    "Find me where the signal starts to fade",
+]
+STYLES = ["synthwave, driving bass", "lo-fi hip hop, mellow keys", "indie pop, bright guitars", "ambient, slow pads"]
+
+class TokenBucket:
+    def __init__(self, rate, burst, clock):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.clock = clock
+        self.updated_at = clock()
+
+    def take(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+class SimulatedSong:
+    def __init__(self, song_id, title, created_at, streaming_at, complete_at, fails):
+        self.song_id = song_id
+        self.title = title
+        self.created_at = created_at
+        self.streaming_at = streaming_at
+        self.complete_at = complete_at
+        self.fails = fails
+
+    def status(self, now):
+        if now < self.streaming_at:
+            return "submitted"
+        if self.fails:
+            return "error"
+        return "streaming" if now < self.complete_at else "complete"
+
+class ProviderSimulator(httpx.AsyncBaseTransport):
+    """
+    An httpx transport that answers NanoGPT, local-server and Suno requests
+    offline, with the behaviour that matters under load.
+
+    Chat completions return a song tool call, streamed or not, after a
+    lognormal time to first token. Reasoning models are slower, and a share of
+    requests fail or come back unparseable. Suno generations move through
+    submitted, streaming and complete (or error) on their own lognormal
+    schedule. Both providers answer 429 once their token bucket is empty.
+    Durations are multiplied by the profile's time_scale. At 1.0 a song takes
+    as long as it really would; "fast" runs a hundred times quicker.
+
+    Args:
+        profile (dict): One of PROFILES, or a dict with the same keys.
+        seed (int): Seed for the simulator's random choices.
+    """
+    def __init__(self, profile, seed=None):
+        self.profile = profile
+        self.scale = profile["time_scale"]
+        self.rng = random.Random(seed)
+        self.songs = {}
+        self.requests = {"chat": 0, "generate": 0, "query": 0, "rate_limited": 0}
+        self._started = time.monotonic()
+        self._buckets = {
+            name: TokenBucket(*profile[key], clock=self.now) if profile.get(key) else None
+            for name, key in (("llm", "llm_rate_limit"), ("suno", "suno_rate_limit"))
+        }
+
+    def now(self):
+        """Simulated seconds since start, at real-world speed."""
+        return (time.monotonic() - self._started) / self.scale if self.scale else math.inf
+
+    def _sample(self, key, factor=1.0):
+        median, sigma = self.profile[key]
+        return median * factor * math.exp(self.rng.gauss(0, sigma))
+
+    async def _sleep(self, seconds):
+        await asyncio.sleep(seconds * self.scale)
+
+    def _rate_limited(self, provider):
+        bucket = self._buckets[provider]
+        if bucket is None or bucket.take():
+            return None
+        self.requests["rate_limited"] += 1
+        return httpx.Response(429, json={"error": "rate limit exceeded"}, headers={"Retry-After": "1"})
+
+    async def handle_async_request(self, request):
+        path = request.url.path
+        if path.endswith("/chat/completions"):
+            self.requests["chat"] += 1
+            return self._rate_limited("llm") or await self._chat(json.loads(request.content))
+        if path.endswith("/generate/music"):
+            self.requests["generate"] += 1
+            return self._rate_limited("suno") or await self._suno_generate(json.loads(request.content))
+        if path.endswith("/query"):
+            self.requests["query"] += 1
+            return self._rate_limited("suno") or await self._suno_query(request.url.params.get("ids", ""))
+        return httpx.Response(404, json={"error": f"{path} is not simulated"})
+
+    def _song_text(self):
+        title = " ".join(self.rng.sample(TITLE_WORDS, 2))
+        verse = "\n".join(self.rng.sample(LYRIC_LINES, 4))
+        chorus = "\n".join(self.rng.sample(LYRIC_LINES, 2))
+        song = (
+            "<use_tool>\n<name>song</name>\n"
+            f"<description>A simulated song called {title}.</description>\n"
+            f"<title>{title}</title>\n"
+            f"<lyrics>[Verse]\n{verse}\n\n[Chorus]\n{chorus}</lyrics>\n"
+            f"<style>{self.rng.choice(STYLES)}</style>\n"
+            "<negative_style>country</negative_style>\n</use_tool>"
+        )
+        if self.rng.random() < self.profile["llm_parse_failure_rate"]:
+            # Models sometimes ramble past the budget and never close the tool call
+            return song.replace("</use_tool>", "Let me know if you want another verse!")
+        return song
+
+    async def _chat(self, payload):
+        model = payload.get("model", "local")
+        factor = self.profile["llm_slow_models"].get(model, 1.0)
+        await self._sleep(self._sample("llm_ttft", factor))
+        if self.rng.random() < self.profile["llm_error_rate"]:
+            return httpx.Response(self.rng.choice([500, 502, 503]), json={"error": "simulated provider error"})
+
+        content = self._song_text()
+        tokens = max(1, len(content) // 4)
+        usage = {"prompt_tokens": 1500, "completion_tokens": tokens, "total_tokens": 1500 + tokens}
+        seconds_per_token = 1.0 / (self.profile["llm_tokens_per_second"] / factor)
+        if not payload.get("stream"):
+            await self._sleep(tokens * seconds_per_token)
+            return httpx.Response(200, json={
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+
+        async def events():
+            for i in range(0, len(content), 32):
+                await self._sleep(8 * seconds_per_token)
+                event = {"choices": [{"index": 0, "delta": {"content": content[i:i + 32]}}]}
+                yield f"data: {json.dumps(event)}\n\n".encode()
+            yield f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode()
+            yield b"data: [DONE]\n\n"
+
+        return httpx.Response(200, content=events(), headers={"Content-Type": "text/event-stream"})
+
+    async def _suno_generate(self, payload):
+        await self._sleep(self._sample("suno_submit"))
+        if self.rng.random() < self.profile["suno_submit_error_rate"]:
+            return httpx.Response(200, json={"code": 1, "msg": "simulated submission failure", "data": []})
+        now = self.now()
+        data = []
+        for _ in range(2):
+            song_id = str(uuid.UUID(int=self.rng.getrandbits(128)))
+            streaming_at = now + self._sample("suno_streaming_after")
+            complete_at = max(streaming_at, now + self._sample("suno_complete_after"))
+            fails = self.rng.random() < self.profile["suno_error_rate"]
+            self.songs[song_id] = SimulatedSong(song_id, payload.get("title", ""), now, streaming_at, complete_at, fails)
+            data.append({"song_id": song_id})
+        return httpx.Response(200, json={"code": 0, "data": data})
+
+    async def _suno_query(self, ids):
+        await self._sleep(0.3)
+        now = self.now()
+        items = []
+        for song_id in filter(None, ids.split(",")):
+            song = self.songs.get(song_id)
+            if song is None:
+                items.append({"song_id": song_id, "status": "error", "meta_data": {"error_message": "song not found"}})
+                continue
+            status = song.status(now)
+            item = {"song_id": song_id, "status": status, "title": song.title, "meta_data": {}}
+            if status == "error":
+                item["meta_data"]["error_message"] = "simulated generation failure"
+            if status in ("streaming", "complete"):
+                item["audio_url"] = f"https://cdn.simulator.local/{song_id}.mp3"
+                item["image_url"] = f"https://cdn.simulator.local/{song_id}.jpg"
+                item["image_large_url"] = f"https://cdn.simulator.local/{song_id}-large.jpg"
+            if status == "complete":
+                item["video_url"] = f"https://cdn.simulator.local/{song_id}.mp4"
+            items.append(item)
+        return httpx.Response(200, json=items)
+
+_simulator = None
+
+def get_simulator():
+    """
+    Returns the process-wide ProviderSimulator for PROVIDER_SIMULATOR, or None
+    when it is unset. Every client shares it so Suno songs created through one
+    can be queried through another.
+    """
+    global _simulator
+    if _simulator is None and PROVIDER_SIMULATOR:
+        _simulator = simulator_from_env()
+    return _simulator
+
+def simulator_from_env():
+    """
+    Builds a ProviderSimulator for PROVIDER_SIMULATOR, or returns None when it is unset.
+    """
+    if not PROVIDER_SIMULATOR:
+        return None
+    if PROVIDER_SIMULATOR not in PROFILES:
+        raise ValueError(f"Unknown PROVIDER_SIMULATOR profile '{PROVIDER_SIMULATOR}'. Choose from {sorted(PROFILES)}.")
+    profile = dict(PROFILES[PROVIDER_SIMULATOR])
+    if PROVIDER_SIMULATOR_SCALE:
+        profile["time_scale"] = float(PROVIDER_SIMULATOR_SCALE)
+    seed = int(PROVIDER_SIMULATOR_SEED) if PROVIDER_SIMULATOR_SEED else None
+    return ProviderSimulator(profile, seed=seed)
@@ -1,13 +1,24 @@
 import os
-import requests
+import sys
+import math
+import time
+import random
+import asyncio
+import httpx
 import json
 from dotenv import load_dotenv
-import random
-import sys
 import re  # Added for regex parsing
-from xml_tools import toolbox, parser, formatter
+from xml_tools import toolbox, parser, SongStreamParser
+from client import get_http_client
+from local_provider import local_pool
+from simulator import PROVIDER_SIMULATOR
+from prompts import get_prompt_corpus, approx_tokens
+from model_stats import model_stats, breaker
+from metrics import metrics
+from log import get_logger, capture_payloads
 sys.path.insert(0, os.path.abspath("../common"))
-from stations import get_station_instructions, get_station_by_id
+from model_selector import get_model_nickname, get_model_weights, MODEL_MIN_SAMPLES
+from tracing import traced, set_attribute
 
 # Load environment variables from a .env file if present
 load_dotenv()
@@ -16,6 +27,12 @@ load_dotenv()
 GPT_PROVIDER = os.getenv("GPT_PROVIDER", "nanogpt").lower()  # Default to 'nanogpt' if not set
 
 N_SHOT = int(os.getenv("N_SHOT", "2"))  # Number of example songs to include
+LLM_STREAM = os.getenv("LLM_STREAM", "true").lower() == "true"  # Stream completions and stop at the closing song tag
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "300"))  # Seconds before a single lyric request is abandoned
+LLM_HEDGE = os.getenv("LLM_HEDGE", "true").lower() == "true"  # Race a second model when the first is slow or fails
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.9"))  # Latency percentile of the model after which to hedge
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "60"))  # Hedge delay for models without enough stats
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "5"))  # Never hedge sooner than this
 
 # Configuration for NanoGPT API
 NANOGPT_API_KEY = os.getenv("NANOGPT_API_KEY")
@@ -26,35 +43,34 @@ NANOGPT_BASE_URL = "https://nano-gpt.com/api/v1"
 LOCAL_SERVER_ADDRESS = os.getenv("LOCAL_SERVER_ADDRESS", "127.0.0.1")
 LOCAL_SERVER_PORT = os.getenv("LOCAL_SERVER_PORT", "5000")  # Ensure it's a string
 
+# Length limits enforced by apply_length_constraints
+TITLE_MAX_CHARS = 80
+LYRICS_MAX_CHARS = 3000
+STYLE_MAX_CHARS = 120
 
-print(f"Using GPT Provider: {GPT_PROVIDER.capitalize()}")
+# A completion longer than the longest song we would keep is wasted GPU time,
+# so local requests are capped at the kept characters (at a conservative three
+# characters per token) plus the thinking call base.txt asks for before the
+# song, and room for the tags and description. A completion cut off before
+# the song call closes does not parse at all.
+LOCAL_THINKING_TOKENS = int(os.getenv("LOCAL_THINKING_TOKENS", "1000"))
+LOCAL_TOKEN_HEADROOM = int(os.getenv("LOCAL_TOKEN_HEADROOM", "400"))
+LOCAL_MAX_TOKENS = int(os.getenv(
+    "LOCAL_MAX_TOKENS",
+    str(math.ceil((TITLE_MAX_CHARS + LYRICS_MAX_CHARS + 2 * STYLE_MAX_CHARS) / 3)
+        + LOCAL_THINKING_TOKENS + LOCAL_TOKEN_HEADROOM)
+))
 
-def load_random_instruction():
-    """
-    Loads a random instruction from the instructions directory.
+log = get_logger("singer")
 
-    Returns:
-        str: The content of a randomly selected instruction file.
-    """
-    instructions_dir = "instructions"
-    try:
-        instruction_files = [f for f in os.listdir(instructions_dir) if f.endswith('.txt')]
-        if not instruction_files:
-            raise FileNotFoundError("No instruction files found in the instructions directory.")
-        selected_file = random.choice(instruction_files)
-        with open(os.path.join(instructions_dir, selected_file), "r") as file:
-            instruction_content = file.read().strip()
-        return instruction_content
-    except Exception as e:
-        print(f"Error loading random instruction: {e}")
-        return None
+log.info("provider.configured", provider=GPT_PROVIDER, simulator=PROVIDER_SIMULATOR or None)
 
 def validate_environment():
     """
     Validates that necessary environment variables are set based on the selected GPT provider.
     """
     if GPT_PROVIDER == "nanogpt":
-        if not NANOGPT_API_KEY:
+        if not NANOGPT_API_KEY and not PROVIDER_SIMULATOR:
             raise ValueError("NANOGPT_API_KEY is not set. Please set it in the environment variables.")
     elif GPT_PROVIDER == "local":
         # Optionally, you can add validation for local server settings
@@ -62,7 +78,84 @@ def validate_environment():
     else:
         raise ValueError(f"Unsupported GPT_PROVIDER '{GPT_PROVIDER}'. Supported providers are 'nanogpt' and 'local'.")
 
-def talk_to_gpt(prompt, model=None, messages=None):
+def estimate_usage(messages, text):
+    """A usage block approximated from message and completion lengths, for streams cut short."""
+    prompt = "".join(message.get("content") or "" for message in messages)
+    return {
+        "prompt_tokens": approx_tokens(prompt),
+        "completion_tokens": approx_tokens(text),
+        "total_tokens": approx_tokens(prompt) + approx_tokens(text),
+        "estimated": True
+    }
+
+async def stream_chat_completion(url, headers, data, client=None):
+    """
+    Streams an OpenAI-compatible chat completion and stops reading as soon as a
+    complete song tool call has been parsed, closing the request early.
+
+    Stopping early means the provider's final usage chunk never arrives, so
+    usage is then estimated from the prompt and output lengths (marked
+    "estimated") rather than left empty.
+
+    Args:
+        url (str): The chat completions endpoint.
+        headers (dict): Request headers.
+        data (dict): The request payload; "stream" is forced on.
+        client (httpx.AsyncClient): Client to send it with, the shared one by default.
+
+    Returns:
+        dict: "text_response", "nano_info" (the provider's usage, or an estimate),
+              "song_event" (the parsed song tool call or None) and "metrics" with
+              "ttft" (time to first token) and "time_to_song" in seconds.
+    """
+    song_parser = SongStreamParser()
+    chunks = []
+    usage = {}
+    started = time.perf_counter()
+    ttft = None
+    time_to_song = None
+
+    async with (client or get_http_client()).stream("POST", url, headers=headers, json={**data, "stream": True}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                break
+            chunk = json.loads(payload)
+            usage = chunk.get("usage") or usage
+            choices = chunk.get("choices") or []
+            content = choices[0].get("delta", {}).get("content") if choices else None
+            if not content:
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            chunks.append(content)
+            if song_parser.feed(content):
+                time_to_song = time.perf_counter() - started
+                break
+
+    if song_parser.song_event is None:
+        song_parser.close()
+    text = "".join(chunks)
+    if not usage.get("completion_tokens"):
+        usage = estimate_usage(data.get("messages") or [], text)
+    return {
+        "text_response": text,
+        "nano_info": usage,
+        "song_event": song_parser.song_event,
+        "metrics": {
+            "ttft": ttft,
+            "time_to_song": time_to_song,
+            "total": time.perf_counter() - started,
+            "stopped_early": time_to_song is not None
+        }
+    }
+
+@metrics.timed("talk_to_gpt", provider="nanogpt")
+@traced(provider="nanogpt")
+async def talk_to_gpt(prompt, model=None, messages=None, stream=LLM_STREAM):
     """
     Sends a prompt to the NanoGPT API using the OpenAI-compatible chat completions endpoint
     and returns the response in the same format as before.
@@ -72,11 +165,14 @@ def talk_to_gpt(prompt, model=None, messages=None):
         model (str): The model to use for generation.
         messages (list): Optional list of message dictionaries for context.
                          If provided, the prompt is appended as a user message.
+        stream (bool): Stream the completion and stop at the closing song tag.
 
     Returns:
-        dict: A dictionary with two keys:
+        dict: A dictionary with the keys:
               - "text_response": The generated text from the assistant.
               - "nano_info": Additional info (e.g. usage statistics) from the API.
+              - "song_event": The song tool call parsed while streaming, if any.
+              - "metrics": Timings, see stream_chat_completion.
     """
     if model is None:
         model = NANOGPT_DEFAULT_MODEL
@@ -104,11 +200,23 @@ def talk_to_gpt(prompt, model=None, messages=None):
 
     endpoint = f"{NANOGPT_BASE_URL}/chat/completions"
 
+    if stream:
+        data["stream_options"] = {"include_usage": True}
+        try:
+            return await stream_chat_completion(endpoint, headers, data)
+        except httpx.HTTPError as e:
+            log.warning("llm.request_failed", provider="nanogpt", model=model, error=e)
+            return None
+        except (KeyError, json.JSONDecodeError) as e:
+            log.warning("llm.bad_response", provider="nanogpt", model=model, error=e)
+            return None
+
+    started = time.perf_counter()
     try:
-        response = requests.post(endpoint, headers=headers, json=data)
+        response = await get_http_client().post(endpoint, headers=headers, json=data)
         response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        print(f"HTTP Request to NanoGPT failed: {e}")
+    except httpx.HTTPError as e:
+        log.warning("llm.request_failed", provider="nanogpt", model=model, error=e)
         return None
 
     try:
@@ -128,47 +236,70 @@ def talk_to_gpt(prompt, model=None, messages=None):
         nano_info = result.get("usage", {})
         return {
             "text_response": text_response,
-            "nano_info": nano_info
+            "nano_info": nano_info,
+            "song_event": None,
+            "metrics": {"total": time.perf_counter() - started}
         }
     except (KeyError, json.JSONDecodeError) as e:
-        print(f"Error parsing NanoGPT response: {e}")
+        log.warning("llm.bad_response", provider="nanogpt", model=model, error=e)
         return None
 
-def send_payload(prompt, server=LOCAL_SERVER_ADDRESS, port=LOCAL_SERVER_PORT):
+@metrics.timed("send_payload", provider="local")
+@traced(provider="local")
+async def send_payload(prompt, server=LOCAL_SERVER_ADDRESS, port=LOCAL_SERVER_PORT, stream=LLM_STREAM):
     """
     Sends a formatted prompt to a local server for text generation.
 
+    Requests share the local pool's keep-alive connections and wait for one of
+    its in-flight slots, and are capped at LOCAL_MAX_TOKENS.
+
     Args:
         prompt (str): The input prompt to send to the local server.
         server (str): The server address. Defaults to LOCAL_SERVER_ADDRESS.
         port (str): The server port. Defaults to LOCAL_SERVER_PORT.
+        stream (bool): Stream the completion and stop at the closing song tag.
 
     Returns:
-        str: The generated text from the local server.
+        dict: Same keys as talk_to_gpt.
     """
     # Define the generation parameters
     params = {
         "messages": [{"role": "user", "content": prompt}],
-        "max_tokens": 8192
+        "max_tokens": LOCAL_MAX_TOKENS
     }
 
     # Prepare the payload
     payload = params
+    endpoint = f"http://{server}:{port}/v1/chat/completions"
+    headers = {"Content-Type": "application/json"}
 
+    if stream:
+        try:
+            async with local_pool.slot() as client:
+                return await stream_chat_completion(endpoint, headers, payload, client=client)
+        except (httpx.HTTPError, KeyError, json.JSONDecodeError) as e:
+            log.warning("llm.request_failed", provider="local", server=server, error=e)
+            return None
+
+    started = time.perf_counter()
     try:
-        response = requests.post(
-            f"http://{server}:{port}/v1/chat/completions",
-            json=payload,
-            headers={"Content-Type": "application/json"}
-        )
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        print(f"HTTP Request to local server failed: {e}")
+        async with local_pool.slot() as client:
+            response = await client.post(endpoint, json=payload, headers=headers)
+            response.raise_for_status()
+    except httpx.HTTPError as e:
+        log.warning("llm.request_failed", provider="local", server=server, error=e)
         return None
 
-    return response.json()["choices"][0]["message"]["content"]
+    return {
+        "text_response": response.json()["choices"][0]["message"]["content"],
+        "nano_info": {},
+        "song_event": None,
+        "metrics": {"total": time.perf_counter() - started}
+    }
 
-def generate_song(instruction=None, model_name=None, artist=None, station=None):
+@metrics.timed("generate_song", ok=bool)
+@traced()
+async def generate_song(instruction=None, model_name=None, artist=None, station=None):
     """
     Generates a song based on the provided instruction.
 
@@ -182,107 +313,228 @@ def generate_song(instruction=None, model_name=None, artist=None, station=None):
     try:
         validate_environment()
     except ValueError as e:
-        print(f"Configuration Error: {e}")
+        log.error("config.invalid", error=e)
         return None
+    try:
+        corpus = get_prompt_corpus()
+    except (FileNotFoundError, IOError) as e:
+        log.error("prompt.corpus_failed", error=e)
+        return None
+
     if instruction is None or instruction.strip() == "":
-        instruction = load_random_instruction()
-        if not instruction:
-            print("Failed to load a random instruction.")
-            return None
+        instruction = corpus.random_instruction()
 
-    # If a station is provided, lookup the station instructions and append to the prompt.
-    if station:
+    # Prompts and responses are only logged in full if no song comes out of them
+    with capture_payloads() as dump_payloads:
         try:
-            station_instructions = get_station_instructions(station)
-            if station_instructions:
-                instruction += "\n\n" + station_instructions
+            song = await write_song(corpus, instruction, model_name, artist, station)
         except Exception as e:
-            print(f"Error loading station instruction: {e}")
-
-    # Get random song files for examples
-    try:
-        song_files = [f for f in os.listdir("songs") if f.endswith('.xml')]
-        if not song_files:
-            raise FileNotFoundError("No song files found in songs directory")
-
-        # Read base prompt and system prompt
-        with open("base.txt", "r") as file:
-            base_prompt = file.read().strip()
-        with open("system.txt", "r") as file:
-            system_prompt = file.read().strip()
-
-        #system_prompt += "\n"+formatter.usage_prompt(toolbox)
-        messages = [{"role": "system", "content": system_prompt}]
-
-        # Select random examples
-        examples = []
-        num_examples = min(N_SHOT, len(song_files))
-        selected_songs = random.sample(song_files, num_examples)
-
-        #for idx, song_file in enumerate(selected_songs):
-        #    with open(f"songs/{song_file}", "r") as song_f:
-        #        song_content = song_f.read().strip()
-        #        song_content = f"<use_tool>\n<name>song</name>\n{song_content}</use_tool>"
-        #    examples.append(f"\nExample {idx + 1}:\nSong:\n{song_content}")
-
-        # Build the user prompt
-        user_prompt = formatter.usage_prompt(toolbox)+"\n\n"+base_prompt+f"\n\nAdditional Instructions:\n{instruction}"#f"{base_prompt}\n{''.join(examples)}\n\nInstructions:\n{instruction}"
-        if artist:
-            user_prompt += f"\n\nYou are the artist: {artist}"
-
-        print("SYSTEM", system_prompt, "USER", user_prompt)
-
-    except FileNotFoundError as e:
-        print(f"Error: {e}")
-        return None
-    except IOError as e:
-        print(f"Error reading files: {e}")
-        return None
+            dump_payloads("exception", error=repr(e))
+            raise
+        if not song:
+            log.error("song.failed", provider=GPT_PROVIDER, model=model_name, station=station)
+            dump_payloads("no song", model=model_name, station=station)
+        return song
+
+async def write_song(corpus, instruction, model_name, artist, station):
+    """
+    Writes the song with the configured GPT provider.
 
-    # Call the appropriate GPT provider
+    Returns:
+        dict: The song data, or None on failure.
+    """
     if GPT_PROVIDER == "nanogpt":
-        print("\n--- Using NanoGPT API ---")
-        nano_response = talk_to_gpt(user_prompt, messages=messages, model=model_name)
-        if nano_response:
-            print("NanoGPT Response:", nano_response['text_response'])
-            song_data = parse_song_response(nano_response['text_response'])
-            return song_data
-        else:
-            print("Failed to get response from NanoGPT API.")
-            return None
+        return await write_with_hedging(corpus, instruction, model_name or NANOGPT_DEFAULT_MODEL, artist, station)
     elif GPT_PROVIDER == "local":
-        print("\n--- Using Local Server API ---")
-        local_response = send_payload(user_prompt)
+        # Station instructions, the toolbox usage prompt and the example index are precomputed
+        system_prompt, user_prompt = corpus.build(instruction, artist=artist, station=station, n_shot=N_SHOT)
+        log.payload("llm.prompt", provider="local", system=system_prompt, user=user_prompt)
+        started = time.perf_counter()
+        local_response = await send_payload(user_prompt)
         if local_response:
-            print("Local Server Response:", local_response)
-            song_data = parse_song_response(local_response)
-            return song_data
+            log.payload("llm.response", provider="local", text=local_response['text_response'])
+            log.info("llm.completed", provider="local", **local_response['metrics'])
+            return recorded_song_from_response("local", local_response, started)
         else:
-            print("Failed to get response from the local server.")
+            model_stats.record("local", time.perf_counter() - started, "http_error")
             return None
     else:
-        print(f"Unsupported GPT_PROVIDER '{GPT_PROVIDER}'. Please set it to 'nanogpt' or 'local'.")
+        log.error("config.invalid", error=f"Unsupported GPT_PROVIDER '{GPT_PROVIDER}', use 'nanogpt' or 'local'")
+        return None
+
+def hedge_delay(model_name):
+    """
+    Seconds to wait on a model before hedging: its recent latency percentile,
+    or a default until it has enough successful calls.
+    """
+    latency = model_stats.latency_quantile(model_name, LLM_HEDGE_PERCENTILE, min_samples=MODEL_MIN_SAMPLES)
+    if latency is None:
+        return LLM_HEDGE_DEFAULT_DELAY
+    return max(LLM_HEDGE_MIN_DELAY, latency)
+
+def pick_alternate(exclude):
+    """
+    Picks a model to hedge or fail over to, weighted by recent stats and
+    skipping models already tried or whose circuit is open.
+
+    Returns:
+        str: A model name, or None if no model is available.
+    """
+    weights = get_model_weights(model_stats.summary())
+    candidates = [m for m in weights if m not in exclude and not breaker.is_open(m)]
+    if not candidates:
+        return None
+    return random.choices(candidates, weights=[weights[m] for m in candidates])[0]
+
+def artist_for(model_name, requested_model, artist):
+    """The requested model's persona follows the request to whichever model writes it."""
+    if artist is None or artist == get_model_nickname(requested_model)[1]:
+        return get_model_nickname(model_name)[1]
+    return artist
+
+@traced()
+async def attempt_song(corpus, instruction, model_name, artist, station):
+    """
+    One lyric request to one model, bounded by LLM_TIMEOUT and recorded in the
+    model's stats and circuit breaker.
+
+    Returns:
+        dict: The song data with "model_name" and "artist_name" set, or None.
+    """
+    set_attribute("model_name", model_name)
+    # Station instructions, the toolbox usage prompt and the example index are precomputed
+    system_prompt, user_prompt = corpus.build(instruction, artist=artist, station=station, n_shot=N_SHOT)
+    messages = [{"role": "system", "content": system_prompt}]
+    log.payload("llm.prompt", model=model_name, system=system_prompt, user=user_prompt)
+
+    started = time.perf_counter()
+    try:
+        nano_response = await asyncio.wait_for(
+            talk_to_gpt(user_prompt, messages=messages, model=model_name), LLM_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        log.warning("llm.timeout", model=model_name, timeout=LLM_TIMEOUT)
+        nano_response = None
+    except asyncio.CancelledError:
+        breaker.release(model_name)
+        raise
+    if not nano_response:
+        log.warning("llm.no_response", model=model_name)
+        model_stats.record(model_name, time.perf_counter() - started, "http_error")
+        breaker.record(model_name, False)
         return None
 
+    log.payload("llm.response", model=model_name, text=nano_response['text_response'])
+    log.info("llm.completed", model=model_name, **nano_response['metrics'])
+    try:
+        song = recorded_song_from_response(model_name, nano_response, started)
+    except Exception as e:
+        log.warning("llm.parse_failed", model=model_name, error=e)
+        song = None
+    breaker.record(model_name, bool(song))
+    if not song:
+        return None
+    song['model_name'] = model_name
+    song['artist_name'] = artist
+    return song
+
+async def write_with_hedging(corpus, instruction, model_name, artist, station):
+    """
+    Requests the song from model_name. With LLM_HEDGE on, if no parsed song has
+    arrived after the model's hedge_delay, or the request fails first, a second
+    request goes to an alternate model. The first song to parse wins and the
+    other request is cancelled. A model whose circuit is open is replaced by an
+    alternate up front.
+
+    Returns:
+        dict: The song data, or None if every attempt failed.
+    """
+    requested = model_name
+    if not breaker.allow(model_name):
+        fallback = pick_alternate({model_name})
+        if fallback:
+            log.info("llm.circuit_fallback", model=model_name, fallback=fallback)
+            model_name = fallback
+    tried = {requested, model_name}
+    attempts = {
+        asyncio.create_task(
+            attempt_song(corpus, instruction, model_name, artist_for(model_name, requested, artist), station)
+        ): model_name
+    }
+    hedged = not LLM_HEDGE
+    delay = hedge_delay(model_name)
+    try:
+        while attempts:
+            done, _ = await asyncio.wait(attempts, timeout=None if hedged else delay, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                attempts.pop(task)
+                song = task.result()
+                if song:
+                    return song
+            if hedged:
+                continue
+            hedged = True
+            alternate = pick_alternate(tried)
+            if alternate is None:
+                continue
+            log.info("llm.hedged", model=model_name, alternate=alternate, after="failure" if done else round(delay, 1))
+            tried.add(alternate)
+            task = asyncio.create_task(
+                attempt_song(corpus, instruction, alternate, artist_for(alternate, requested, artist), station)
+            )
+            attempts[task] = alternate
+    finally:
+        for task in attempts:
+            task.cancel()
+        await asyncio.gather(*attempts, return_exceptions=True)
+    return None
+
+def song_from_response(response):
+    """
+    Returns the song data from a provider response, reusing the tool call parsed
+    while streaming when there is one.
+    """
+    if response.get('song_event'):
+        return song_from_event(response['song_event'])
+    return parse_song_response(response['text_response'])
+
+def recorded_song_from_response(model_name, response, started):
+    """
+    song_from_response that also records the call's latency, token usage and
+    whether it parsed in the model's rolling stats, and adds the tokens to the
+    agent's metrics.
+    """
+    usage = response.get('nano_info')
+    metrics.record_usage(model_name, usage)
+    try:
+        song = song_from_response(response)
+    except Exception:
+        model_stats.record(model_name, time.perf_counter() - started, "parse_failure", usage)
+        raise
+    model_stats.record(model_name, time.perf_counter() - started, "ok" if song else "parse_failure", usage)
+    return song
+
+def song_from_event(event):
+    result = toolbox.use(event).result
+    return apply_length_constraints(result)
+
 def parse_song_response(response_text):
     events = parser.parse(response_text)
-    print("Parsing", response_text)
     for event in events:
         if event.is_tool_call:
             if event.tool.name == "song":
-                result = toolbox.use(event).result
-                return apply_length_constraints(result)
-    print("No write_song event found in the response.")
+                return song_from_event(event)
+    log.warning("llm.no_song_tool_call", response_chars=len(response_text))
     return {}
 
 def apply_length_constraints(song_data):
     song_data['description'] = song_data.get('description', "No description found").strip()
-    song_data['title'] = song_data.get('title', "No title found").strip()[:80]
+    song_data['title'] = song_data.get('title', "No title found").strip()[:TITLE_MAX_CHARS]
     if not song_data.get('lyrics'):
         assert False, "No lyrics found"
-    song_data['lyrics'] = song_data['lyrics'].strip()[:3000]
-    song_data['style'] = song_data.get('style', "No style found").strip()[:120]
-    song_data['negative_style'] = song_data.get('negative_style', "").strip()[:120]
+    song_data['lyrics'] = song_data['lyrics'].strip()[:LYRICS_MAX_CHARS]
+    song_data['style'] = song_data.get('style', "No style found").strip()[:STYLE_MAX_CHARS]
+    song_data['negative_style'] = song_data.get('negative_style', "").strip()[:STYLE_MAX_CHARS]
     return song_data
 
 def main():
@@ -290,7 +542,7 @@ def main():
     Main function to demonstrate the generate_song function.
     """
     # Example usage of generate_song
-    song_data = generate_song("Create a motivational song about overcoming challenges.")
+    song_data = asyncio.run(generate_song("Create a motivational song about overcoming challenges."))
 
     if song_data:
         print("\nGenerated Song Data:")
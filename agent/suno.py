@@ -0,0 +1,229 @@
+import os
+import sys
+import time
+import asyncio
+import httpx
+from dotenv import load_dotenv
+from client import get_http_client
+from metrics import metrics
+from log import get_logger
+sys.path.insert(0, os.path.abspath("../common"))
+from tracing import traced
+
+log = get_logger("suno")
+
+load_dotenv()
+
+fox_api_key = os.getenv("FOX_API_KEY")
+
+SUNO_BASE_URL = "https://api.sunoaiapi.com/api/v1/gateway"
+POLL_BATCH_SIZE = int(os.getenv("SUNO_POLL_BATCH_SIZE", "20"))  # Song ids per /query call
+POLL_FIRST_DELAY = float(os.getenv("SUNO_POLL_FIRST_DELAY", "20"))  # Seconds before a new generation is first polled
+POLL_MIN_INTERVAL = float(os.getenv("SUNO_POLL_MIN_INTERVAL", "5"))  # Fastest re-poll, used while streaming
+POLL_MAX_INTERVAL = float(os.getenv("SUNO_POLL_MAX_INTERVAL", "30"))  # Slowest re-poll for long-running jobs
+POLL_MAX_FAILURES = int(os.getenv("SUNO_POLL_MAX_FAILURES", "5"))  # Consecutive failed polls before giving up
+
+# Function to generate audio using the API
+@metrics.timed("generate_audio", provider="suno", ok=bool)
+@traced(provider="suno")
+async def generate_audio(title, lyrics, style, negative_style):
+
+    headers = {
+        'Content-Type': 'application/json',
+        'api-key': fox_api_key or ''
+    }
+    data = {
+        'title': title,
+        'tags': style,
+        'generation_type': 'TEXT',
+        'prompt': lyrics,
+        'negative_tags': negative_style,
+        'mv': 'chirp-v4'
+    }
+    client = get_http_client()
+    try:
+        response = await client.post(f'{SUNO_BASE_URL}/generate/music', json=data, headers=headers)
+    except httpx.HTTPError as e:
+        log.warning("suno.request_failed", error=e)
+        return None
+    if response.status_code == 200:
+        resp_data = response.json()
+        if resp_data['code'] == 0:
+            song_ids = [item['song_id'] for item in resp_data['data']]
+            log.info("suno.submitted", song_ids=song_ids)
+            return song_ids
+    log.warning("suno.submit_rejected", status=response.status_code, body=response.text)
+    return None
+
+@metrics.timed("suno_query", provider="suno")
+async def poll_for_audio(song_ids):
+    """
+    Queries Suno once for the status of the given song ids.
+
+    Returns:
+        list: One status dict per song, or None if the request failed. Retrying is
+              left to the poller, which backs off instead of hammering the API.
+    """
+    headers = {
+        'Content-Type': 'application/json',
+        'api-key': fox_api_key or ''
+    }
+    params = {
+        'ids': ','.join(song_ids)
+    }
+    try:
+        response = await get_http_client().get(f'{SUNO_BASE_URL}/query',
+                                                params=params, headers=headers)
+        if response.status_code == 200:
+            return response.json()
+        log.warning("suno.poll_failed", status=response.status_code, body=response.text)
+    except Exception as e:
+        log.warning("suno.poll_failed", error=e)
+    return None
+
+def is_status_list(resp_data):
+    """Whether a /query response is the expected list of song status dicts, not e.g. an error envelope."""
+    return isinstance(resp_data, list) and all(
+        isinstance(item, dict) and 'song_id' in item and 'status' in item for item in resp_data
+    )
+
+class PollWaiter:
+    def __init__(self, song_ids, future, first_poll_at):
+        self.song_ids = list(song_ids)
+        self.future = future
+        self.created_at = time.monotonic()
+        self.next_poll_at = first_poll_at
+        self.items = {}
+        self.failures = 0
+        self.polls = 0
+
+    @property
+    def statuses(self):
+        return [self.items[song_id]['status'] for song_id in self.song_ids if song_id in self.items]
+
+class SunoPoller:
+    """
+    One polling task per process for every in-flight Suno generation.
+
+    Waiters that are due (or nearly due) are merged into batched /query calls, and
+    each waiter's next poll is scheduled from its age and last seen status, so a
+    young "submitted" song is checked rarely and a "streaming" one often.
+    """
+    def __init__(self, batch_size=POLL_BATCH_SIZE, first_delay=POLL_FIRST_DELAY,
+                 min_interval=POLL_MIN_INTERVAL, max_interval=POLL_MAX_INTERVAL,
+                 max_failures=POLL_MAX_FAILURES):
+        self.batch_size = batch_size
+        self.first_delay = first_delay
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_failures = max_failures
+        self.requests = 0
+        self._waiters = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    async def wait(self, song_ids):
+        """
+        Waits until every song id is complete.
+
+        Returns:
+            list: The Suno status dicts for song_ids, in the same order.
+
+        Raises:
+            Exception: If any song errors or polling keeps failing.
+        """
+        waiter = PollWaiter(song_ids, asyncio.get_running_loop().create_future(),
+                            time.monotonic() + self.first_delay)
+        self._waiters.append(waiter)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+        return await waiter.future
+
+    def next_interval(self, waiter):
+        """Seconds until the waiter should be polled again."""
+        if waiter.failures:
+            return min(self.max_interval, self.min_interval * 2 ** waiter.failures)
+        if 'streaming' in waiter.statuses:
+            return self.min_interval
+        age = time.monotonic() - waiter.created_at
+        return max(self.min_interval, min(self.max_interval, age / 4))
+
+    async def _run(self):
+        while self._waiters:
+            self._waiters = [w for w in self._waiters if not w.future.done()]
+            if not self._waiters:
+                break
+            now = time.monotonic()
+            next_due = min(w.next_poll_at for w in self._waiters)
+            if next_due > now:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), next_due - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # Poll everything due now, plus anything due soon enough to ride along
+            horizon = now + self.min_interval / 2
+            due = [w for w in self._waiters if w.next_poll_at <= horizon]
+            try:
+                await self._poll(due)
+            except Exception as e:
+                # Every in-flight song waits on this task; fail the polled ones rather than let it die
+                log.error("suno.poll_crashed", error=e)
+                for waiter in due:
+                    if not waiter.future.done():
+                        waiter.future.set_exception(Exception(f"Failed to poll for audio: {e}"))
+
+    async def _poll(self, due):
+        song_ids = list(dict.fromkeys(song_id for w in due for song_id in w.song_ids))
+        items = {}
+        failed = set()
+        for i in range(0, len(song_ids), self.batch_size):
+            batch = song_ids[i:i + self.batch_size]
+            self.requests += 1
+            resp_data = await poll_for_audio(batch)
+            if not is_status_list(resp_data):
+                if resp_data is not None:
+                    log.warning("suno.poll_unexpected", body=resp_data)
+                failed.update(batch)
+                continue
+            items.update({item['song_id']: item for item in resp_data})
+
+        for waiter in due:
+            if waiter.future.done():
+                continue
+            waiter.polls += 1
+            if failed.intersection(waiter.song_ids):
+                waiter.failures += 1
+                if waiter.failures >= self.max_failures:
+                    waiter.future.set_exception(Exception("Failed to poll for audio."))
+                    continue
+            else:
+                waiter.failures = 0
+                waiter.items.update({k: v for k, v in items.items() if k in waiter.song_ids})
+            self._settle(waiter)
+
+    def _settle(self, waiter):
+        statuses = waiter.statuses
+        log.debug("suno.status", song_ids=waiter.song_ids, statuses=statuses, polls=waiter.polls)
+        errors = [waiter.items[song_id] for song_id in waiter.song_ids
+                  if song_id in waiter.items and waiter.items[song_id]['status'] == 'error']
+        if errors:
+            error_messages = [(item.get('meta_data') or {}).get('error_message', 'Unknown error') for item in errors]
+            waiter.future.set_exception(Exception(f"Generation error(s): {error_messages}"))
+        elif len(statuses) == len(waiter.song_ids) and all(status == 'complete' for status in statuses):
+            log.info("suno.complete", song_ids=waiter.song_ids, polls=waiter.polls)
+            for _ in waiter.song_ids:
+                metrics.observe("suno_polls_per_song", waiter.polls)
+            waiter.future.set_result([waiter.items[song_id] for song_id in waiter.song_ids])
+        else:
+            waiter.next_poll_at = time.monotonic() + self.next_interval(waiter)
+
+poller = SunoPoller()
+
+# Function to wait until all songs are complete
+@metrics.timed("poll_until_complete")
+@traced()
+async def poll_until_complete(song_ids):
+    return await poller.wait(song_ids)
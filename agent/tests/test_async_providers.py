@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import json
+import asyncio
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("NANOGPT_API_KEY", "test-key")
+
+import client
+import singer
+import suno
+
+SONG_XML = """<use_tool>
+<name>song</name>
+<title>Loop Song</title>
+<lyrics>Never block the loop</lyrics>
+<style>synthwave</style>
+<negative_style>country</negative_style>
+</use_tool>"""
+
+PROVIDER_DELAY = 0.05
+
+async def fake_provider(request):
+    """Answers NanoGPT and Suno requests after a short, non-blocking delay."""
+    await asyncio.sleep(PROVIDER_DELAY)
+    if request.url.path.endswith("/chat/completions"):
+        if json.loads(request.content).get("stream"):
+            events = [{"choices": [{"delta": {"content": SONG_XML[i:i + 16]}}]} for i in range(0, len(SONG_XML), 16)]
+            body = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+            return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+        return httpx.Response(200, json={
+            "choices": [{"message": {"role": "assistant", "content": SONG_XML}}],
+            "usage": {"total_tokens": 10}
+        })
+    if request.url.path.endswith("/generate/music"):
+        return httpx.Response(200, json={"code": 0, "data": [{"song_id": "a"}, {"song_id": "b"}]})
+    if request.url.path.endswith("/query"):
+        ids = request.url.params["ids"].split(",")
+        return httpx.Response(200, json=[{"song_id": i, "status": "complete", "audio_url": f"https://cdn/{i}.mp3"} for i in ids])
+    return httpx.Response(404)
+
+async def run_job():
+    song = await singer.generate_song("Write a test song", station="workout")
+    song_ids = await suno.generate_audio(song["title"], song["lyrics"], song["style"], song["negative_style"])
+    return await suno.poll_until_complete(song_ids)
+
+async def heartbeat_probe(stop, lags):
+    """Mimics the heartbeat handler and records how late each tick ran."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - start - 0.01)
+
+def test_heartbeat_stays_responsive_with_many_jobs(monkeypatch):
+    monkeypatch.setattr(suno, "poller", suno.SunoPoller(first_delay=0.05, min_interval=0.05))
+
+    async def scenario():
+        client.set_http_client(httpx.AsyncClient(transport=httpx.MockTransport(fake_provider)))
+        stop = asyncio.Event()
+        lags = []
+        probe = asyncio.create_task(heartbeat_probe(stop, lags))
+        started = time.perf_counter()
+        results = await asyncio.gather(*(run_job() for _ in range(50)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+        await client.close_http_client()
+        return results, elapsed, lags
+
+    results, elapsed, lags = asyncio.run(scenario())
+
+    assert len(results) == 50
+    assert all(item["status"] == "complete" for result in results for item in result)
+    # Fifty jobs each spend ~4 provider round trips waiting; run serially that
+    # would take 50 * 0.25s. Concurrently they should finish in about one job's time.
+    assert elapsed < 2.0
+    assert lags and max(lags) < 0.1
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from batch import BatchOrchestrator
+
+WRITE_TIME = 0.05
+SING_TIME = 0.2
+
+class Result:
+    def __init__(self, status, error=""):
+        self.status = status
+        self.error = error
+
+class FakeStages:
+    """Records how many songs are in each stage at once."""
+    def __init__(self, failing_stations=()):
+        self.failing_stations = set(failing_stations)
+        self.writing = 0
+        self.singing = 0
+        self.max_writing = 0
+        self.max_singing = 0
+
+    async def write(self, instruction, model_name, artist, station):
+        self.writing += 1
+        self.max_writing = max(self.max_writing, self.writing)
+        await asyncio.sleep(WRITE_TIME)
+        self.writing -= 1
+        if station in self.failing_stations:
+            return None
+        return {"title": f"{station} song", "lyrics": "la", "style": "pop", "negative_style": ""}
+
+    async def sing(self, ctx, song_data):
+        self.singing += 1
+        self.max_singing = max(self.max_singing, self.singing)
+        await asyncio.sleep(SING_TIME)
+        self.singing -= 1
+        return Result("complete")
+
+def run_batch(stages, stations, lyric_concurrency, audio_concurrency):
+    async def scenario():
+        orchestrator = BatchOrchestrator(stages.write, stages.sing, lyric_concurrency, audio_concurrency)
+        batch = orchestrator.submit(None, stations)
+        started = time.perf_counter()
+        await asyncio.gather(*batch.tasks)
+        return batch, time.perf_counter() - started
+    return asyncio.run(scenario())
+
+def test_stages_are_pipelined_within_their_limits():
+    stages = FakeStages()
+    batch, elapsed = run_batch(stages, ["workout"] * 8, lyric_concurrency=1, audio_concurrency=8)
+
+    assert batch.done and batch.failed == 0
+    assert stages.max_writing == 1
+    # In sequence each song would take write + sing; pipelined, singing overlaps later writes
+    assert elapsed < 8 * WRITE_TIME + SING_TIME + 0.15
+    assert elapsed < 8 * (WRITE_TIME + SING_TIME) / 2
+
+def test_audio_limit_is_respected_and_results_arrive_in_completion_order():
+    stages = FakeStages(failing_stations={"jazz"})
+    batch, _ = run_batch(stages, ["workout", "jazz", "workout", "workout"], lyric_concurrency=4, audio_concurrency=2)
+
+    assert stages.max_singing == 2
+    assert batch.failed == 1
+    # The failed song finishes first, right after its lyric stage
+    assert batch.completed[0].station == "jazz" and batch.completed[0].status == "error"
+    assert [song.finished_at for song in batch.completed] == sorted(song.finished_at for song in batch.completed)
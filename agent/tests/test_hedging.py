@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("NANOGPT_API_KEY", "test-key")
+
+import singer
+from model_stats import ModelStats, CircuitBreaker
+
+SONG_XML = """<use_tool>
+<name>song</name>
+<title>Hedge Song</title>
+<lyrics>Two requests, one reply</lyrics>
+<style>synthwave</style>
+<negative_style>country</negative_style>
+</use_tool>"""
+
+class FakeProvider:
+    """Stands in for talk_to_gpt with a per-model delay and failure list."""
+    def __init__(self, delays, failing=()):
+        self.delays = delays
+        self.failing = set(failing)
+        self.calls = []
+        self.cancelled = []
+
+    async def __call__(self, prompt, model=None, messages=None, stream=True):
+        self.calls.append(model)
+        try:
+            await asyncio.sleep(self.delays.get(model, 0.01))
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+        if model in self.failing:
+            return None
+        return {"text_response": SONG_XML, "nano_info": {}, "song_event": None, "metrics": {}}
+
+def use_provider(monkeypatch, provider, default_delay):
+    monkeypatch.setattr(singer, "talk_to_gpt", provider)
+    monkeypatch.setattr(singer, "model_stats", ModelStats())
+    monkeypatch.setattr(singer, "breaker", CircuitBreaker())
+    monkeypatch.setattr(singer, "LLM_HEDGE", True)
+    monkeypatch.setattr(singer, "LLM_HEDGE_DEFAULT_DELAY", default_delay)
+    monkeypatch.setattr(singer, "LLM_HEDGE_MIN_DELAY", 0)
+
+def test_slow_primary_is_hedged_and_cancelled(monkeypatch):
+    provider = FakeProvider({"deepseek-reasoner": 5.0})
+    use_provider(monkeypatch, provider, default_delay=0.05)
+
+    started = time.perf_counter()
+    song = asyncio.run(singer.generate_song("Write a test song", model_name="deepseek-reasoner", artist="Deep Seeker"))
+
+    assert time.perf_counter() - started < 1.0
+    assert song["title"] == "Hedge Song"
+    assert song["model_name"] != "deepseek-reasoner"
+    assert song["artist_name"] == singer.get_model_nickname(song["model_name"])[1]
+    assert provider.calls[0] == "deepseek-reasoner" and len(provider.calls) == 2
+    assert provider.cancelled == ["deepseek-reasoner"]
+
+def test_failed_primary_fails_over_without_waiting(monkeypatch):
+    provider = FakeProvider({}, failing={"grok-3"})
+    use_provider(monkeypatch, provider, default_delay=10)
+
+    started = time.perf_counter()
+    song = asyncio.run(singer.generate_song("Write a test song", model_name="grok-3"))
+
+    assert time.perf_counter() - started < 1.0
+    assert song["model_name"] != "grok-3"
+    assert singer.model_stats.summary()["grok-3"]["http_errors"] == 1
+
+def test_fast_primary_is_not_hedged(monkeypatch):
+    provider = FakeProvider({})
+    use_provider(monkeypatch, provider, default_delay=0.5)
+
+    song = asyncio.run(singer.generate_song("Write a test song", model_name="o3-mini"))
+
+    assert song["model_name"] == "o3-mini"
+    assert provider.calls == ["o3-mini"]
+
+def test_circuit_opens_and_closes_after_successful_trial():
+    breaker = CircuitBreaker(window=4, min_calls=4, error_rate=0.5, cooldown=0.05)
+    for ok in (True, False, True, False):
+        breaker.record("grok-3", ok)
+    assert breaker.is_open("grok-3")
+    assert not breaker.allow("grok-3")
+
+    time.sleep(0.06)
+    assert breaker.allow("grok-3")
+    # Only one trial call is let through while half-open
+    assert not breaker.allow("grok-3")
+    breaker.record("grok-3", True)
+    assert not breaker.is_open("grok-3")
+    assert breaker.allow("grok-3")
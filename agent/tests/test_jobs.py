@@ -0,0 +1,85 @@
+import os
+import sys
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from jobs import JobQueue, MemoryJobStore, SQLiteJobStore
+
+class Singer:
+    """Stands in for generate_audio_response; records which replica ran each job."""
+    def __init__(self, name, delay=0.05):
+        self.name = name
+        self.delay = delay
+        self.ran = []
+
+    async def __call__(self, ctx, payload):
+        self.ran.append(payload["title"])
+        payload["song_ids"] = payload.get("song_ids") or ["a", "b"]
+        await asyncio.sleep(self.delay)
+        return {"status": "complete", "error": "", "sung_by": self.name}
+
+async def wait_done(queue, job_ids):
+    while True:
+        jobs = [await queue.get(job_id) for job_id in job_ids]
+        if all(job.done for job in jobs):
+            return jobs
+        await asyncio.sleep(0.01)
+
+def test_memory_queue_runs_jobs():
+    async def scenario():
+        queue = JobQueue(Singer("one"), store=MemoryJobStore(), concurrency=2)
+        queue.start(None)
+        job = await queue.submit({"title": "Song"})
+        [job] = await wait_done(queue, [job.id])
+        await queue.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.status == "complete"
+    assert job.payload["song_ids"] == ["a", "b"]
+
+def test_replicas_share_a_sqlite_store(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def scenario():
+        singers = [Singer("one"), Singer("two")]
+        queues = [JobQueue(s, store=SQLiteJobStore(path), concurrency=2, poll_interval=0.01) for s in singers]
+        for queue in queues:
+            queue.start(None)
+        # Everything is submitted through the first replica
+        jobs = [await queues[0].submit({"title": f"Song {i}"}) for i in range(8)]
+        done = await wait_done(queues[1], [job.id for job in jobs])
+        for queue in queues:
+            await queue.stop()
+        return singers, done
+
+    singers, done = asyncio.run(scenario())
+    assert all(job.status == "complete" for job in done)
+    assert all(job.payload["song_ids"] == ["a", "b"] for job in done)
+    assert sorted(singers[0].ran + singers[1].ran) == sorted(f"Song {i}" for i in range(8))
+    assert singers[0].ran and singers[1].ran
+
+def test_expired_lease_is_taken_over_with_saved_payload(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def scenario():
+        crashed = SQLiteJobStore(path)
+        job = await JobQueue(Singer("crashed"), store=crashed).submit({"title": "Song"})
+        claimed = await crashed.claim("crashed-worker", lease=0.05)
+        claimed.payload["song_ids"] = ["x", "y"]
+        await crashed.save(claimed, lease=0.05)
+        # The replica dies here without finishing the job
+
+        survivor = Singer("survivor")
+        queue = JobQueue(survivor, store=SQLiteJobStore(path), poll_interval=0.01)
+        queue.start(None)
+        [job] = await wait_done(queue, [job.id])
+        await queue.stop()
+        return survivor, job
+
+    survivor, job = asyncio.run(scenario())
+    assert survivor.ran == ["Song"]
+    assert job.status == "complete" and job.result["sung_by"] == "survivor"
+    # The retry reused the Suno ids the first replica had recorded
+    assert job.payload["song_ids"] == ["x", "y"]
@@ -0,0 +1,58 @@
+import os
+import sys
+import asyncio
+import logging
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import log
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+def capture(name):
+    logger = log.get_logger(name)
+    handler = Records()
+    logger.logger.addHandler(handler)
+    logger.logger.setLevel(logging.DEBUG)
+    return logger, handler.records
+
+def test_fields_are_truncated_and_events_sampled(monkeypatch):
+    logger, records = capture("test_sampling")
+    monkeypatch.setitem(log.SAMPLE_RATES, "suno.status", 0.0)
+    logger.info("llm.completed", text="x" * 1000, total=1.5)
+    logger.debug("suno.status", statuses=["submitted"])
+    assert [r.getMessage() for r in records] == ["llm.completed"]
+    assert records[0].fields["text"].startswith("x" * log.LOG_MAX_FIELD_CHARS + "...(+")
+    assert records[0].fields["total"] == 1.5
+
+def test_payloads_are_logged_in_full_only_on_failure():
+    logger, records = capture("test_payloads")
+    prompt = "p" * 5000
+
+    async def attempt():
+        logger.payload("llm.prompt", user=prompt)
+
+    async def generation(fails):
+        with log.capture_payloads() as dump:
+            await asyncio.gather(attempt(), attempt())
+            if fails:
+                dump("no song", model="grok-3")
+
+    asyncio.run(generation(fails=False))
+    assert all(r.levelno == logging.DEBUG for r in records)
+    asyncio.run(generation(fails=True))
+    failed = [r for r in records if r.getMessage() == "llm.prompt.failed"]
+    assert len(failed) == 2
+    assert failed[0].fields["user"] == prompt and failed[0].fields["model"] == "grok-3"
+
+def test_text_and_json_formats():
+    record = logging.LogRecord("rhythmiq.singer", logging.INFO, __file__, 1, "llm.hedged", None, None)
+    record.fields = {"model": "o3-mini", "after": 12.5}
+    assert log.StructuredFormatter("text").format(record).endswith("llm.hedged model=o3-mini after=12.5")
+    assert '"event": "llm.hedged"' in log.StructuredFormatter("json").format(record)
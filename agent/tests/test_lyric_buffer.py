@@ -0,0 +1,83 @@
+import os
+import sys
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from lyric_buffer import LyricBuffer, BufferedSong
+
+class FakeLyricist:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    async def generate(self, instruction, model_name, artist, station):
+        self.calls.append((model_name, station))
+        await asyncio.sleep(0)
+        if self.fail:
+            return None
+        return {"title": f"{station} song", "lyrics": "la", "style": "pop", "negative_style": ""}
+
+async def wait_until(predicate, timeout=1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.001)
+
+def test_buffer_fills_every_station_and_serves_hits():
+    lyricist = FakeLyricist()
+    buffer = LyricBuffer(lyricist.generate, stations=["workout", "relaxation"], depth=2, workers=3)
+
+    async def scenario():
+        buffer.start()
+        await wait_until(lambda: all(len(entries) == 2 for entries in buffer.entries.values()))
+        served = buffer.take("workout")
+        # Taking a song wakes the workers to top the station back up
+        await wait_until(lambda: len(buffer.entries["workout"]) == 2)
+        await buffer.stop()
+        return served
+
+    served = asyncio.run(scenario())
+
+    assert served.song_data["title"] == "workout song"
+    assert served.model_name and served.artist
+    assert len(lyricist.calls) == 5
+    stats = buffer.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 0 and stats["hit_rate"] == 1.0
+    assert stats["stations"]["workout"]["ready"] == 2
+
+def test_take_prefers_requested_model_and_misses_when_empty():
+    buffer = LyricBuffer(FakeLyricist().generate, stations=["workout"], depth=2)
+    song = {"title": "t", "lyrics": "l", "style": "s", "negative_style": ""}
+    buffer.entries["workout"].extend([
+        BufferedSong(song, "grok-3", "Grok Rhymes", "workout"),
+        BufferedSong(song, "o3-mini", "Ozone 3", "workout"),
+    ])
+
+    assert buffer.take("workout", "o3-mini").model_name == "o3-mini"
+    assert buffer.take("workout", "o3-mini").model_name == "grok-3"
+    assert buffer.take("workout", "o3-mini") is None
+    assert buffer.take("unknown-station") is None
+    assert buffer.stats()["misses"] == 2
+
+def test_match_model_only_serves_the_requested_model():
+    buffer = LyricBuffer(FakeLyricist().generate, stations=["workout"], depth=2, match_model=True)
+    song = {"title": "t", "lyrics": "l", "style": "s", "negative_style": ""}
+    buffer.entries["workout"].append(BufferedSong(song, "grok-3", "Grok Rhymes", "workout"))
+
+    assert buffer.take("workout", "o3-mini") is None
+    assert buffer.take("workout", "grok-3").artist == "Grok Rhymes"
+
+def test_failed_refills_back_off_instead_of_spinning():
+    lyricist = FakeLyricist(fail=True)
+    buffer = LyricBuffer(lyricist.generate, stations=["workout"], depth=1, workers=1)
+    buffer.retry_delay = 60
+
+    async def scenario():
+        buffer.start()
+        await wait_until(lambda: buffer.refill_failures == 1)
+        await asyncio.sleep(0.01)
+        await buffer.stop()
+
+    asyncio.run(scenario())
+    assert len(lyricist.calls) == 1
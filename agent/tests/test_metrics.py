@@ -0,0 +1,73 @@
+import os
+import sys
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from metrics import Metrics, Histogram
+
+def test_timed_counts_outcomes_and_in_flight():
+    metrics = Metrics()
+    gate = asyncio.Event()
+
+    @metrics.timed("fake_call", provider="suno")
+    async def call(result, fail=False):
+        await gate.wait()
+        if fail:
+            raise RuntimeError("boom")
+        return result
+
+    async def scenario():
+        tasks = [asyncio.create_task(call({"ok": 1})), asyncio.create_task(call(None)),
+                 asyncio.create_task(call(1, fail=True))]
+        await asyncio.sleep(0)
+        in_flight = metrics.gauges['in_flight{call="fake_call"}']
+        gate.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return in_flight
+
+    assert asyncio.run(scenario()) == 3
+    snapshot = metrics.snapshot()
+    assert snapshot["gauges"]['in_flight{call="fake_call"}'] == 0
+    assert snapshot["counters"]['calls_total{call="fake_call",outcome="ok"}'] == 1
+    assert snapshot["counters"]['calls_total{call="fake_call",outcome="error"}'] == 2
+    assert snapshot["counters"]['provider_requests_total{outcome="error",provider="suno"}'] == 2
+    assert snapshot["histograms"]['latency_seconds{call="fake_call"}']["count"] == 3
+
+def test_cancelled_calls_are_counted_separately():
+    metrics = Metrics()
+
+    @metrics.timed("slow")
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def scenario():
+        task = asyncio.create_task(slow())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert metrics.counters['calls_total{call="slow",outcome="cancelled"}'] == 1
+
+def test_histogram_quantiles_interpolate_within_buckets():
+    histogram = Histogram((10, 20, 30))
+    for value in [5] * 50 + [15] * 40 + [25] * 10:
+        histogram.observe(value)
+    summary = histogram.summary()
+    assert summary["p50"] == pytest.approx(10)
+    assert 10 < summary["p90"] <= 20
+    assert 20 < summary["p99"] <= 30
+    assert summary["le_10"] == 50 and summary["le_inf"] == 100
+    histogram.observe(1000)
+    assert histogram.quantile(1.0) == 30
+
+def test_usage_is_added_to_token_counters():
+    metrics = Metrics()
+    metrics.record_usage("grok-3", {"prompt_tokens": 1200, "completion_tokens": 300})
+    metrics.record_usage("grok-3", {"prompt_tokens": 800})
+    metrics.record_usage("grok-3", None)
+    assert metrics.counters['llm_tokens_total{kind="prompt",model="grok-3"}'] == 2000
+    assert metrics.counters['llm_tokens_total{kind="completion",model="grok-3"}'] == 300
@@ -0,0 +1,54 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "common")))
+
+import pytest
+from model_stats import ModelStats, percentile
+from model_selector import MODEL_NICKNAMES, get_model_weights
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.9) == 90
+    assert percentile(values, 0.99) == 99
+    assert percentile([], 0.9) == 0.0
+
+def test_summary_counts_outcomes_and_tokens():
+    stats = ModelStats(window=10)
+    for latency in (1.0, 2.0, 3.0):
+        stats.record("grok-3", latency, usage={"prompt_tokens": 100, "completion_tokens": 50})
+    stats.record("grok-3", 9.0, "parse_failure")
+    stats.record("grok-3", 30.0, "http_error")
+
+    summary = stats.summary()["grok-3"]
+    assert summary["calls"] == 5
+    assert summary["parse_failures"] == 1
+    assert summary["http_errors"] == 1
+    assert summary["failure_rate"] == pytest.approx(0.4)
+    # Failed calls do not distort the latency of successful ones
+    assert summary["latency_p90"] == 3.0
+    assert summary["completion_tokens_avg"] == 50
+
+def test_window_is_bounded():
+    stats = ModelStats(window=3)
+    for latency in range(10):
+        stats.record("o3-mini", float(latency))
+    assert stats.summary()["o3-mini"]["calls"] == 3
+
+def test_weights_favor_fast_reliable_models_but_keep_exploring():
+    stats = ModelStats()
+    for _ in range(20):
+        stats.record("gemini-2.0-pro-exp-02-05", 5.0)
+        stats.record("deepseek-reasoner", 60.0)
+        stats.record("grok-3", 5.0, "http_error")
+    weights = get_model_weights(stats.summary(), exploration=0.2)
+
+    assert sum(weights.values()) == pytest.approx(1.0)
+    assert weights["gemini-2.0-pro-exp-02-05"] > weights["deepseek-reasoner"] > weights["grok-3"]
+    floor = 0.2 / len(MODEL_NICKNAMES)
+    assert all(weight >= floor - 1e-9 for weight in weights.values())
+    assert weights["grok-3"] == pytest.approx(floor)
+    # Models without enough samples are treated as well as the best known one
+    assert weights["o3-mini"] == pytest.approx(weights["gemini-2.0-pro-exp-02-05"])
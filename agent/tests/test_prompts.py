@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import builtins
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from prompts import PromptCorpus, approx_tokens
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        file.write(text)
+
+def make_corpus_dir(root):
+    write(os.path.join(root, "base.txt"), "Write a song.")
+    write(os.path.join(root, "system.txt"), "You are a song writing agent.")
+    write(os.path.join(root, "instructions", "1.txt"), "Let loose.")
+    write(os.path.join(root, "songs", "1.xml"), "<title>Example</title>")
+    return root
+
+def test_build_uses_preloaded_files_only(tmp_path, monkeypatch):
+    corpus = PromptCorpus(make_corpus_dir(str(tmp_path)), reload_interval=3600)
+
+    def no_io(*args, **kwargs):
+        raise AssertionError("prompt assembly touched the filesystem")
+    monkeypatch.setattr(builtins, "open", no_io)
+    monkeypatch.setattr(os, "listdir", no_io)
+    monkeypatch.setattr(os, "stat", no_io)
+
+    corpus.refresh()
+    system_prompt, user_prompt = corpus.build(corpus.random_instruction(), artist="Ozone 3", station="workout")
+
+    assert system_prompt == "You are a song writing agent."
+    assert user_prompt.startswith(corpus.usage_prompt + "\n\nWrite a song.")
+    assert "Let loose.\n\nStation:\nfrequency: 99.1 FM" in user_prompt
+    assert user_prompt.endswith("You are the artist: Ozone 3")
+
+def test_refresh_reloads_only_on_change(tmp_path):
+    root = make_corpus_dir(str(tmp_path))
+    corpus = PromptCorpus(root, reload_interval=0)
+
+    corpus.refresh()
+    assert corpus.reloads == 1
+
+    path = os.path.join(root, "system.txt")
+    write(path, "You are a new agent.")
+    later = time.time() + 5
+    os.utime(path, (later, later))
+    write(os.path.join(root, "instructions", "2.txt"), "Be brief.")
+    corpus.refresh()
+
+    assert corpus.reloads == 2
+    assert corpus.system_prompt == "You are a new agent."
+    assert sorted(corpus.instructions) == ["Be brief.", "Let loose."]
+
+def make_example_dir(root):
+    make_corpus_dir(root)
+    write(os.path.join(root, "songs", "1.xml"), "<title>Gym</title><lyrics>lift the weights, sweat and run, workout energy</lyrics>")
+    write(os.path.join(root, "songs", "2.xml"), "<title>Calm</title><lyrics>soft rain, slow breath, sleep and relaxation</lyrics>")
+    write(os.path.join(root, "songs", "3.xml"), "<title>Motown</title><lyrics>" + "soul oldies groove " * 200 + "</lyrics>")
+    return root
+
+def test_examples_are_selected_by_similarity(tmp_path):
+    corpus = PromptCorpus(make_example_dir(str(tmp_path)), reload_interval=3600)
+
+    _, user_prompt = corpus.build("A slow song for sleep", station="relaxation", n_shot=1)
+
+    assert "Example 1:\nSong:\n<use_tool>\n<name>song</name>\n<title>Calm</title>" in user_prompt
+    assert "Example 2" not in user_prompt
+    assert user_prompt.index("Example 1") < user_prompt.index("Additional Instructions")
+
+def test_examples_are_trimmed_to_token_budget(tmp_path):
+    root = make_example_dir(str(tmp_path))
+    unbounded = PromptCorpus(root, reload_interval=3600, token_budget=100000)
+    bounded = PromptCorpus(root, reload_interval=3600, token_budget=500)
+
+    query = "soul oldies groove"
+    assert unbounded.select_examples(query, 3, 100000)[0] == "3.xml"
+
+    system_prompt, user_prompt = bounded.build(query, n_shot=3)
+    assert approx_tokens(system_prompt) + approx_tokens(user_prompt) <= 500
+    assert "<title>Motown</title>" not in user_prompt
+    assert "Example 1" in user_prompt
@@ -0,0 +1,53 @@
+import os
+import sys
+import asyncio
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("NANOGPT_API_KEY", "test-key")
+
+import client
+import singer
+import suno
+from simulator import ProviderSimulator, SimulatedSong, PROFILES
+
+def test_instant_profile_runs_a_whole_generation(monkeypatch):
+    simulator = ProviderSimulator(PROFILES["instant"], seed=1)
+    scale = simulator.scale
+    monkeypatch.setattr(suno, "poller", suno.SunoPoller(first_delay=20 * scale, min_interval=5 * scale,
+                                                        max_interval=30 * scale))
+
+    async def scenario():
+        client.set_http_client(httpx.AsyncClient(transport=simulator))
+        try:
+            song = await singer.generate_song("Write a test song", model_name="grok-3")
+            song_ids = await suno.generate_audio(song["title"], song["lyrics"], song["style"], song["negative_style"])
+            return song, await suno.poll_until_complete(song_ids)
+        finally:
+            await client.close_http_client()
+
+    song, items = asyncio.run(scenario())
+    assert song["title"] and song["lyrics"].startswith("[Verse]")
+    assert [item["status"] for item in items] == ["complete", "complete"]
+    assert all(item["audio_url"] and item["video_url"] for item in items)
+    assert simulator.requests["generate"] == 1 and simulator.requests["query"] >= 1
+
+def test_suno_songs_move_through_statuses():
+    ok = SimulatedSong("a", "t", created_at=0, streaming_at=30, complete_at=100, fails=False)
+    failing = SimulatedSong("b", "t", created_at=0, streaming_at=30, complete_at=100, fails=True)
+    assert [ok.status(t) for t in (10, 50, 120)] == ["submitted", "streaming", "complete"]
+    assert [failing.status(t) for t in (10, 50)] == ["submitted", "error"]
+
+def test_rate_limit_answers_429():
+    profile = dict(PROFILES["instant"], llm_rate_limit=(0.001, 1))
+    simulator = ProviderSimulator(profile, seed=1)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=simulator) as http:
+            payload = {"model": "grok-3", "messages": []}
+            first = await http.post("https://nano-gpt.com/api/v1/chat/completions", json=payload)
+            second = await http.post("https://nano-gpt.com/api/v1/chat/completions", json=payload)
+            return first.status_code, second.status_code
+
+    assert asyncio.run(scenario()) == (200, 429)
+    assert simulator.requests["rate_limited"] == 1
@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("NANOGPT_API_KEY", "test-key")
+
+import client
+import singer
+from local_provider import LocalServerPool
+
+RESPONSE = """<use_tool>
+<name>thinking</name>
+<thoughts>A song about streams.</thoughts>
+</use_tool>
+<use_tool>
+<name>song</name>
+<title>Early Exit</title>
+<lyrics>[Verse]
+Stop when the tag is closed</lyrics>
+<style>indie pop</style>
+<negative_style>metal</negative_style>
+</use_tool>
+""" + "Some long afterthought the model keeps writing. " * 200
+
+class StreamingServer:
+    """Streams a response in small SSE chunks, then an optional usage chunk, and records how many were sent."""
+    def __init__(self, chunk_size=7, text=RESPONSE, usage=None):
+        self.chunk_size = chunk_size
+        self.text = text
+        self.usage = usage
+        self.sent = 0
+        self.payloads = []
+
+    async def events(self):
+        for i in range(0, len(self.text), self.chunk_size):
+            self.sent += 1
+            event = {"choices": [{"delta": {"content": self.text[i:i + self.chunk_size]}}]}
+            yield f"data: {json.dumps(event)}\n\n".encode()
+            await asyncio.sleep(0)
+        if self.usage:
+            yield f"data: {json.dumps({'choices': [], 'usage': self.usage})}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+    def handler(self, request):
+        self.payloads.append(json.loads(request.content))
+        return httpx.Response(200, content=self.events(), headers={"Content-Type": "text/event-stream"})
+
+@pytest.fixture
+def run(monkeypatch):
+    """Runs a coroutine with both providers talking to a server; the local pool is restored afterwards."""
+    def run_against(server, coro_factory):
+        async def scenario():
+            client.set_http_client(httpx.AsyncClient(transport=httpx.MockTransport(server.handler)))
+            local_pool = LocalServerPool()
+            local_pool.set_client(httpx.AsyncClient(transport=httpx.MockTransport(server.handler)))
+            monkeypatch.setattr(singer, "local_pool", local_pool)
+            try:
+                return await coro_factory()
+            finally:
+                await client.close_http_client()
+                await local_pool.close()
+        return asyncio.run(scenario())
+    return run_against
+
+def test_nanogpt_stream_stops_at_closing_song_tag(run):
+    server = StreamingServer()
+    response = run(server, lambda: singer.talk_to_gpt("Write a song", stream=True))
+
+    assert server.payloads[0]["stream"] is True
+    assert response["song_event"].tool.args["title"] == "Early Exit"
+    assert "afterthought" not in response["text_response"]
+    assert server.sent < len(RESPONSE) // server.chunk_size // 2
+    metrics = response["metrics"]
+    assert metrics["stopped_early"]
+    assert 0 <= metrics["ttft"] <= metrics["time_to_song"] <= metrics["total"]
+    # The usage chunk is never reached, so usage is estimated from the text read
+    usage = response["nano_info"]
+    assert usage["estimated"]
+    assert usage["completion_tokens"] == (len(response["text_response"]) + 3) // 4
+    assert usage["prompt_tokens"] > 0
+
+def test_nanogpt_stream_keeps_provider_usage_when_read_to_the_end(run):
+    server = StreamingServer(text="No song this time.", usage={"prompt_tokens": 120, "completion_tokens": 5})
+    response = run(server, lambda: singer.talk_to_gpt("Write a song", stream=True))
+
+    assert response["song_event"] is None
+    assert response["nano_info"] == {"prompt_tokens": 120, "completion_tokens": 5}
+
+def test_local_stream_returns_parsed_song(run):
+    server = StreamingServer(chunk_size=3)
+    response = run(server, lambda: singer.send_payload("Write a song", stream=True))
+
+    assert server.payloads[0]["max_tokens"] == singer.LOCAL_MAX_TOKENS
+    song = singer.song_from_response(response)
+    assert song["title"] == "Early Exit"
+    assert song["lyrics"].startswith("[Verse]")
+    assert song["style"] == "indie pop"
+
+class CappedServer(StreamingServer):
+    """Stops the completion at the request's max_tokens, at three characters per token."""
+    def handler(self, request):
+        self.text = self.full_text[:json.loads(request.content)["max_tokens"] * 3]
+        return super().handler(request)
+
+def test_capped_local_completion_with_thinking_still_parses(run):
+    thoughts = "Weighing rhymes and the story arc. " * (singer.LOCAL_THINKING_TOKENS * 3 // 34)
+    lyrics = ("[Verse]\n" + "A line that runs as long as songs are allowed to go\n" * 100)[:singer.LYRICS_MAX_CHARS]
+    server = CappedServer(chunk_size=50)
+    server.full_text = f"""<use_tool>
+<name>thinking</name>
+<thoughts>{thoughts}</thoughts>
+</use_tool>
+<use_tool>
+<name>song</name>
+<title>{"T" * singer.TITLE_MAX_CHARS}</title>
+<lyrics>{lyrics}</lyrics>
+<style>{"s" * singer.STYLE_MAX_CHARS}</style>
+<negative_style>{"n" * singer.STYLE_MAX_CHARS}</negative_style>
+</use_tool>
+"""
+    response = run(server, lambda: singer.send_payload("Write a song", stream=True))
+
+    song = singer.song_from_response(response)
+    assert song["lyrics"] == lyrics.strip()
+    assert song["negative_style"] == "n" * singer.STYLE_MAX_CHARS
+
+def test_streamed_calls_record_token_averages(run, monkeypatch):
+    from model_stats import ModelStats
+    monkeypatch.setattr(singer, "model_stats", ModelStats(window=10))
+    server = StreamingServer()
+
+    async def call():
+        started = time.perf_counter()
+        response = await singer.talk_to_gpt("Write a song", stream=True)
+        return singer.recorded_song_from_response("grok-3", response, started)
+
+    song = run(server, call)
+
+    assert song["title"] == "Early Exit"
+    summary = singer.model_stats.summary()["grok-3"]
+    assert summary["prompt_tokens_avg"] > 0
+    assert summary["completion_tokens_avg"] > 0
+
+def test_streamed_calls_count_llm_tokens(run, monkeypatch):
+    from metrics import Metrics
+    monkeypatch.setattr(singer, "metrics", Metrics())
+    server = StreamingServer()
+
+    async def call():
+        response = await singer.talk_to_gpt("Write a song", stream=True)
+        return singer.recorded_song_from_response("grok-3", response, time.perf_counter())
+
+    run(server, call)
+
+    counters = singer.metrics.counters
+    assert counters['llm_tokens_total{kind="prompt",model="grok-3"}'] > 0
+    assert counters['llm_tokens_total{kind="completion",model="grok-3"}'] > 0
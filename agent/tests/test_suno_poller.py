@@ -0,0 +1,118 @@
+import os
+import sys
+import asyncio
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import client
+import suno
+
+class FakeSuno:
+    """Completes each song after it has been queried a fixed number of times."""
+    def __init__(self, polls_to_complete=3, failing=()):
+        self.polls_to_complete = polls_to_complete
+        self.failing = set(failing)
+        self.seen = {}
+        self.queries = 0
+
+    def handler(self, request):
+        self.queries += 1
+        items = []
+        for song_id in request.url.params["ids"].split(","):
+            self.seen[song_id] = self.seen.get(song_id, 0) + 1
+            if song_id in self.failing:
+                status = "error"
+            elif self.seen[song_id] >= self.polls_to_complete:
+                status = "complete"
+            else:
+                status = "streaming"
+            items.append({"song_id": song_id, "status": status, "audio_url": f"https://cdn/{song_id}.mp3",
+                          "meta_data": {"error_message": "bad lyrics"}})
+        return httpx.Response(200, json=items)
+
+def run_with(fake, coro_factory):
+    async def scenario():
+        client.set_http_client(httpx.AsyncClient(transport=httpx.MockTransport(fake.handler)))
+        try:
+            return await coro_factory()
+        finally:
+            await client.close_http_client()
+    return asyncio.run(scenario())
+
+def test_in_flight_jobs_share_batched_queries():
+    fake = FakeSuno()
+    poller = suno.SunoPoller(batch_size=20, first_delay=0.01, min_interval=0.02, max_interval=0.05)
+    jobs = [[f"{n}a", f"{n}b"] for n in range(40)]
+
+    results = run_with(fake, lambda: asyncio.gather(*(poller.wait(ids) for ids in jobs)))
+
+    assert [[item["song_id"] for item in result] for result in results] == jobs
+    # 40 jobs polled separately three times each would be 120 queries;
+    # batched, 80 ids at 20 per query take 4 queries per round.
+    assert fake.queries <= 16
+    assert poller.requests == fake.queries
+
+def test_error_status_wakes_only_the_failing_job():
+    fake = FakeSuno(failing={"bad"})
+    poller = suno.SunoPoller(first_delay=0.01, min_interval=0.02, max_interval=0.05)
+
+    async def scenario():
+        return await asyncio.gather(poller.wait(["good"]), poller.wait(["bad"]), return_exceptions=True)
+
+    good, bad = run_with(fake, scenario)
+
+    assert good[0]["status"] == "complete"
+    assert isinstance(bad, Exception) and "bad lyrics" in str(bad)
+
+def test_backoff_grows_with_age_and_tightens_while_streaming():
+    poller = suno.SunoPoller(min_interval=5, max_interval=30)
+    waiter = suno.PollWaiter(["x"], None, 0)
+
+    waiter.created_at -= 60
+    assert poller.next_interval(waiter) == pytest.approx(15, abs=0.1)
+    waiter.created_at -= 600
+    assert poller.next_interval(waiter) == 30
+    waiter.items["x"] = {"status": "streaming"}
+    assert poller.next_interval(waiter) == 5
+    waiter.failures = 2
+    assert poller.next_interval(waiter) == 20
+
+class ErrorEnvelope:
+    """Answers every query with a 200 that is not a list of song statuses."""
+    def __init__(self, body):
+        self.body = body
+        self.queries = 0
+
+    def handler(self, request):
+        self.queries += 1
+        return httpx.Response(200, json=self.body)
+
+@pytest.mark.parametrize("body", [
+    {"code": 429, "msg": "rate limited"},
+    [{"song_id": "x"}],
+    ["x"],
+])
+def test_unexpected_response_counts_as_a_failed_poll(body):
+    fake = ErrorEnvelope(body)
+    poller = suno.SunoPoller(first_delay=0.01, min_interval=0.01, max_interval=0.02, max_failures=3)
+
+    with pytest.raises(Exception, match="Failed to poll for audio"):
+        run_with(fake, lambda: poller.wait(["x"]))
+    assert fake.queries == 3
+
+def test_crash_in_poll_fails_waiters_instead_of_hanging(monkeypatch):
+    fake = FakeSuno()
+    poller = suno.SunoPoller(first_delay=0.01, min_interval=0.02, max_interval=0.05)
+
+    def broken(waiter):
+        raise KeyError("status")
+
+    monkeypatch.setattr(poller, "_settle", broken)
+
+    async def scenario():
+        return await asyncio.wait_for(poller.wait(["a"]), 1)
+
+    with pytest.raises(Exception, match="Failed to poll for audio"):
+        run_with(fake, scenario)
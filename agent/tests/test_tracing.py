@@ -0,0 +1,80 @@
+import os
+import sys
+import json
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "common")))
+
+import tracing
+
+def test_child_spans_join_the_trace_and_inherit_the_generation(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracing.configure("test-service", target=f"file://{path}")
+
+    @tracing.traced()
+    async def talk_to_gpt():
+        await asyncio.sleep(0)
+        return tracing.current_traceparent()
+
+    async def scenario():
+        with tracing.start_span("generation", generation_uuid="abc") as root:
+            remote = await talk_to_gpt()
+        # The agent side continues the trace from the traceparent sent in the request body
+        with tracing.start_span("write_song", traceparent=remote) as handler:
+            pass
+        await tracing.shutdown()
+        return root, handler
+
+    root, handler = asyncio.run(scenario())
+    spans = {span["name"]: span for span in map(json.loads, path.read_text().splitlines())}
+    assert set(spans) == {"generation", "talk_to_gpt", "write_song"}
+    assert spans["talk_to_gpt"]["parentId"] == root.span_id
+    assert spans["talk_to_gpt"]["tags"]["generation_uuid"] == "abc"
+    assert handler.trace_id == root.trace_id
+    assert spans["write_song"]["parentId"] == spans["talk_to_gpt"]["id"]
+    assert spans["generation"]["localEndpoint"] == {"serviceName": "test-service"}
+    tracing.configure("test-service", target="")
+
+def test_agent_spans_carry_the_generation_sent_in_the_body(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracing.configure("agent", target=f"file://{path}")
+
+    @tracing.traced()
+    async def talk_to_gpt():
+        await asyncio.sleep(0)
+
+    async def scenario():
+        # What the app's pipeline sends with /write_song and /jobs
+        with tracing.start_span("generation", generation_uuid="abc"):
+            body = {"traceparent": tracing.current_traceparent(), "generation_uuid": "abc"}
+        # A remote traceparent brings no attributes along; the handler sets the uuid from the body
+        with tracing.start_span("write_song", traceparent=body["traceparent"],
+                                generation_uuid=body["generation_uuid"] or None):
+            await talk_to_gpt()
+        with tracing.start_span("sing", traceparent=body["traceparent"]):
+            pass
+        await tracing.shutdown()
+
+    asyncio.run(scenario())
+    spans = {span["name"]: span for span in map(json.loads, path.read_text().splitlines())}
+    assert spans["write_song"]["tags"]["generation_uuid"] == "abc"
+    assert spans["talk_to_gpt"]["tags"]["generation_uuid"] == "abc"
+    assert "generation_uuid" not in spans["sing"]["tags"]
+    tracing.configure("test-service", target="")
+
+def test_errors_are_recorded_on_the_span():
+    with pytest.raises(RuntimeError):
+        with tracing.start_span("db.songs.update_status") as span:
+            raise RuntimeError("connection lost")
+    assert span.error == "RuntimeError: connection lost"
+    assert span.duration is not None
+    assert tracing.current_span() is None
+
+def test_malformed_traceparent_starts_a_new_trace():
+    assert tracing.parse_traceparent("") is None
+    assert tracing.parse_traceparent("00-xyz-123-01") is None
+    trace_id, parent_id, sampled = tracing.parse_traceparent(f"00-{'a' * 32}-{'b' * 16}-00")
+    assert (trace_id, parent_id, sampled) == ("a" * 32, "b" * 16, False)
+    with tracing.start_span("sing", traceparent="garbage") as span:
+        assert span.parent_id is None and len(span.trace_id) == 32
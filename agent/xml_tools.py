@@ -1,10 +1,59 @@
 import re
 from ai_agent_toolbox import Toolbox, XMLParser, XMLPromptFormatter
+from log import get_logger
 
 # Setup the toolbox and associated XML parser/formatter with the designated tag.
+TOOL_TAG = "use_tool"
 toolbox = Toolbox()
-parser = XMLParser(tag="use_tool")
-formatter = XMLPromptFormatter(tag="use_tool")
+parser = XMLParser(tag=TOOL_TAG)
+formatter = XMLPromptFormatter(tag=TOOL_TAG)
+
+log = get_logger("xml_tools")
+
+class SongStreamParser:
+    """
+    Incrementally parses streamed model output and remembers the first complete
+    song tool call.
+
+    Text is handed to the XMLParser only up to a tag boundary: a closing tag split
+    across two chunks (e.g. "pop</sty" + "le>") would otherwise be read as
+    argument text.
+    """
+    def __init__(self):
+        self.parser = XMLParser(tag=TOOL_TAG)
+        self.pending = ""
+        self.song_event = None
+
+    def feed(self, chunk):
+        """
+        Adds a chunk of model output.
+
+        Returns:
+            ParserEvent: The song tool call once it is complete, otherwise None.
+        """
+        self.pending += chunk
+        cut = self.pending.rfind("<")
+        if cut == -1 or self.pending.find(">", cut) != -1:
+            cut = len(self.pending)
+        ready, self.pending = self.pending[:cut], self.pending[cut:]
+        if ready:
+            self._scan(self.parser.parse_chunk(ready))
+        return self.song_event
+
+    def close(self):
+        """
+        Flushes any buffered text once the stream has ended.
+        """
+        if self.pending:
+            self._scan(self.parser.parse_chunk(self.pending))
+            self.pending = ""
+        self._scan(self.parser.flush())
+        return self.song_event
+
+    def _scan(self, events):
+        for event in events:
+            if self.song_event is None and event.is_tool_call and event.tool.name == "song":
+                self.song_event = event
 
 def write_song(title, lyrics, style, negative_style):
     return {
@@ -15,7 +64,7 @@ def write_song(title, lyrics, style, negative_style):
     }
 
 def thinking(thoughts=""):
-    print("I'm thinking:", thoughts)
+    log.debug("llm.thinking", thoughts=thoughts)
 
 toolbox.add_tool(
     name="song",
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import os
+import httpx
+
+SING_JOB_POLL_INTERVAL = float(os.getenv("SING_JOB_POLL_INTERVAL", "5"))  # Seconds between batch status polls
+SING_JOB_BATCH_SIZE = int(os.getenv("SING_JOB_BATCH_SIZE", "100"))  # Job ids per /jobs/batch_status call
+SING_JOB_MAX_WAIT = float(os.getenv("SING_JOB_MAX_WAIT", "1800"))  # Seconds before waiting on a job gives up
+SING_JOB_MAX_FAILED_POLLS = int(os.getenv("SING_JOB_MAX_FAILED_POLLS", "12"))  # Failed polls in a row before every wait gives up
+
+PENDING_STATUSES = ("queued", "running")
+
+class SingJobTimeout(Exception):
+    """Raised by SingJobWatcher.wait when a job did not finish in time or the singer stopped answering."""
+
+class SingJobWatcher:
+    """
+    Waits for singer jobs to finish.
+
+    Every waiting generation shares one poller task, which asks the singer for
+    the status of all outstanding jobs in a single /jobs/batch_status call per
+    interval, so hundreds of generations cost one connection instead of hundreds.
+
+    A wait gives up with SingJobTimeout after max_wait seconds, and every wait
+    does once max_failed_polls polls in a row have failed, so an unreachable
+    singer cannot hold a generation (and its lease) forever.
+    """
+    def __init__(self, agent_host, interval=SING_JOB_POLL_INTERVAL, batch_size=SING_JOB_BATCH_SIZE,
+                 max_wait=SING_JOB_MAX_WAIT, max_failed_polls=SING_JOB_MAX_FAILED_POLLS):
+        self.agent_host = agent_host
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.max_failed_polls = max_failed_polls
+        self.failed_polls = 0
+        self._waiters = {}
+        self._deadlines = {}
+        self._on_song_ids = {}
+        self._task = None
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=30)
+        return self._client
+
+    async def submit(self, song_data):
+        """
+        Submits lyrics to the singer and returns the job id without waiting for audio.
+        """
+        response = await self.client.post(f"{self.agent_host}/jobs", json=song_data)
+        response.raise_for_status()
+        return response.json()["job_id"]
+
+    async def wait(self, job_id, on_song_ids=None):
+        """
+        Returns the job's final status dict (the GenerateAudioResponse fields plus job_id).
+        Raises SingJobTimeout if it does not finish within max_wait seconds or the
+        singer stops answering.
+
+        Args:
+            job_id (str): The singer job to wait for.
+            on_song_ids (coroutine function): Optional callback awaited once with the
+                                              Suno song ids as soon as the job reports them.
+        """
+        future = self._waiters.get(job_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._waiters[job_id] = future
+            self._deadlines[job_id] = loop.time() + self.max_wait
+        if on_song_ids:
+            self._on_song_ids[job_id] = on_song_ids
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return await asyncio.shield(future)
+
+    async def _run(self):
+        while self._waiters:
+            await asyncio.sleep(self.interval)
+            job_ids = list(self._waiters)
+            for i in range(0, len(job_ids), self.batch_size):
+                await self._poll(job_ids[i:i + self.batch_size])
+            now = asyncio.get_running_loop().time()
+            for job_id in [job_id for job_id in self._waiters if self._deadlines[job_id] <= now]:
+                self._give_up(job_id, f"Sing job {job_id} did not finish within {self.max_wait:.0f}s")
+
+    def _give_up(self, job_id, reason):
+        self._on_song_ids.pop(job_id, None)
+        self._deadlines.pop(job_id, None)
+        future = self._waiters.pop(job_id, None)
+        if future and not future.done():
+            future.set_exception(SingJobTimeout(reason))
+
+    async def _poll(self, job_ids):
+        try:
+            response = await self.client.post(
+                f"{self.agent_host}/jobs/batch_status",
+                json={"job_ids": job_ids}
+            )
+            response.raise_for_status()
+            jobs = response.json()["jobs"]
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            self.failed_polls += 1
+            if self.failed_polls < self.max_failed_polls:
+                logging.warning(f"Polling singer jobs failed, will retry: {e}")
+                return
+            logging.error(f"Polling singer jobs failed {self.failed_polls} times in a row, giving up on {len(self._waiters)} jobs: {e}")
+            self.failed_polls = 0
+            for job_id in list(self._waiters):
+                self._give_up(job_id, f"The singer did not answer {self.max_failed_polls} polls in a row")
+            return
+        self.failed_polls = 0
+        for job in jobs:
+            callback = self._on_song_ids.get(job["job_id"])
+            if callback and job.get("song_ids"):
+                del self._on_song_ids[job["job_id"]]
+                try:
+                    await callback(job["song_ids"])
+                except Exception as e:
+                    logging.warning(f"Recording song ids for job {job['job_id']} failed: {e}")
+            if job["status"] in PENDING_STATUSES:
+                continue
+            self._on_song_ids.pop(job["job_id"], None)
+            self._deadlines.pop(job["job_id"], None)
+            future = self._waiters.pop(job["job_id"], None)
+            if future and not future.done():
+                future.set_result(job)
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
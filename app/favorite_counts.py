@@ -0,0 +1,54 @@
+import os
+import time
+from collections import OrderedDict
+from models import Song
+
+FAVORITE_COUNT_TTL = float(os.getenv("FAVORITE_COUNT_TTL", "5"))  # Seconds a cached count is served before it is re-read
+FAVORITE_COUNT_CACHE_SIZE = int(os.getenv("FAVORITE_COUNT_CACHE_SIZE", "10000"))  # Songs whose counts are kept per worker
+
+class FavoriteCountCache:
+    """
+    Per-worker cache of songs' favorite counts, so the players polling them
+    mostly never reach Postgres. Counts missing or older than the TTL are
+    read for all requested songs in one query.
+
+    Favorites made through this worker update the cache right away with the
+    count the write returned. Ones made through another worker show up here
+    once the cached count expires, at most ttl seconds later.
+    """
+    def __init__(self, ttl=FAVORITE_COUNT_TTL, max_size=FAVORITE_COUNT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._counts = OrderedDict()
+
+    def set(self, song_id, count):
+        self._counts[song_id] = (count, time.monotonic())
+        self._counts.move_to_end(song_id)
+        while len(self._counts) > self.max_size:
+            self._counts.popitem(last=False)
+
+    async def get_many(self, song_ids):
+        """
+        Returns a dict of song id to favorite count. Unknown songs are left out.
+        """
+        now = time.monotonic()
+        counts, stale = {}, []
+        for song_id in song_ids:
+            cached = self._counts.get(song_id)
+            if cached is not None and now - cached[1] < self.ttl:
+                counts[song_id] = cached[0]
+                self._counts.move_to_end(song_id)
+            else:
+                stale.append(song_id)
+        self.hits += len(counts)
+        if stale:
+            self.misses += len(stale)
+            for song_id, count in (await Song.get_favorite_counts(stale)).items():
+                self.set(song_id, count)
+                counts[song_id] = count
+        return counts
+
+    def stats(self):
+        return {"size": len(self._counts), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,42 @@
+import asyncio
+import logging
+import os
+from models import SongLeaderboard
+
+LEADERBOARD_REFRESH_INTERVAL = float(os.getenv("LEADERBOARD_REFRESH_INTERVAL", "300"))  # Seconds between leaderboard rebuilds
+LEADERBOARD_LOCK_ID = 7316600  # Advisory locks LEADERBOARD_LOCK_ID + n let one worker rebuild each board per cycle
+
+class LeaderboardRefresher:
+    """
+    Rebuilds every leaderboard from user_favorites each interval, starting
+    right away so boards are filled after the migration that creates them.
+
+    Favorites keep the boards current in between; the rebuild only drops
+    favorites that aged out of a window and repairs drift, so being up to an
+    interval late is harmless. With several workers each board is rebuilt by
+    whichever gets its lock first.
+    """
+    def __init__(self, interval=LEADERBOARD_REFRESH_INTERVAL):
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def refresh(self):
+        for offset, period in enumerate(SongLeaderboard.PERIODS):
+            try:
+                if await SongLeaderboard.refresh(period, LEADERBOARD_LOCK_ID + offset):
+                    logging.debug(f"Rebuilt the {period} leaderboard.")
+            except Exception:
+                logging.exception(f"Rebuilding the {period} leaderboard failed.")
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+import time
+import contextlib
+import asyncpg
+from models import Song, is_song_id
+
+LISTEN_FLUSH_INTERVAL = float(os.getenv("LISTEN_FLUSH_INTERVAL", "10"))  # Seconds between batched listen count writes
+LISTEN_FLUSH_MAX_PENDING = int(os.getenv("LISTEN_FLUSH_MAX_PENDING", "5000"))  # Songs with pending listens that trigger an early flush
+LISTEN_FLUSH_LAG_WARNING = float(os.getenv("LISTEN_FLUSH_LAG_WARNING", "60"))  # Warn when the oldest unwritten listen is this old
+
+class ListenCounter:
+    """
+    Write-behind listen counts. record() only adds to an in-memory tally per
+    song, and a background task writes all tallies in a single UPDATE every
+    flush interval, so a popular song costs one row update per interval
+    instead of one per play.
+
+    A flush that fails, e.g. because the database is unreachable, puts its
+    counts back to be retried with the next one. When Postgres rejects the
+    batch's data instead, the batch is split until the songs at fault are
+    found, and only their listens are dropped. Listens recorded since the last
+    flush are lost only if the process dies without running close().
+    """
+    def __init__(self, flush_interval=LISTEN_FLUSH_INTERVAL, max_pending=LISTEN_FLUSH_MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = {}
+        self.oldest_pending_at = None
+        self.flushed = 0
+        self.dropped = 0
+        self.last_flush_at = None
+        self.last_flush_lag = 0.0
+        self.last_flush_duration = 0.0
+        self._task = None
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def record(self, song_id, count=1):
+        self.pending[song_id] = self.pending.get(song_id, 0) + count
+        if self.oldest_pending_at is None:
+            self.oldest_pending_at = time.monotonic()
+        if len(self.pending) >= self.max_pending:
+            self._full.set()
+
+    @property
+    def lag(self):
+        """Seconds the oldest unwritten listen has been waiting."""
+        return time.monotonic() - self.oldest_pending_at if self.oldest_pending_at else 0.0
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self.pending:
+                return
+            counts, self.pending = self.pending, {}
+            lag, self.oldest_pending_at = self.lag, None
+            started = time.monotonic()
+            for song_id in [song_id for song_id in counts if not is_song_id(song_id)]:
+                logging.warning(f"Dropping listens for invalid song id {song_id}.")
+                self.dropped += counts.pop(song_id)
+            settled = {}
+            try:
+                await self._write(counts, settled)
+            except BaseException as e:
+                # Also on cancellation, so close() can still write what this flush held
+                if isinstance(e, Exception):
+                    logging.exception(f"Writing listen counts for {len(counts) - len(settled)} songs failed, will retry.")
+                for song_id, count in counts.items():
+                    if song_id not in settled:
+                        self.pending[song_id] = self.pending.get(song_id, 0) + count
+                self.oldest_pending_at = started - lag
+                if not isinstance(e, Exception):
+                    raise
+                return
+            written = sum(settled.values())
+            self.flushed += written
+            self.last_flush_at = time.time()
+            self.last_flush_lag = lag
+            self.last_flush_duration = time.monotonic() - started
+            level = logging.WARNING if lag > LISTEN_FLUSH_LAG_WARNING else logging.DEBUG
+            logging.log(level, f"Flushed {written} listens for {len(counts)} songs "
+                               f"in {self.last_flush_duration * 1000:.0f}ms, {lag:.1f}s after the oldest.")
+
+    async def _write(self, counts, settled):
+        """
+        Writes counts, recording in settled the listens written for each song
+        done with, 0 for dropped ones. A batch whose data Postgres rejects is
+        written in halves, down to single songs, whose listens are then
+        dropped instead of failing every later flush.
+        """
+        if not counts:
+            return
+        try:
+            await Song.add_listens(counts)
+        except (ValueError, asyncpg.DataError):
+            # Client-side encoding errors are ValueErrors, server-side ones DataErrors
+            if len(counts) == 1:
+                [(song_id, count)] = counts.items()
+                logging.exception(f"Dropping {count} listens for song {song_id}, which cannot be written.")
+                self.dropped += count
+                settled[song_id] = 0
+                return
+            song_ids = list(counts)
+            half = len(song_ids) // 2
+            await self._write({song_id: counts[song_id] for song_id in song_ids[:half]}, settled)
+            await self._write({song_id: counts[song_id] for song_id in song_ids[half:]}, settled)
+            return
+        settled.update(counts)
+
+    def stats(self):
+        return {
+            "pending_songs": len(self.pending),
+            "pending_listens": sum(self.pending.values()),
+            "lag": self.lag,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "last_flush_at": self.last_flush_at,
+            "last_flush_lag": self.last_flush_lag,
+            "last_flush_duration": self.last_flush_duration
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    async def close(self):
+        """Stops the flush task and writes whatever is still pending."""
+        if self._task:
+            self._task.cancel()
+            # A flush cut short puts its counts back; wait for that before the final one
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        await self.flush()
@@ -0,0 +1,36 @@
+import logging
+import os
+import time
+import httpx
+from model_selector import get_weighted_model_name
+
+MODEL_STATS_TTL = float(os.getenv("MODEL_STATS_TTL", "60"))  # Seconds the agent's model stats are reused
+
+class ModelRouter:
+    """
+    Picks the model for a new generation from the lyricist's rolling per-model
+    stats, fetched from /model_stats at most once per TTL. Falls back to a
+    uniform pick while the agent is unreachable.
+    """
+    def __init__(self, lyricist_host, ttl=MODEL_STATS_TTL):
+        self.lyricist_host = lyricist_host
+        self.ttl = ttl
+        self.stats = {}
+        self._fetched_at = None
+
+    async def _refresh(self):
+        now = time.monotonic()
+        if self._fetched_at is not None and now - self._fetched_at < self.ttl:
+            return
+        self._fetched_at = now
+        try:
+            async with httpx.AsyncClient(timeout=5) as client:
+                response = await client.get(f"{self.lyricist_host}/model_stats")
+                response.raise_for_status()
+                self.stats = response.json()["models"]
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            logging.warning(f"Fetching model stats failed, keeping previous weights: {e}")
+
+    async def pick(self):
+        await self._refresh()
+        return get_weighted_model_name(self.stats)
@@ -1,13 +1,74 @@
 import asyncpg
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
+import math
+import os
+import sys
 from typing import Optional
 import uuid
+sys.path.insert(0, os.path.abspath("../common"))
 from model_selector import get_model_nickname
+from tracing import traced
+from song_events import notify_song_event
+from migrations import migrate
 
 # Define a global pool variable
 pool = None
 
+SONG_ID_MAX = 2**31 - 1  # songs.id is a Postgres integer
+
+def is_song_id(value):
+    """
+    Whether value fits songs.id. A larger id sent to Postgres fails the whole
+    statement, taking every other song in the batch down with it.
+    """
+    return 0 < value <= SONG_ID_MAX
+
+# Favorites leaderboards kept in song_leaderboards, by the window of favorites they count
+LEADERBOARD_WINDOWS = {
+    "yesterday": timedelta(days=1),
+    "last_week": timedelta(days=7),
+    "last_month": timedelta(days=30),
+    "last_3_months": timedelta(days=90),
+    "last_year": timedelta(days=365),
+    "all_time": None,
+}
+TRENDING_HALF_LIFE = float(os.getenv("TRENDING_HALF_LIFE", "24"))  # Hours after which a favorite counts half as much toward trending
+TRENDING_HORIZON = float(os.getenv("TRENDING_HORIZON", "14"))  # Days of favorites counted when the trending board is rebuilt
+TRENDING_EPOCH = datetime(2024, 1, 1)  # Reference time of the stored trending scores; changing it invalidates them
+TRENDING_TAU = TRENDING_HALF_LIFE * 3600 / math.log(2)
+
+def trending_weight(favorited_at):
+    """
+    The log of a favorite's forward-decayed weight, exp((t - epoch) / tau).
+
+    Weights grow with time instead of older ones shrinking, so a stored score
+    never needs rescaling and the board's order stays correct between
+    updates. Scores are kept as logs (summed with log-add-exp) so the growing
+    weights never overflow.
+    """
+    return (favorited_at - TRENDING_EPOCH).total_seconds() / TRENDING_TAU
+
+# Trending scores are updated in SQL; these are the same formulas, kept in step with UserFavorite.add and remove
+
+def log_add_exp(score, weight):
+    """Adds a favorite's log weight to a log score: log(exp(score) + exp(weight)), without overflowing."""
+    return max(score, weight) + math.log(1 + math.exp(-abs(score - weight)))
+
+def log_sub_exp(score, weight):
+    """
+    Takes a favorite's log weight back out of a log score: log(exp(score) - exp(weight)).
+    A score the favorite made up entirely (up to rounding) becomes 0, an empty board entry.
+    """
+    if score - weight > 1e-9:
+        return score + math.log(1 - math.exp(weight - score))
+    return 0
+
+def leaderboard_windows(now):
+    """Parallel lists of window names and the earliest favorite each counts."""
+    periods = list(LEADERBOARD_WINDOWS)
+    return periods, [now - delta if delta else datetime(1970, 1, 1) for delta in LEADERBOARD_WINDOWS.values()]
+
 class Song:
     def __init__(
         self,
@@ -67,36 +128,7 @@ class Song:
         return cls(**record_dict)
 
     @classmethod
-    async def get_all_favorites(cls):
-        async with pool.acquire() as conn:
-            rows = await conn.fetch(
-                """
-                SELECT s.*
-                FROM songs s
-                WHERE favorite_count > 0
-                ORDER BY favorite_count DESC, created_at DESC
-                """
-            )
-        # Use from_db_record for each row
-        return [cls.from_db_record(row) for row in rows]
-
-    @classmethod
-    async def get_all_favorites_filtered(cls, delta):
-        lower_bound = datetime.utcnow() - delta
-        async with pool.acquire() as conn:
-            rows = await conn.fetch(
-                """
-                SELECT DISTINCT s.*
-                FROM songs s
-                JOIN user_favorites uf ON s.id = uf.song_id
-                WHERE uf.created_at >= $1
-                ORDER BY s.favorite_count DESC, s.created_at DESC
-                """,
-                lower_bound
-            )
-        return [cls.from_db_record(row) for row in rows]
-
-    @classmethod
+    @traced("db.songs.create")
     async def create(cls, **kwargs):
         # Provide default values for optional fields
         name = kwargs.get("name", "Unknown Title")
@@ -134,7 +166,9 @@ class Song:
                 model_name,
                 station
             )
-        return cls.from_db_record(row)
+            song = cls.from_db_record(row)
+            await notify_song_event(conn, song, "created")
+        return song
 
     @classmethod
     async def get(cls, song_id):
@@ -167,44 +201,84 @@ class Song:
             """, song.created_at, song.generation_uuid, limit)
         return [cls.from_db_record(row) for row in rows]
 
+    @classmethod
+    async def get_by_generation(cls, generation_uuid):
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT * FROM songs WHERE generation_uuid = $1 ORDER BY id",
+                uuid.UUID(generation_uuid)
+            )
+        return [cls.from_db_record(row) for row in rows]
+
     @classmethod
     async def get_all(cls):
         async with pool.acquire() as conn:
             rows = await conn.fetch("SELECT * FROM songs ORDER BY created_at DESC")
         return [cls.from_db_record(row) for row in rows]
 
+    @property
+    def cursor(self):
+        """This song's place in playback order, for complete_page's before and after."""
+        return f"{self.created_at.isoformat()},{self.id}"
+
+    @staticmethod
+    def parse_cursor(cursor):
+        """
+        Returns (created_at, id) from a cursor. Raises ValueError if it is malformed.
+        """
+        created_at, _, song_id = cursor.rpartition(",")
+        return datetime.fromisoformat(created_at), int(song_id)
+
     @classmethod
-    async def last_complete(cls, offset, station=None):
-        offset *= 2  # FIXME: Double offset for compatibility with pagination
+    @traced("db.songs.complete_page")
+    async def complete_page(cls, before=None, after=None, station=None, limit=10):
+        """
+        A page of complete songs in playback order, found by (created_at, id)
+        keyset rather than OFFSET, so any page costs one index descent on the
+        partial complete-song indexes however large the catalog grows.
+
+        Args:
+            before (str): Cursor; returns the songs just older than it, newest first.
+            after (str): Cursor; returns the songs just newer than it, oldest first.
+            station (str): Only songs of this station.
+            limit (int): Page size.
+
+        Returns:
+            list: Songs. With neither cursor, the newest songs, newest first.
+        """
+        conditions = ["status = 'complete'"]
+        params = []
+        if station:
+            params.append(station)
+            conditions.append(f"station = ${len(params)}")
+        order = "DESC"
+        if before or after:
+            created_at, song_id = cls.parse_cursor(before or after)
+            params += [created_at, song_id]
+            comparison = "<" if before else ">"
+            conditions.append(f"(created_at, id) {comparison} (${len(params) - 1}, ${len(params)})")
+            order = "DESC" if before else "ASC"
+        params.append(limit)
+        query = f"""
+            SELECT * FROM songs
+            WHERE {' AND '.join(conditions)}
+            ORDER BY created_at {order}, id {order}
+            LIMIT ${len(params)}
+        """
         async with pool.acquire() as conn:
-            # Build main query dynamically based on station parameter
-            station_clause = "AND station = $3" if station else ""
-            params = [1, offset]
-            if station:
-                params.append(station)
-            query = f"""
-                SELECT * FROM songs
-                WHERE status = 'complete' {station_clause}
-                ORDER BY created_at DESC
-                LIMIT $1 OFFSET $2
-            """
             rows = await conn.fetch(query, *params)
-            if rows:
-                return cls.from_db_record(rows[0])
-
-            if offset > 0:
-                # Fallback query: get the last complete song
-                station_clause = "AND station = $1" if station else ""
-                params = [station] if station else []
-                fallback_query = f"""
-                    SELECT * FROM songs
-                    WHERE status = 'complete' {station_clause}
-                    ORDER BY created_at DESC
-                    LIMIT 1
-                """
-                rows = await conn.fetch(fallback_query, *params)
-                if rows:
-                    return cls.from_db_record(rows[0])
+        return [cls.from_db_record(row) for row in rows]
+
+    @classmethod
+    async def playback_start(cls, station=None, behind=10):
+        """
+        The song a new listener starts on: the complete song `behind` places
+        before the newest, so the queue already has songs ready after it, or
+        the newest one while the catalog is smaller than that.
+        """
+        songs = await cls.complete_page(station=station, limit=behind + 1)
+        if songs:
+            return songs[behind] if len(songs) > behind else songs[0]
 
         return cls(
             id=None,
@@ -218,6 +292,7 @@ class Song:
             audio_url=None
         )
 
+    @traced("db.songs.update_name")
     async def update_name(self, name):
         async with pool.acquire() as conn:
             await conn.execute(
@@ -226,14 +301,27 @@ class Song:
             )
         self.name = name
 
+    @traced("db.songs.update_model_name")
+    async def update_model_name(self, model_name):
+        async with pool.acquire() as conn:
+            await conn.execute(
+                "UPDATE songs SET model_name = $1 WHERE id = $2",
+                model_name, self.id
+            )
+        self.model_name = model_name
+        self.model_nickname = get_model_nickname(model_name)[1] if model_name else None
+
+    @traced("db.songs.update_status")
     async def update_status(self, new_status):
         async with pool.acquire() as conn:
             await conn.execute(
                 "UPDATE songs SET status = $1 WHERE id = $2",
                 new_status, self.id
             )
-        self.status = new_status
+            self.status = new_status
+            await notify_song_event(conn, self, "status")
 
+    @traced("db.songs.update_details")
     async def update_details(self, new_details):
         async with pool.acquire() as conn:
             await conn.execute(
@@ -242,15 +330,17 @@ class Song:
             )
         self.details = new_details
 
+    @traced("db.songs.update_media_urls")
     async def update_media_urls(self, image_url=None, image_large_url=None, video_url=None, audio_url=None):
         async with pool.acquire() as conn:
             await conn.execute(
                 "UPDATE songs SET image_url = $1, image_large_url = $2, video_url = $3, audio_url = $4 WHERE id = $5",
                 image_url, image_large_url, video_url, audio_url, self.id
             )
-        self.image_url, self.image_large_url, self.video_url, self.audio_url = (
-            image_url, image_large_url, video_url, audio_url
-        )
+            self.image_url, self.image_large_url, self.video_url, self.audio_url = (
+                image_url, image_large_url, video_url, audio_url
+            )
+            await notify_song_event(conn, self, "media")
 
     async def increment_listen_count(self):
         async with pool.acquire() as conn:
@@ -260,17 +350,85 @@ class Song:
             )
         self.listens += 1
 
-    async def get_favorite_count(self):
-        return await UserFavorite.get_favorite_count(self.id)
+    @classmethod
+    @traced("db.songs.add_listens")
+    async def add_listens(cls, counts):
+        """
+        Adds many songs' listens in one statement.
 
-    async def update_favorite_count(self):
-        favorite_count = await self.get_favorite_count()
+        Args:
+            counts (dict): Song id to the number of listens to add.
+        """
+        # Sorted so concurrent flushes from several workers lock rows in the same order
+        song_ids = sorted(counts)
         async with pool.acquire() as conn:
             await conn.execute(
-                "UPDATE songs SET favorite_count = $1 WHERE id = $2",
-                favorite_count, self.id
+                """
+                UPDATE songs SET listens = songs.listens + batch.listens
+                FROM unnest($1::int[], $2::int[]) AS batch(id, listens)
+                WHERE songs.id = batch.id
+                """,
+                song_ids, [counts[song_id] for song_id in song_ids]
             )
-        self.favorite_count = favorite_count
+
+    @classmethod
+    @traced("db.songs.get_favorite_counts")
+    async def get_favorite_counts(cls, song_ids):
+        """
+        Returns a dict of song id to favorite count for the given songs.
+        """
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT id, COALESCE(favorite_count, 0) AS favorite_count FROM songs WHERE id = ANY($1::int[])",
+                list(song_ids)
+            )
+        return {row["id"]: row["favorite_count"] for row in rows}
+
+    @classmethod
+    @traced("db.songs.reconcile_favorite_counts")
+    async def reconcile_favorite_counts(cls, after_id=0, batch_size=1000):
+        """
+        Recounts favorite_count from user_favorites for the next batch of songs
+        and fixes the ones that drifted.
+
+        The batch's rows are locked before counting, so a favorite toggled
+        meanwhile either is counted or waits and is applied on top of the fix.
+
+        Args:
+            after_id (int): Only songs with a larger id are checked.
+            batch_size (int): How many songs to check.
+
+        Returns:
+            tuple: The last song id checked (None when there were none left)
+                and a list of (song_id, old_count, new_count) for fixed songs.
+        """
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                song_ids = await conn.fetch(
+                    "SELECT id FROM songs WHERE id > $1 ORDER BY id LIMIT $2 FOR UPDATE",
+                    after_id, batch_size
+                )
+                if not song_ids:
+                    return None, []
+                last_id = song_ids[-1]["id"]
+                rows = await conn.fetch(
+                    """
+                    WITH counts AS (
+                        SELECT s.id, s.favorite_count AS old_count, COUNT(f.id) AS new_count
+                        FROM songs s
+                        LEFT JOIN user_favorites f ON f.song_id = s.id
+                        WHERE s.id > $1 AND s.id <= $2
+                        GROUP BY s.id
+                    )
+                    UPDATE songs SET favorite_count = counts.new_count
+                    FROM counts
+                    WHERE songs.id = counts.id
+                    AND songs.favorite_count IS DISTINCT FROM counts.new_count
+                    RETURNING songs.id, counts.old_count, counts.new_count
+                    """,
+                    after_id, last_id
+                )
+        return last_id, [(row["id"], row["old_count"], row["new_count"]) for row in rows]
 
 class UserFavorite:
     def __init__(self, id, user_id, song_id, created_at):
@@ -327,13 +485,354 @@ class UserFavorite:
         return result
 
     @classmethod
-    async def get_favorite_count(cls, song_id):
+    async def favorited(cls, user_id, song_ids):
+        """
+        Returns the set of the given song ids the user has favorited.
+        """
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT song_id FROM user_favorites WHERE user_id = $1 AND song_id = ANY($2::int[])",
+                user_id, list(song_ids)
+            )
+        return {row["song_id"] for row in rows}
+
+    @classmethod
+    @traced("db.user_favorites.add")
+    async def add(cls, user_id, song_id):
+        """
+        Favorites a song for a user, bumps its favorite_count and adds it to
+        every leaderboard, in one statement. Favoriting a song twice changes nothing.
+
+        Returns:
+            int: The song's favorite count afterwards, or None if there is no such song.
+        """
+        now = datetime.utcnow()
+        async with pool.acquire() as conn:
+            return await conn.fetchval(
+                """
+                WITH inserted AS (
+                    INSERT INTO user_favorites (user_id, song_id, created_at)
+                    SELECT $1, id, $3 FROM songs WHERE id = $2
+                    ON CONFLICT (user_id, song_id) DO NOTHING
+                    RETURNING song_id
+                ), updated AS (
+                    UPDATE songs SET favorite_count = COALESCE(favorite_count, 0) + 1
+                    WHERE id IN (SELECT song_id FROM inserted)
+                    RETURNING favorite_count
+                ), windows AS (
+                    INSERT INTO song_leaderboards (period, song_id, score)
+                    SELECT period, song_id, 1 FROM inserted, unnest($4::text[]) AS period
+                    ON CONFLICT (period, song_id) DO UPDATE SET score = song_leaderboards.score + 1
+                ), trending AS (
+                    INSERT INTO song_leaderboards (period, song_id, score)
+                    SELECT 'trending', song_id, $5 FROM inserted
+                    -- log_add_exp(score, weight)
+                    ON CONFLICT (period, song_id) DO UPDATE SET score =
+                        GREATEST(song_leaderboards.score, EXCLUDED.score)
+                        + LN(1 + EXP(-ABS(song_leaderboards.score - EXCLUDED.score)))
+                )
+                SELECT COALESCE(
+                    (SELECT favorite_count FROM updated),
+                    (SELECT COALESCE(favorite_count, 0) FROM songs WHERE id = $2)
+                )
+                """,
+                user_id, song_id, now, list(LEADERBOARD_WINDOWS), trending_weight(now)
+            )
+
+    @classmethod
+    @traced("db.user_favorites.remove")
+    async def remove(cls, user_id, song_id):
+        """
+        Unfavorites a song for a user, lowers its favorite_count and takes it
+        off the leaderboards whose window the favorite fell in, in one
+        statement. Unfavoriting a song that was not a favorite changes nothing.
+
+        Returns:
+            int: The song's favorite count afterwards, or None if there is no such song.
+        """
+        periods, since = leaderboard_windows(datetime.utcnow())
+        async with pool.acquire() as conn:
+            return await conn.fetchval(
+                """
+                WITH deleted AS (
+                    DELETE FROM user_favorites WHERE user_id = $1 AND song_id = $2
+                    RETURNING song_id, created_at
+                ), updated AS (
+                    UPDATE songs SET favorite_count = GREATEST(COALESCE(favorite_count, 0) - 1, 0)
+                    WHERE id IN (SELECT song_id FROM deleted)
+                    RETURNING favorite_count
+                ), windows AS (
+                    UPDATE song_leaderboards SET score = GREATEST(score - 1, 0)
+                    FROM deleted, unnest($3::text[], $4::timestamp[]) AS w(period, since)
+                    WHERE song_leaderboards.period = w.period
+                    AND song_leaderboards.song_id = deleted.song_id
+                    AND deleted.created_at >= w.since
+                ), trending AS (
+                    -- log_sub_exp(score, weight); a score the favorite made up entirely drops to 0
+                    UPDATE song_leaderboards SET score = CASE
+                        WHEN score - weight > 1e-9 THEN score + LN(1 - EXP(weight - score))
+                        ELSE 0 END
+                    FROM (
+                        SELECT song_id, EXTRACT(EPOCH FROM created_at - $5::timestamp)::float8 / $6 AS weight
+                        FROM deleted
+                    ) AS removed
+                    WHERE song_leaderboards.period = 'trending' AND song_leaderboards.song_id = removed.song_id
+                )
+                SELECT COALESCE(
+                    (SELECT favorite_count FROM updated),
+                    (SELECT COALESCE(favorite_count, 0) FROM songs WHERE id = $2)
+                )
+                """,
+                user_id, song_id, periods, since, TRENDING_EPOCH, TRENDING_TAU
+            )
+
+class SongLeaderboard:
+    """
+    Pre-sorted top songs per window of favorites (LEADERBOARD_WINDOWS) and a
+    time-decayed "trending" board, read with one indexed query.
+
+    UserFavorite.add and remove keep the boards current as favorites happen.
+    refresh() rebuilds a board from user_favorites now and then, which drops
+    favorites that have aged out of a window and repairs any drift.
+    """
+    PERIODS = list(LEADERBOARD_WINDOWS) + ["trending"]
+
+    @classmethod
+    @traced("db.song_leaderboards.top")
+    async def top(cls, period, limit=50):
+        """
+        Returns the top songs of a board, best first.
+        """
         async with pool.acquire() as conn:
-            count = await conn.fetchval(
-                "SELECT COUNT(*) FROM user_favorites WHERE song_id = $1",
-                song_id
+            rows = await conn.fetch(
+                """
+                SELECT s.* FROM song_leaderboards l
+                JOIN songs s ON s.id = l.song_id
+                WHERE l.period = $1 AND l.score > 0
+                ORDER BY l.score DESC, l.song_id DESC
+                LIMIT $2
+                """,
+                period, limit
             )
-        return count
+        return [Song.from_db_record(row) for row in rows]
+
+    @classmethod
+    @traced("db.song_leaderboards.refresh")
+    async def refresh(cls, period, lock_id):
+        """
+        Rebuilds one board in a transaction; readers see the old board until it
+        commits. Skipped, returning False, while another worker holds lock_id.
+
+        A favorite committed while the rebuild runs can be missing from the
+        rebuilt board until the next refresh. One that adds its song to the
+        board after the DELETE is overwritten by the rebuilt score rather
+        than failing the rebuild on the unique key.
+        """
+        now = datetime.utcnow()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                if not await conn.fetchval("SELECT pg_try_advisory_xact_lock($1)", lock_id):
+                    return False
+                await conn.execute("DELETE FROM song_leaderboards WHERE period = $1", period)
+                if period == "trending":
+                    await conn.execute(
+                        """
+                        INSERT INTO song_leaderboards (period, song_id, score)
+                        SELECT 'trending', song_id, top + LN(SUM(EXP(weight - top)))
+                        FROM (
+                            SELECT song_id, weight, MAX(weight) OVER (PARTITION BY song_id) AS top
+                            FROM (
+                                SELECT song_id, EXTRACT(EPOCH FROM created_at - $2::timestamp)::float8 / $3 AS weight
+                                FROM user_favorites
+                                WHERE created_at >= $1
+                            ) AS favorites
+                        ) AS weighted
+                        GROUP BY song_id, top
+                        ON CONFLICT (period, song_id) DO UPDATE SET score = EXCLUDED.score
+                        """,
+                        now - timedelta(days=TRENDING_HORIZON), TRENDING_EPOCH, TRENDING_TAU
+                    )
+                elif LEADERBOARD_WINDOWS[period] is None:
+                    await conn.execute(
+                        """
+                        INSERT INTO song_leaderboards (period, song_id, score)
+                        SELECT $1, id, favorite_count FROM songs WHERE favorite_count > 0
+                        ON CONFLICT (period, song_id) DO UPDATE SET score = EXCLUDED.score
+                        """,
+                        period
+                    )
+                else:
+                    await conn.execute(
+                        """
+                        INSERT INTO song_leaderboards (period, song_id, score)
+                        SELECT $1, song_id, COUNT(*) FROM user_favorites
+                        WHERE created_at >= $2
+                        GROUP BY song_id
+                        ON CONFLICT (period, song_id) DO UPDATE SET score = EXCLUDED.score
+                        """,
+                        period, now - LEADERBOARD_WINDOWS[period]
+                    )
+        return True
+
+class GenerationCheckpoint:
+    """
+    Progress of one generation (the songs sharing a generation_uuid) through the
+    write lyrics -> submit to singer -> receive media pipeline, so a failed or
+    interrupted generation can resume from its last completed stage.
+
+    Stages: created, lyrics_written, submitted, media_received, complete, failed.
+    """
+    def __init__(
+        self,
+        generation_uuid=None,
+        stage=None,
+        lyrics=None,
+        sing_job_id=None,
+        suno_ids=None,
+        media=None,
+        attempts=0,
+        lease_until=None,
+        updated_at=None,
+        **kwargs
+    ):
+        self.generation_uuid = str(generation_uuid) if generation_uuid else None
+        self.stage = stage
+        self.lyrics = json.loads(lyrics) if isinstance(lyrics, str) else lyrics
+        self.sing_job_id = sing_job_id
+        self.suno_ids = list(suno_ids or [])
+        self.media = json.loads(media) if isinstance(media, str) else media
+        self.attempts = attempts
+        self.lease_until = lease_until
+        self.updated_at = updated_at
+
+    @classmethod
+    def from_db_record(cls, record):
+        return cls(**dict(record))
+
+    @classmethod
+    @traced("db.song_generations.create")
+    async def create(cls, generation_uuid, lease_seconds):
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                INSERT INTO song_generations (generation_uuid, stage, updated_at, lease_until)
+                VALUES ($1, 'created', NOW(), NOW() + $2 * INTERVAL '1 second')
+                ON CONFLICT (generation_uuid) DO UPDATE SET updated_at = song_generations.updated_at
+                RETURNING *
+                """,
+                uuid.UUID(generation_uuid), lease_seconds
+            )
+        return cls.from_db_record(row)
+
+    @classmethod
+    async def get(cls, generation_uuid):
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT * FROM song_generations WHERE generation_uuid = $1",
+                uuid.UUID(generation_uuid)
+            )
+        return cls.from_db_record(row) if row else None
+
+    @classmethod
+    async def backfill_orphans(cls, stale_seconds, window_seconds):
+        """
+        Creates checkpoints for unfinished songs from the last window_seconds that
+        predate checkpointing, so the recovery worker can pick them up. Songs that
+        already have lyrics resume from the singer instead of the lyricist.
+        Songs that already failed ("error singing") are left alone, so adopting
+        them never spends Suno credits on generations that were given up on.
+        """
+        async with pool.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO song_generations (generation_uuid, stage, lyrics, updated_at)
+                SELECT DISTINCT ON (generation_uuid)
+                    generation_uuid,
+                    CASE WHEN details ? 'lyrics' THEN 'lyrics_written' ELSE 'created' END,
+                    CASE WHEN details ? 'lyrics' THEN details END,
+                    created_at
+                FROM songs
+                WHERE status IN ('generating', 'writing lyrics', 'singing')
+                AND generation_uuid IS NOT NULL
+                AND created_at < NOW() - $1 * INTERVAL '1 second'
+                AND created_at > NOW() - $2 * INTERVAL '1 second'
+                ORDER BY generation_uuid, created_at
+                ON CONFLICT (generation_uuid) DO NOTHING
+                """,
+                stale_seconds, window_seconds
+            )
+
+    @classmethod
+    async def claim_stale(cls, lease_seconds, max_attempts, limit=10):
+        """
+        Leases unfinished generations nobody is working on (their lease expired)
+        and returns them. SKIP LOCKED keeps app workers from claiming the same one.
+        """
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                UPDATE song_generations SET lease_until = NOW() + $1 * INTERVAL '1 second'
+                WHERE generation_uuid IN (
+                    SELECT generation_uuid FROM song_generations
+                    WHERE stage NOT IN ('complete', 'failed')
+                    AND attempts < $2
+                    AND (lease_until IS NULL OR lease_until < NOW())
+                    ORDER BY updated_at
+                    LIMIT $3
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING *
+                """,
+                lease_seconds, max_attempts, limit
+            )
+        return [cls.from_db_record(row) for row in rows]
+
+    @traced("db.song_generations.update")
+    async def _save(self, lease_seconds=None, **fields):
+        assignments = [f"{name} = ${idx}" for idx, name in enumerate(fields, start=2)]
+        assignments.append("updated_at = NOW()")
+        params = [uuid.UUID(self.generation_uuid), *fields.values()]
+        if lease_seconds is not None:
+            params.append(lease_seconds)
+            assignments.append(f"lease_until = NOW() + ${len(params)} * INTERVAL '1 second'")
+        async with pool.acquire() as conn:
+            await conn.execute(
+                f"UPDATE song_generations SET {', '.join(assignments)} WHERE generation_uuid = $1",
+                *params
+            )
+
+    async def renew_lease(self, lease_seconds):
+        await self._save(lease_seconds=lease_seconds)
+
+    async def record_lyrics(self, lyrics):
+        await self._save(stage="lyrics_written", lyrics=json.dumps(lyrics))
+        self.stage, self.lyrics = "lyrics_written", lyrics
+
+    async def record_submission(self, sing_job_id):
+        await self._save(stage="submitted", sing_job_id=sing_job_id)
+        self.stage, self.sing_job_id = "submitted", sing_job_id
+
+    async def record_suno_ids(self, suno_ids):
+        await self._save(suno_ids=list(suno_ids))
+        self.suno_ids = list(suno_ids)
+
+    async def record_media(self, media):
+        await self._save(stage="media_received", media=json.dumps(media))
+        self.stage, self.media = "media_received", media
+
+    async def record_complete(self):
+        await self._save(stage="complete", lease_seconds=0)
+        self.stage = "complete"
+
+    async def record_failure(self, stage, max_attempts):
+        """
+        Rewinds to the given stage for another attempt, or gives up for good once
+        max_attempts is reached. Lyrics and Suno ids already stored are kept.
+        """
+        attempts = self.attempts + 1
+        stage = stage if attempts < max_attempts else "failed"
+        await self._save(stage=stage, attempts=attempts, lease_seconds=0)
+        self.stage, self.attempts = stage, attempts
 
 async def get_db_pool(db_url):
     global pool
@@ -344,39 +843,4 @@ async def get_db_pool(db_url):
 async def init_db(pool_instance):
     global pool
     pool = pool_instance
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS songs (
-                id SERIAL PRIMARY KEY,
-                name TEXT NOT NULL,
-                created_at TIMESTAMP NOT NULL,
-                status TEXT NOT NULL,
-                details JSONB
-            );
-            ALTER TABLE songs ADD COLUMN IF NOT EXISTS image_url TEXT;
-            ALTER TABLE songs ADD COLUMN IF NOT EXISTS image_large_url TEXT;
-            ALTER TABLE songs ADD COLUMN IF NOT EXISTS video_url TEXT;
-            ALTER TABLE songs ADD COLUMN IF NOT EXISTS audio_url TEXT;
-            /* Removed redundant column additions:
-            ALTER TABLE songs ADD COLUMN IF NOT EXISTS album_id INTEGER DEFAULT NULL;
-            ALTER TABLE songs ADD COLUMN IF NOT EXISTS station_id INTEGER DEFAULT NULL;
-            ALTER TABLE songs ADD COLUMN IF NOT EXISTS playlist_id INTEGER DEFAULT NULL;
-            */
-            ALTER TABLE songs ADD COLUMN IF NOT EXISTS model_name TEXT DEFAULT NULL;
-            ALTER TABLE songs ADD COLUMN IF NOT EXISTS station TEXT DEFAULT NULL;
-            ALTER TABLE songs ADD COLUMN IF NOT EXISTS generation_uuid UUID;
-            ALTER TABLE songs ADD COLUMN IF NOT EXISTS listens INTEGER DEFAULT 0;
-            ALTER TABLE songs DROP COLUMN IF EXISTS tags;
-            ALTER TABLE songs DROP COLUMN IF EXISTS station_id;
-            ALTER TABLE songs DROP COLUMN IF EXISTS album_id;
-            ALTER TABLE songs DROP COLUMN IF EXISTS playlist_id;
-            ALTER TABLE songs ADD COLUMN IF NOT EXISTS favorite_count INTEGER DEFAULT 0;
-
-            CREATE TABLE IF NOT EXISTS user_favorites (
-                id SERIAL PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                song_id INTEGER NOT NULL,
-                created_at TIMESTAMP NOT NULL,
-                UNIQUE(user_id, song_id)
-            );
-        """)
\ No newline at end of file
+    await migrate(pool)
@@ -0,0 +1,241 @@
+import asyncio
+import contextlib
+import logging
+import os
+import httpx
+import tracing
+from models import Song, GenerationCheckpoint
+from agent_jobs import SingJobTimeout
+
+GENERATION_LEASE = float(os.getenv("GENERATION_LEASE", "300"))  # Seconds a worker owns a generation, renewed while it runs
+GENERATION_MAX_ATTEMPTS = int(os.getenv("GENERATION_MAX_ATTEMPTS", "5"))  # Failed stages before a generation is abandoned
+RECOVERY_INTERVAL = float(os.getenv("RECOVERY_INTERVAL", "60"))  # Seconds between scans for stalled generations
+RECOVERY_BACKFILL_WINDOW = float(os.getenv("RECOVERY_BACKFILL_WINDOW", "86400"))  # How far back unfinished songs are adopted at startup
+WRITE_SONG_TIMEOUT = 1000
+
+class GenerationPipeline:
+    """
+    Drives a generation through write lyrics -> sing -> store media, checkpointing
+    each stage in song_generations so work already paid for is never redone.
+
+    run() starts a new generation. The recovery worker periodically claims
+    generations whose lease expired (the app restarted, or a stage failed) and
+    resumes them from their last completed stage: stored lyrics are re-submitted
+    to the singer, along with any Suno ids it already reported so it re-polls
+    them instead of generating new audio.
+
+    Args:
+        lyricist_host (str): Base URL of the lyricist agent.
+        sing_jobs (SingJobWatcher): Shared watcher for singer jobs.
+        on_change (callable): Called after each stage, when the songs' status or media changed.
+    """
+    def __init__(self, lyricist_host, sing_jobs, lease=GENERATION_LEASE, max_attempts=GENERATION_MAX_ATTEMPTS,
+                 recovery_interval=RECOVERY_INTERVAL, on_change=None):
+        self.lyricist_host = lyricist_host
+        self.sing_jobs = sing_jobs
+        self.on_change = on_change
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.recovery_interval = recovery_interval
+        self._recovery_task = None
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=WRITE_SONG_TIMEOUT)
+        return self._client
+
+    async def run(self, songs):
+        """
+        Generates lyrics and audio for songs sharing a generation_uuid.
+        """
+        try:
+            checkpoint = await GenerationCheckpoint.create(songs[0].generation_uuid, self.lease)
+        except Exception:
+            # Without a checkpoint the recovery worker can never pick these songs up
+            logging.exception(f"Checkpointing generation {songs[0].generation_uuid} failed, giving up on it.")
+            try:
+                for song in songs:
+                    await song.update_status("error")
+            except Exception:
+                logging.exception(f"Marking the songs of generation {songs[0].generation_uuid} failed.")
+            if self.on_change:
+                self.on_change()
+            return
+        await self.resume(checkpoint, songs)
+
+    async def resume(self, checkpoint, songs):
+        """
+        Runs the remaining stages of a checkpointed generation while holding its lease.
+        """
+        renew = asyncio.create_task(self._renew_lease(checkpoint))
+        try:
+            with tracing.start_span("generation", generation_uuid=checkpoint.generation_uuid, station=songs[0].station,
+                                    model_name=songs[0].model_name, resumed_from=checkpoint.stage) as span:
+                while checkpoint.stage not in ("complete", "failed"):
+                    with tracing.start_span(f"stage.{checkpoint.stage}", attempts=checkpoint.attempts):
+                        advanced = await self._advance(checkpoint, songs)
+                    if self.on_change:
+                        self.on_change()
+                    if not advanced:
+                        break
+                span.set_attribute("stage", checkpoint.stage)
+        except Exception:
+            logging.exception(f"Generation {checkpoint.generation_uuid} failed at stage {checkpoint.stage}.")
+            await self._fail(checkpoint, songs, checkpoint.stage)
+        finally:
+            renew.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await renew
+
+    async def _renew_lease(self, checkpoint):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            await checkpoint.renew_lease(self.lease)
+
+    async def _advance(self, checkpoint, songs):
+        """
+        Runs the checkpoint's next stage. Returns False if the stage failed and the
+        generation was handed back to the recovery worker.
+        """
+        if checkpoint.stage == "created":
+            return await self._write_lyrics(checkpoint, songs)
+        if checkpoint.stage == "lyrics_written":
+            return await self._submit(checkpoint, songs)
+        if checkpoint.stage == "submitted":
+            return await self._wait_for_media(checkpoint, songs)
+        if checkpoint.stage == "media_received":
+            await self._store_media(checkpoint, songs)
+            return True
+        raise ValueError(f"Unknown generation stage: {checkpoint.stage}")
+
+    async def _write_lyrics(self, checkpoint, songs):
+        for song in songs:
+            await song.update_status("writing lyrics")
+        song = songs[0]
+        args = {"instruction": "", "station": song.station, "model_name": song.model_name, "artist_name": song.model_nickname,
+                "traceparent": tracing.current_traceparent(), "generation_uuid": checkpoint.generation_uuid}
+        logging.debug(f"Calling /write_song endpoint to generate lyrics: {args}")
+        try:
+            response = await self.client.post(f"{self.lyricist_host}/write_song", json=args)
+            response.raise_for_status()
+            lyrics = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logging.error(f"Error in /write_song for generation {checkpoint.generation_uuid}: {e}")
+            await self._fail(checkpoint, songs, "created")
+            return False
+        logging.info(f"Lyrics generated: {lyrics}")
+
+        # A pre-written song from the lyricist's buffer may come from a different model
+        written_by = lyrics.get("model_name")
+        for song in songs:
+            await song.update_details(lyrics)
+            await song.update_name(lyrics["title"])
+            if written_by and written_by != song.model_name:
+                await song.update_model_name(written_by)
+        await checkpoint.record_lyrics(lyrics)
+        return True
+
+    async def _submit(self, checkpoint, songs):
+        for song in songs:
+            await song.update_status("singing")
+        song_data = dict(checkpoint.lyrics, song_ids=checkpoint.suno_ids, traceparent=tracing.current_traceparent(),
+                         generation_uuid=checkpoint.generation_uuid)
+        logging.debug(f"Submitting sing job for generation {checkpoint.generation_uuid}, known Suno ids: {checkpoint.suno_ids}")
+        try:
+            job_id = await self.sing_jobs.submit(song_data)
+        except httpx.HTTPError as e:
+            logging.error(f"Error submitting sing job for generation {checkpoint.generation_uuid}: {e}")
+            await self._fail(checkpoint, songs, "lyrics_written")
+            return False
+        await checkpoint.record_submission(job_id)
+        return True
+
+    async def _wait_for_media(self, checkpoint, songs):
+        job_id = checkpoint.sing_job_id
+        try:
+            sing_results = await self.sing_jobs.wait(job_id, on_song_ids=checkpoint.record_suno_ids)
+        except SingJobTimeout as e:
+            # The job may still finish; the recovery worker waits on it again later
+            logging.error(f"{e}; handing generation {checkpoint.generation_uuid} back for recovery.")
+            await self._fail(checkpoint, songs, "submitted")
+            return False
+        status = sing_results.get("status")
+        if status == "unknown":
+            # The singer restarted and lost the job; resubmit, re-polling any Suno ids it reported
+            logging.warning(f"Sing job {job_id} is unknown to the singer, resubmitting generation {checkpoint.generation_uuid}.")
+            await self._fail(checkpoint, songs, "lyrics_written")
+            return False
+        if status != "complete":
+            # The Suno ids themselves may be what failed, so the lyrics are sung afresh
+            logging.error(f"Sing job {job_id} failed: {status} {sing_results.get('error')}")
+            await checkpoint.record_suno_ids([])
+            await self._fail(checkpoint, songs, "lyrics_written")
+            return False
+        logging.info(f"Media URLs received from sing job {job_id}.")
+        await checkpoint.record_media(sing_results)
+        return True
+
+    async def _store_media(self, checkpoint, songs):
+        media = checkpoint.media
+        for idx, song in enumerate(songs, start=1):
+            image_url = media.get(f'image_url_{idx}')
+            image_large_url = media.get(f'image_large_url_{idx}')
+            video_url = media.get(f'video_url_{idx}')
+            audio_url = media.get(f'audio_url_{idx}')
+
+            if not all([image_url, image_large_url, video_url, audio_url]):
+                logging.error(f"Missing media URLs for song {idx} of generation {checkpoint.generation_uuid}.")
+                await song.update_status("error")
+                continue
+
+            await song.update_media_urls(
+                image_url=image_url,
+                image_large_url=image_large_url,
+                video_url=video_url,
+                audio_url=audio_url
+            )
+            await song.update_status("complete")
+            logging.info(f"Song ID {song.id} complete with media from generation {checkpoint.generation_uuid}.")
+        await checkpoint.record_complete()
+
+    async def _fail(self, checkpoint, songs, stage):
+        """
+        Rewinds the checkpoint to stage for the recovery worker, or marks the songs
+        as errored once the generation has used up its attempts.
+        """
+        await checkpoint.record_failure(stage, self.max_attempts)
+        if checkpoint.stage == "failed":
+            status = "error" if checkpoint.lyrics is None else "error singing"
+            for song in songs:
+                await song.update_status(status)
+            logging.error(f"Giving up on generation {checkpoint.generation_uuid} after {checkpoint.attempts} attempts.")
+
+    def start_recovery(self):
+        if self._recovery_task is None or self._recovery_task.done():
+            self._recovery_task = asyncio.create_task(self._recover())
+
+    async def _recover(self):
+        try:
+            await GenerationCheckpoint.backfill_orphans(self.lease, RECOVERY_BACKFILL_WINDOW)
+        except Exception:
+            logging.exception("Adopting unfinished songs for recovery failed.")
+        while True:
+            try:
+                for checkpoint in await GenerationCheckpoint.claim_stale(self.lease, self.max_attempts):
+                    songs = await Song.get_by_generation(checkpoint.generation_uuid)
+                    if not songs:
+                        await checkpoint.record_failure("failed", self.max_attempts)
+                        continue
+                    logging.info(f"Resuming generation {checkpoint.generation_uuid} from stage {checkpoint.stage}.")
+                    asyncio.create_task(self.resume(checkpoint, songs))
+            except Exception:
+                logging.exception("Recovering stalled generations failed.")
+            await asyncio.sleep(self.recovery_interval)
+
+    async def close(self):
+        if self._recovery_task:
+            self._recovery_task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
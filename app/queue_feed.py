@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+import time
+
+QUEUE_FEED_INTERVAL = float(os.getenv("QUEUE_FEED_INTERVAL", "5"))  # Seconds between re-renders of each watched queue
+QUEUE_FEED_MIN_INTERVAL = float(os.getenv("QUEUE_FEED_MIN_INTERVAL", "1"))  # Change notifications within this window are coalesced
+QUEUE_FEED_KEEPALIVE = float(os.getenv("QUEUE_FEED_KEEPALIVE", "15"))  # Seconds between SSE keepalive comments
+QUEUE_FEED_IDLE_TTL = float(os.getenv("QUEUE_FEED_IDLE_TTL", "60"))  # Seconds an unwatched snapshot is kept for /queue requests
+
+class QueueChannel:
+    """
+    The rendered queue for one current-song cursor, shared by every client
+    whose player is on that song.
+    """
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.html = None
+        self.version = 0
+        self.rendered_at = 0.0
+        self.subscribers = 0
+        self.last_used = time.monotonic()
+        self._changed = asyncio.Event()
+
+    def publish(self, html):
+        """Stores a new rendering; subscribers only wake up if it differs from the last."""
+        self.rendered_at = time.monotonic()
+        if html == self.html:
+            return False
+        self.html = html
+        self.version += 1
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        return True
+
+    async def wait(self, seen, timeout):
+        """
+        Waits until there is a version newer than seen. Returns False on timeout.
+        """
+        if self.version > seen:
+            return True
+        changed = self._changed
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+class QueueFeed:
+    """
+    Pushes the "Next Up" queue to players instead of having each tab poll it.
+
+    Clients are grouped by the song they are playing. One background task
+    re-renders each watched cursor's queue every interval, or as soon as
+    notify() reports a change, and clients only receive a rendering when it
+    differs from the previous one. A thousand listeners on the same song cost
+    one query and one render per interval. A client that falls behind skips
+    straight to the latest rendering.
+
+    Args:
+        render (coroutine function): Called with a cursor (current song id); returns the queue HTML.
+    """
+    def __init__(self, render, interval=QUEUE_FEED_INTERVAL, min_interval=QUEUE_FEED_MIN_INTERVAL,
+                 keepalive=QUEUE_FEED_KEEPALIVE, idle_ttl=QUEUE_FEED_IDLE_TTL):
+        self.render = render
+        self.interval = interval
+        self.min_interval = min_interval
+        self.keepalive = keepalive
+        self.idle_ttl = idle_ttl
+        self.channels = {}
+        self._rendering = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def notify(self):
+        """Something that may be in a queue changed; re-render watched queues soon."""
+        self._wakeup.set()
+
+    def _channel(self, cursor):
+        channel = self.channels.get(cursor)
+        if channel is None:
+            channel = self.channels[cursor] = QueueChannel(cursor)
+        channel.last_used = time.monotonic()
+        return channel
+
+    async def refresh(self, channel):
+        """
+        Re-renders a channel. Concurrent callers for the same cursor share one render.
+        """
+        task = self._rendering.get(channel.cursor)
+        owner = task is None
+        if owner:
+            task = asyncio.create_task(self.render(channel.cursor))
+            self._rendering[channel.cursor] = task
+            task.add_done_callback(lambda _: self._rendering.pop(channel.cursor, None))
+        try:
+            html = await asyncio.shield(task)
+        except Exception:
+            if owner:
+                logging.exception(f"Rendering the queue after song {channel.cursor} failed.")
+            return
+        if owner:
+            channel.publish(html)
+
+    async def snapshot(self, cursor):
+        """
+        The current queue HTML for a cursor, re-rendered only if the shared copy
+        is older than the refresh interval.
+        """
+        channel = self._channel(cursor)
+        if channel.html is None or time.monotonic() - channel.rendered_at > self.interval:
+            await self.refresh(channel)
+        return channel.html or ""
+
+    async def stream(self, cursor):
+        """
+        Yields the queue HTML for a cursor whenever it changes, starting with the
+        current one, and None every keepalive seconds without a change.
+        """
+        channel = self._channel(cursor)
+        channel.subscribers += 1
+        self.start()
+        try:
+            if channel.html is None:
+                await self.refresh(channel)
+            seen = 0
+            while True:
+                if channel.version > seen:
+                    seen = channel.version
+                    yield channel.html
+                elif not await channel.wait(seen, self.keepalive):
+                    yield None
+        finally:
+            channel.subscribers -= 1
+            channel.last_used = time.monotonic()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+                # Let a burst of changes (a generation updates both of its songs) settle first
+                await asyncio.sleep(self.min_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            now = time.monotonic()
+            for cursor, channel in list(self.channels.items()):
+                if not channel.subscribers and now - channel.last_used > self.idle_ttl:
+                    del self.channels[cursor]
+            watched = [channel for channel in self.channels.values() if channel.subscribers]
+            await asyncio.gather(*(self.refresh(channel) for channel in watched))
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+import asyncpg
+
+SONG_EVENTS_CHANNEL = "song_events"
+SONG_EVENTS_QUEUE_SIZE = int(os.getenv("SONG_EVENTS_QUEUE_SIZE", "100"))  # Pending events per subscriber before the oldest are dropped
+SONG_EVENTS_RECONNECT_DELAY = float(os.getenv("SONG_EVENTS_RECONNECT_DELAY", "5"))  # Seconds before re-opening a lost LISTEN connection
+
+async def notify_song_event(conn, song, event):
+    """
+    Publishes a song change on SONG_EVENTS_CHANNEL. Sent on the connection that
+    made the change, so listeners only hear about it once it is committed.
+    """
+    payload = {
+        "event": event,
+        "id": song.id,
+        "name": song.name,
+        "status": song.status,
+        "station": song.station,
+        "generation_uuid": str(song.generation_uuid) if song.generation_uuid else None,
+    }
+    await conn.execute("SELECT pg_notify($1, $2)", SONG_EVENTS_CHANNEL, json.dumps(payload))
+
+class Subscription:
+    """
+    A bounded queue of song events for one client. A newer event for a song
+    replaces the one still waiting, and when the queue is full the oldest event
+    is dropped, so a slow client only ever gets behind by maxsize songs.
+    """
+    def __init__(self, maxsize=SONG_EVENTS_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._pending = OrderedDict()
+        self._ready = asyncio.Event()
+
+    def put(self, event):
+        key = event.get("id")
+        if key in self._pending:
+            del self._pending[key]
+            self.dropped += 1
+        self._pending[key] = event
+        while len(self._pending) > self.maxsize:
+            self._pending.popitem(last=False)
+            self.dropped += 1
+        self._ready.set()
+
+    async def get(self, timeout=None):
+        """
+        Returns the oldest pending event, or None if none arrives within timeout.
+        """
+        if not self._pending:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._pending.popitem(last=False)[1]
+
+class SongEventHub:
+    """
+    Holds one LISTEN connection per app worker and fans song events out to
+    every subscriber in memory, so the database sees the same load whether one
+    client or ten thousand are streaming.
+
+    If the connection drops, it is re-opened after SONG_EVENTS_RECONNECT_DELAY.
+    Callbacks are then invoked with a "resync" event, because changes made
+    while disconnected were missed.
+    """
+    def __init__(self, reconnect_delay=SONG_EVENTS_RECONNECT_DELAY):
+        self.reconnect_delay = reconnect_delay
+        self.subscribers = set()
+        self.callbacks = []
+        self._task = None
+        self._conn = None
+
+    def start(self, db_url):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(db_url))
+
+    def add_callback(self, callback):
+        """Registers callback(event), called for every event before it reaches subscribers."""
+        self.callbacks.append(callback)
+
+    def subscribe(self, maxsize=SONG_EVENTS_QUEUE_SIZE):
+        subscription = Subscription(maxsize)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+
+    def publish(self, event):
+        for callback in self.callbacks:
+            try:
+                callback(event)
+            except Exception:
+                logging.exception("Song event callback failed.")
+        for subscription in self.subscribers:
+            subscription.put(event)
+
+    def _on_notification(self, conn, pid, channel, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logging.warning(f"Ignoring malformed song event: {payload[:200]}")
+            return
+        self.publish(event)
+
+    async def _run(self, db_url):
+        connected_before = False
+        while True:
+            try:
+                self._conn = await asyncpg.connect(db_url)
+                await self._conn.add_listener(SONG_EVENTS_CHANNEL, self._on_notification)
+                logging.info(f"Listening for song events on '{SONG_EVENTS_CHANNEL}'.")
+                if connected_before:
+                    self.publish({"event": "resync", "id": None})
+                connected_before = True
+                # A cheap query notices a dead connection that asyncpg has not yet seen close
+                while True:
+                    await asyncio.sleep(self.reconnect_delay)
+                    await asyncio.wait_for(self._conn.execute("SELECT 1"), self.reconnect_delay)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Song event connection lost, reconnecting in {self.reconnect_delay}s: {e}")
+            if self._conn is not None and not self._conn.is_closed():
+                self._conn.terminate()
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
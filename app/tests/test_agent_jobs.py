@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import asyncio
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from agent_jobs import SingJobWatcher, SingJobTimeout
+
+class Singer:
+    """Stands in for the singer's /jobs/batch_status; jobs finish after a set number of polls."""
+    def __init__(self, polls_until_done=2, song_ids=("a", "b"), down=False):
+        self.polls_until_done = polls_until_done
+        self.song_ids = list(song_ids)
+        self.down = down
+        self.polls = 0
+        self.batches = []
+
+    def handler(self, request):
+        if self.down:
+            raise httpx.ConnectError("singer unreachable", request=request)
+        self.polls += 1
+        job_ids = json.loads(request.content)["job_ids"]
+        self.batches.append(job_ids)
+        done = self.polls >= self.polls_until_done
+        return httpx.Response(200, json={"jobs": [
+            {"job_id": job_id, "status": "complete" if done else "running", "song_ids": self.song_ids}
+            for job_id in job_ids
+        ]})
+
+def watcher_for(singer, **kwargs):
+    watcher = SingJobWatcher("http://singer", interval=0.01, **kwargs)
+    watcher._client = httpx.AsyncClient(transport=httpx.MockTransport(singer.handler))
+    return watcher
+
+def test_waits_share_batched_polls_and_report_song_ids():
+    singer = Singer(polls_until_done=3)
+    reported = []
+
+    async def on_song_ids(song_ids):
+        reported.append(song_ids)
+
+    async def scenario():
+        watcher = watcher_for(singer, batch_size=10)
+        results = await asyncio.gather(
+            watcher.wait("job-1", on_song_ids=on_song_ids),
+            watcher.wait("job-2"),
+        )
+        await watcher.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert [result["status"] for result in results] == ["complete", "complete"]
+    assert all(sorted(batch) == ["job-1", "job-2"] for batch in singer.batches)
+    assert reported == [["a", "b"]]
+
+def test_wait_gives_up_after_max_wait():
+    singer = Singer(polls_until_done=10 ** 6)
+
+    async def scenario():
+        watcher = watcher_for(singer, max_wait=0.05)
+        try:
+            with pytest.raises(SingJobTimeout):
+                await watcher.wait("job-1")
+            assert not watcher._waiters
+        finally:
+            await watcher.close()
+
+    asyncio.run(scenario())
+
+def test_waits_give_up_when_singer_stops_answering():
+    singer = Singer(down=True)
+
+    async def scenario():
+        watcher = watcher_for(singer, max_failed_polls=3)
+        try:
+            results = await asyncio.gather(watcher.wait("job-1"), watcher.wait("job-2"), return_exceptions=True)
+        finally:
+            await watcher.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, SingJobTimeout) for result in results)
@@ -0,0 +1,80 @@
+import os
+import sys
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "common")))
+
+import favorite_counts
+from favorite_counts import FavoriteCountCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+class FavoriteCounts:
+    """Stands in for Song.get_favorite_counts over a dict of stored counts."""
+    def __init__(self, counts):
+        self.counts = counts
+        self.calls = []
+
+    async def get_favorite_counts(self, song_ids):
+        self.calls.append(list(song_ids))
+        return {song_id: self.counts[song_id] for song_id in song_ids if song_id in self.counts}
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    # Replaces the module's time rather than time.monotonic, which the event loop also uses
+    monkeypatch.setattr(favorite_counts, "time", fake)
+    return fake
+
+@pytest.fixture
+def stored(monkeypatch):
+    fake = FavoriteCounts({1: 10, 2: 20, 3: 30})
+    monkeypatch.setattr(favorite_counts.Song, "get_favorite_counts", fake.get_favorite_counts)
+    return fake
+
+def test_cached_counts_are_served_until_ttl(clock, stored):
+    cache = FavoriteCountCache(ttl=5)
+    assert asyncio.run(cache.get_many([1, 2])) == {1: 10, 2: 20}
+    stored.counts[1] = 11
+
+    clock.now += 4
+    assert asyncio.run(cache.get_many([1, 2])) == {1: 10, 2: 20}
+    clock.now += 2
+    assert asyncio.run(cache.get_many([1])) == {1: 11}
+
+    assert stored.calls == [[1, 2], [1]]
+    assert cache.stats() == {"size": 2, "hits": 2, "misses": 3}
+
+def test_stale_and_missing_ids_are_read_in_one_batch(clock, stored):
+    cache = FavoriteCountCache(ttl=5)
+    asyncio.run(cache.get_many([1]))
+    clock.now += 3
+    asyncio.run(cache.get_many([2]))
+    clock.now += 3
+    # 1 expired, 2 still fresh, 3 and 4 never seen; 4 does not exist
+    assert asyncio.run(cache.get_many([1, 2, 3, 4])) == {1: 10, 2: 20, 3: 30}
+    assert stored.calls[-1] == [1, 3, 4]
+
+def test_least_recently_used_counts_are_evicted(clock, stored):
+    cache = FavoriteCountCache(ttl=5, max_size=2)
+    asyncio.run(cache.get_many([1, 2]))
+    # Reading 1 makes 2 the least recently used
+    asyncio.run(cache.get_many([1]))
+    asyncio.run(cache.get_many([3]))
+
+    assert set(cache._counts) == {1, 3}
+    asyncio.run(cache.get_many([2]))
+    assert stored.calls[-1] == [2]
+
+def test_set_updates_a_count_without_reading(clock, stored):
+    cache = FavoriteCountCache(ttl=5)
+    cache.set(1, 99)
+    assert asyncio.run(cache.get_many([1])) == {1: 99}
+    assert stored.calls == []
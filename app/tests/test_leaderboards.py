@@ -0,0 +1,39 @@
+import os
+import sys
+import math
+from datetime import timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "common")))
+
+from models import TRENDING_EPOCH, TRENDING_HALF_LIFE, trending_weight, log_add_exp, log_sub_exp
+
+NOW = TRENDING_EPOCH + timedelta(days=700)
+
+def test_weight_doubles_every_half_life():
+    later = NOW + timedelta(hours=TRENDING_HALF_LIFE)
+    assert math.isclose(trending_weight(later) - trending_weight(NOW), math.log(2))
+    assert trending_weight(TRENDING_EPOCH) == 0
+
+def test_adding_then_removing_a_favorite_returns_to_zero():
+    # A new board entry starts at the favorite's weight, as the INSERT does
+    weight = trending_weight(NOW)
+    assert log_sub_exp(weight, weight) == 0
+
+def test_removing_one_of_several_favorites_leaves_the_others():
+    first, second = trending_weight(NOW - timedelta(hours=30)), trending_weight(NOW)
+    score = log_add_exp(first, second)
+    assert math.isclose(log_sub_exp(score, second), first, rel_tol=1e-9)
+    assert math.isclose(log_sub_exp(score, first), second, rel_tol=1e-9)
+    assert log_sub_exp(log_sub_exp(score, first), second) == 0
+
+def test_log_add_exp_does_not_overflow():
+    # exp() of weights this far from the epoch overflows a float
+    weight = trending_weight(TRENDING_EPOCH + timedelta(days=365 * 50))
+    assert weight > 1000
+    assert math.isclose(log_add_exp(weight, weight), weight + math.log(2))
+
+def test_newer_favorites_outweigh_older_ones():
+    old = log_add_exp(trending_weight(NOW - timedelta(days=3)), trending_weight(NOW - timedelta(days=3)))
+    new = trending_weight(NOW)
+    assert new > old
@@ -0,0 +1,112 @@
+import os
+import sys
+import asyncio
+import asyncpg
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "common")))
+
+import listen_counter
+from listen_counter import ListenCounter
+from models import SONG_ID_MAX
+
+class Listens:
+    """Stands in for Song.add_listens, failing for poisoned ids or while down."""
+    def __init__(self, poisoned=(), delay=0):
+        self.poisoned = set(poisoned)
+        self.delay = delay
+        self.down = False
+        self.calls = []
+        self.written = {}
+
+    async def add_listens(self, counts):
+        self.calls.append(dict(counts))
+        await asyncio.sleep(self.delay)
+        if self.down:
+            raise ConnectionError("database unavailable")
+        if self.poisoned & set(counts):
+            raise asyncpg.DataError("value out of range")
+        for song_id, count in counts.items():
+            self.written[song_id] = self.written.get(song_id, 0) + count
+
+@pytest.fixture
+def listens(monkeypatch):
+    fake = Listens()
+    monkeypatch.setattr(listen_counter.Song, "add_listens", fake.add_listens)
+    return fake
+
+def test_flush_writes_tallies_in_one_call(listens):
+    counter = ListenCounter()
+    for song_id in (1, 2, 1, 1):
+        counter.record(song_id)
+    asyncio.run(counter.flush())
+
+    assert listens.calls == [{1: 3, 2: 1}]
+    assert counter.flushed == 4 and counter.pending == {}
+
+def test_failed_flush_is_retried(listens):
+    counter = ListenCounter()
+    counter.record(1)
+    listens.down = True
+    asyncio.run(counter.flush())
+    assert counter.pending == {1: 1}
+
+    listens.down = False
+    asyncio.run(counter.flush())
+    assert listens.written == {1: 1}
+    assert counter.pending == {}
+
+def test_out_of_range_ids_are_dropped_before_writing(listens):
+    counter = ListenCounter()
+    counter.record(1)
+    counter.record(SONG_ID_MAX + 1)
+    asyncio.run(counter.flush())
+
+    assert listens.calls == [{1: 1}]
+    assert counter.dropped == 1 and counter.pending == {}
+
+def test_rejected_songs_are_isolated_and_dropped(listens):
+    listens.poisoned = {3}
+    counter = ListenCounter()
+    for song_id in range(1, 9):
+        counter.record(song_id)
+    asyncio.run(counter.flush())
+
+    # Every other song is written; the rejected one is not retried
+    assert listens.written == {song_id: 1 for song_id in range(1, 9) if song_id != 3}
+    assert counter.dropped == 1 and counter.flushed == 7
+    assert counter.pending == {}
+
+def test_outage_while_isolating_requeues_only_unwritten_songs(listens, monkeypatch):
+    listens.poisoned = {1}
+    counter = ListenCounter()
+    for song_id in range(1, 5):
+        counter.record(song_id)
+
+    async def fail_second_half(counts):
+        if 4 in counts and len(counts) < 4:
+            raise ConnectionError("database unavailable")
+        await Listens.add_listens(listens, counts)
+
+    monkeypatch.setattr(listen_counter.Song, "add_listens", fail_second_half)
+    asyncio.run(counter.flush())
+
+    assert listens.written == {2: 1}
+    assert counter.pending == {3: 1, 4: 1}
+
+def test_close_requeues_cancelled_flush_and_writes_it(listens):
+    listens.delay = 0.1
+    counter = ListenCounter(flush_interval=0)
+
+    async def scenario():
+        counter.record(1)
+        counter.start()
+        # Cancelled in the middle of its write
+        await asyncio.sleep(0.05)
+        listens.delay = 0
+        await counter.close()
+
+    asyncio.run(scenario())
+    assert listens.written == {1: 1}
+    assert counter.pending == {}
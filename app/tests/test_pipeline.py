@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "common")))
+
+import pipeline
+from models import GenerationCheckpoint
+
+GENERATION = "6f1c2d2e-8a4b-4a51-9d3c-1f2e3d4c5b6a"
+LYRICS = {"title": "Fake Song", "lyrics": "[Verse]\nla la", "style": "pop", "negative_style": "metal"}
+MEDIA = {f"{kind}_{idx}": f"https://cdn/{kind}_{idx}" for kind in ("image_url", "image_large_url", "video_url", "audio_url")
+         for idx in (1, 2)}
+
+class FakeCheckpoint(GenerationCheckpoint):
+    """
+    GenerationCheckpoint over an in-memory song_generations table, so the real
+    record_* stage logic runs without Postgres. Claimed checkpoints are fresh
+    copies of the stored row, as they would be from the database.
+    """
+    rows = {}
+
+    @classmethod
+    async def create(cls, generation_uuid, lease_seconds):
+        row = cls.rows.setdefault(generation_uuid, {"generation_uuid": generation_uuid, "stage": "created", "attempts": 0})
+        row["lease_until"] = time.monotonic() + lease_seconds
+        return cls(**row)
+
+    @classmethod
+    async def claim_stale(cls, lease_seconds, max_attempts, limit=10):
+        now = time.monotonic()
+        claimed = []
+        for row in cls.rows.values():
+            if row["stage"] in ("complete", "failed") or row["attempts"] >= max_attempts:
+                continue
+            if row.get("lease_until") is not None and row["lease_until"] >= now:
+                continue
+            row["lease_until"] = now + lease_seconds
+            claimed.append(cls(**row))
+        return claimed[:limit]
+
+    @classmethod
+    async def backfill_orphans(cls, stale_seconds, window_seconds):
+        pass
+
+    async def _save(self, lease_seconds=None, **fields):
+        row = self.rows[self.generation_uuid]
+        row.update(fields)
+        if lease_seconds is not None:
+            row["lease_until"] = time.monotonic() + lease_seconds
+            row["renewals"] = row.get("renewals", 0) + 1
+
+class FakeSong:
+    def __init__(self, song_id):
+        self.id = song_id
+        self.generation_uuid = GENERATION
+        self.station = "workout"
+        self.model_name = "grok-3"
+        self.model_nickname = "Grok"
+        self.name = None
+        self.details = None
+        self.media = None
+        self.statuses = []
+
+    @property
+    def status(self):
+        return self.statuses[-1] if self.statuses else "generating"
+
+    async def update_status(self, status):
+        self.statuses.append(status)
+
+    async def update_details(self, details):
+        self.details = details
+
+    async def update_name(self, name):
+        self.name = name
+
+    async def update_model_name(self, model_name):
+        self.model_name = model_name
+
+    async def update_media_urls(self, **media):
+        self.media = media
+
+class Lyricist:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+
+    def handler(self, request):
+        self.calls += 1
+        self.body = json.loads(request.content)
+        if self.fail:
+            return httpx.Response(500, json={"error": "down"})
+        return httpx.Response(200, json=LYRICS)
+
+class SingJobs:
+    """Stands in for SingJobWatcher; each wait returns the next scripted result."""
+    def __init__(self, results=None, suno_ids=("s1", "s2"), delay=0):
+        self.results = list(results or [dict(MEDIA, status="complete")])
+        self.suno_ids = list(suno_ids)
+        self.delay = delay
+        self.submitted = []
+        self.waited = []
+
+    async def submit(self, song_data):
+        self.submitted.append(song_data)
+        return f"job-{len(self.submitted)}"
+
+    async def wait(self, job_id, on_song_ids=None):
+        self.waited.append(job_id)
+        if on_song_ids and self.suno_ids:
+            await on_song_ids(self.suno_ids)
+        await asyncio.sleep(self.delay)
+        return self.results.pop(0) if len(self.results) > 1 else self.results[0]
+
+@pytest.fixture(autouse=True)
+def fake_store(monkeypatch):
+    FakeCheckpoint.rows = {}
+    monkeypatch.setattr(pipeline, "GenerationCheckpoint", FakeCheckpoint)
+    return FakeCheckpoint.rows
+
+def make_pipeline(lyricist, sing_jobs, **kwargs):
+    generation = pipeline.GenerationPipeline("http://lyricist", sing_jobs, **kwargs)
+    generation._client = httpx.AsyncClient(transport=httpx.MockTransport(lyricist.handler))
+    return generation
+
+def stored(**row):
+    FakeCheckpoint.rows[GENERATION] = dict({"generation_uuid": GENERATION, "attempts": 0, "lease_until": None}, **row)
+    return FakeCheckpoint(**FakeCheckpoint.rows[GENERATION])
+
+def run(coro_factory):
+    return asyncio.run(coro_factory())
+
+def test_new_generation_runs_every_stage(fake_store):
+    lyricist, sing_jobs = Lyricist(), SingJobs()
+    songs = [FakeSong(1), FakeSong(2)]
+    run(lambda: make_pipeline(lyricist, sing_jobs).run(songs))
+
+    assert fake_store[GENERATION]["stage"] == "complete"
+    assert lyricist.calls == 1
+    assert sing_jobs.submitted[0]["title"] == "Fake Song"
+    # The agent sets it on its spans; attributes do not travel with the traceparent
+    assert lyricist.body["generation_uuid"] == sing_jobs.submitted[0]["generation_uuid"] == GENERATION
+    assert fake_store[GENERATION]["suno_ids"] == ["s1", "s2"]
+    assert [song.status for song in songs] == ["complete", "complete"]
+    assert songs[1].media["audio_url"] == "https://cdn/audio_url_2"
+
+def test_resume_from_lyrics_written_skips_the_lyricist(fake_store):
+    lyricist, sing_jobs = Lyricist(fail=True), SingJobs()
+    checkpoint = stored(stage="lyrics_written", lyrics=json.dumps(LYRICS), suno_ids=["s1"])
+    run(lambda: make_pipeline(lyricist, sing_jobs).resume(checkpoint, [FakeSong(1), FakeSong(2)]))
+
+    assert lyricist.calls == 0
+    # Suno ids already reported are passed along so the singer re-polls them
+    assert sing_jobs.submitted[0]["song_ids"] == ["s1"]
+    assert fake_store[GENERATION]["stage"] == "complete"
+
+def test_resume_from_submitted_waits_on_the_stored_job(fake_store):
+    lyricist, sing_jobs = Lyricist(fail=True), SingJobs()
+    checkpoint = stored(stage="submitted", lyrics=json.dumps(LYRICS), sing_job_id="job-old")
+    run(lambda: make_pipeline(lyricist, sing_jobs).resume(checkpoint, [FakeSong(1), FakeSong(2)]))
+
+    assert sing_jobs.submitted == []
+    assert sing_jobs.waited == ["job-old"]
+    assert fake_store[GENERATION]["stage"] == "complete"
+
+def test_resume_from_media_received_only_stores_media(fake_store):
+    lyricist, sing_jobs = Lyricist(fail=True), SingJobs()
+    checkpoint = stored(stage="media_received", lyrics=json.dumps(LYRICS), media=json.dumps(MEDIA))
+    songs = [FakeSong(1), FakeSong(2)]
+    run(lambda: make_pipeline(lyricist, sing_jobs).resume(checkpoint, songs))
+
+    assert lyricist.calls == 0 and sing_jobs.submitted == [] and sing_jobs.waited == []
+    assert [song.status for song in songs] == ["complete", "complete"]
+    assert fake_store[GENERATION]["stage"] == "complete"
+
+def test_lease_is_renewed_while_running_and_claimable_once_expired(fake_store):
+    lyricist, sing_jobs = Lyricist(), SingJobs(delay=0.2)
+    generation = make_pipeline(lyricist, sing_jobs, lease=0.06)
+
+    async def scenario():
+        task = asyncio.create_task(generation.run([FakeSong(1), FakeSong(2)]))
+        await asyncio.sleep(0.1)
+        # Held and renewed while the generation runs
+        assert await FakeCheckpoint.claim_stale(0.06, 5) == []
+        assert fake_store[GENERATION]["renewals"] >= 1
+        # A worker that dies stops renewing; once the lease runs out the generation is claimable
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0.1)
+        return await FakeCheckpoint.claim_stale(0.06, 5)
+
+    claimed = run(scenario)
+    assert [checkpoint.stage for checkpoint in claimed] == ["submitted"]
+
+def test_unknown_job_is_resubmitted_with_known_suno_ids(fake_store):
+    lyricist = Lyricist()
+    sing_jobs = SingJobs(results=[{"status": "unknown"}, dict(MEDIA, status="complete")])
+    generation = make_pipeline(lyricist, sing_jobs)
+    songs = [FakeSong(1), FakeSong(2)]
+
+    async def scenario():
+        await generation.run(songs)
+        # Handed back to the recovery worker at the singer stage, lease released
+        assert fake_store[GENERATION]["stage"] == "lyrics_written"
+        assert fake_store[GENERATION]["attempts"] == 1
+        [checkpoint] = await FakeCheckpoint.claim_stale(generation.lease, generation.max_attempts)
+        await generation.resume(checkpoint, songs)
+
+    run(scenario)
+    assert lyricist.calls == 1
+    assert len(sing_jobs.submitted) == 2
+    assert sing_jobs.submitted[1]["song_ids"] == ["s1", "s2"]
+    assert fake_store[GENERATION]["stage"] == "complete"
+
+def test_generation_fails_after_max_attempts(fake_store):
+    lyricist, sing_jobs = Lyricist(fail=True), SingJobs()
+    generation = make_pipeline(lyricist, sing_jobs, max_attempts=2)
+    songs = [FakeSong(1), FakeSong(2)]
+
+    async def scenario():
+        await generation.run(songs)
+        assert fake_store[GENERATION]["stage"] == "created"
+        [checkpoint] = await FakeCheckpoint.claim_stale(generation.lease, generation.max_attempts)
+        await generation.resume(checkpoint, songs)
+        return await FakeCheckpoint.claim_stale(generation.lease, generation.max_attempts)
+
+    assert run(scenario) == []
+    assert fake_store[GENERATION]["stage"] == "failed"
+    assert fake_store[GENERATION]["attempts"] == 2
+    assert [song.status for song in songs] == ["error", "error"]
+
+def test_failed_checkpoint_creation_marks_songs_failed(monkeypatch):
+    async def create(generation_uuid, lease_seconds):
+        raise ConnectionError("database unavailable")
+
+    monkeypatch.setattr(FakeCheckpoint, "create", create)
+    changes = []
+    generation = make_pipeline(Lyricist(), SingJobs(), on_change=lambda: changes.append(1))
+    songs = [FakeSong(1), FakeSong(2)]
+    run(lambda: generation.run(songs))
+
+    assert [song.status for song in songs] == ["error", "error"]
+    assert changes
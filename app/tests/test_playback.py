@@ -0,0 +1,138 @@
+import os
+import sys
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "common")))
+
+import models
+from models import Song
+
+NEWEST = datetime(2025, 3, 1, 12, 0, 0, 250000)
+
+def catalog(count):
+    """Complete songs a minute apart, newest first, alternating stations; two share each timestamp."""
+    return [Song(id=count - n, name=f"Song {count - n}", status="complete", created_at=NEWEST - timedelta(minutes=n // 2),
+                 station="workout" if n % 2 else "focus", details={}) for n in range(count)]
+
+class Catalog:
+    """Stands in for Song.complete_page over an in-memory list, with the same ordering."""
+    def __init__(self, songs):
+        self.songs = songs
+        self.calls = []
+
+    async def complete_page(self, before=None, after=None, station=None, limit=10):
+        self.calls.append({"before": before, "after": after, "station": station, "limit": limit})
+        songs = sorted((song for song in self.songs if not station or song.station == station),
+                       key=lambda song: (song.created_at, song.id), reverse=True)
+        if before:
+            position = Song.parse_cursor(before)
+            songs = [song for song in songs if (song.created_at, song.id) < position]
+        elif after:
+            position = Song.parse_cursor(after)
+            songs = [song for song in reversed(songs) if (song.created_at, song.id) > position]
+        return songs[:limit]
+
+class RecordingPool:
+    """Stands in for models.pool, recording the query complete_page sends."""
+    def __init__(self):
+        self.queries = []
+
+    def acquire(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def fetch(self, query, *params):
+        self.queries.append((" ".join(query.split()), params))
+        return []
+
+@pytest.fixture
+def songs(monkeypatch):
+    fake = Catalog(catalog(30))
+    monkeypatch.setattr(Song, "complete_page", fake.complete_page)
+    return fake
+
+def test_cursor_round_trips():
+    song = catalog(1)[0]
+    assert Song.parse_cursor(song.cursor) == (song.created_at, song.id)
+
+@pytest.mark.parametrize("cursor", ["", "12", "yesterday,12", "2025-03-01T12:00:00,abc", "2025-03-01T12:00:00"])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        Song.parse_cursor(cursor)
+
+@pytest.mark.parametrize("direction, comparison, order", [("before", "<", "DESC"), ("after", ">", "ASC")])
+def test_cursor_direction_picks_comparison_and_order(monkeypatch, direction, comparison, order):
+    pool = RecordingPool()
+    monkeypatch.setattr(models, "pool", pool)
+    cursor = catalog(1)[0].cursor
+    asyncio.run(Song.complete_page(station="focus", limit=5, **{direction: cursor}))
+
+    [(query, params)] = pool.queries
+    assert f"(created_at, id) {comparison} ($2, $3)" in query
+    assert f"ORDER BY created_at {order}, id {order}" in query
+    assert params == ("focus", NEWEST, 1, 5)
+
+def test_first_page_is_newest_first(monkeypatch):
+    pool = RecordingPool()
+    monkeypatch.setattr(models, "pool", pool)
+    asyncio.run(Song.complete_page(limit=3))
+    [(query, params)] = pool.queries
+    assert "(created_at, id)" not in query and "ORDER BY created_at DESC, id DESC" in query
+    assert params == (3,)
+
+def test_playback_starts_behind_the_newest(songs):
+    start = asyncio.run(Song.playback_start(behind=10))
+    assert start.id == 20
+    assert songs.calls == [{"before": None, "after": None, "station": None, "limit": 11}]
+
+def test_playback_starts_on_the_newest_of_a_small_catalog(songs):
+    songs.songs = catalog(4)
+    assert asyncio.run(Song.playback_start(behind=10)).id == 4
+
+def test_playback_start_without_songs_is_a_placeholder(songs):
+    songs.songs = []
+    start = asyncio.run(Song.playback_start(station="focus"))
+    assert start.id is None and start.name == "No Completed Song"
+
+@pytest.fixture
+def app_client(songs):
+    main = pytest.importorskip("main")
+    return main.app.test_client()
+
+def get_json(client, path):
+    async def scenario():
+        response = await client.get(path)
+        return response.status_code, await response.get_json()
+    return asyncio.run(scenario())
+
+def test_songs_json_pages_through_the_catalog(app_client, songs):
+    seen, cursor = [], None
+    while True:
+        status, page = get_json(app_client, "/songs.json?limit=7" + (f"&before={cursor}" if cursor else ""))
+        assert status == 200
+        seen += [song["id"] for song in page["songs"]]
+        cursor = page["next"]
+        if cursor is None:
+            break
+    assert seen == list(range(30, 0, -1))
+
+def test_songs_json_after_cursor_returns_newer_songs(app_client, songs):
+    middle = [song for song in songs.songs if song.id == 10][0]
+    status, page = get_json(app_client, f"/songs.json?limit=3&station=focus&after={middle.cursor}")
+    assert status == 200
+    assert [song["id"] for song in page["songs"]] == [12, 14, 16]
+    assert page["next"] == page["songs"][-1]["cursor"]
+
+def test_songs_json_rejects_malformed_cursor(app_client):
+    status, body = get_json(app_client, "/songs.json?before=not-a-cursor")
+    assert status == 400 and body == {"error": "Invalid cursor or limit"}
+    status, _ = get_json(app_client, "/songs.json?limit=many")
+    assert status == 400
@@ -0,0 +1,82 @@
+import os
+import sys
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from queue_feed import QueueFeed, QueueChannel
+
+class Renderer:
+    """Renders queue HTML from a settable value, counting calls."""
+    def __init__(self, html="<ul>a</ul>", delay=0):
+        self.html = html
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self, cursor):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return f"{cursor}:{self.html}"
+
+def test_concurrent_refreshes_share_one_render():
+    async def scenario():
+        render = Renderer(delay=0.05)
+        feed = QueueFeed(render)
+        snapshots = await asyncio.gather(*(feed.snapshot(7) for _ in range(20)))
+        return render, feed, snapshots
+
+    render, feed, snapshots = asyncio.run(scenario())
+    assert render.calls == 1
+    assert set(snapshots) == {"7:<ul>a</ul>"}
+    assert feed.channels[7].version == 1
+
+def test_unchanged_rendering_is_not_published():
+    async def scenario():
+        channel = QueueChannel(7)
+        assert channel.publish("<ul>a</ul>")
+        assert not channel.publish("<ul>a</ul>")
+        # Nobody is woken for a rendering that did not change
+        woke = await channel.wait(channel.version, 0.05)
+        return channel, woke
+
+    channel, woke = asyncio.run(scenario())
+    assert channel.version == 1
+    assert not woke
+
+def test_slow_subscriber_skips_to_latest_version():
+    async def scenario():
+        render = Renderer()
+        feed = QueueFeed(render, interval=60, keepalive=1)
+        stream = feed.stream(7)
+        first = await stream.__anext__()
+        # Several renderings are published while the subscriber is busy elsewhere
+        channel = feed.channels[7]
+        for html in ("b", "c", "d"):
+            channel.publish(html)
+        latest = await stream.__anext__()
+        await stream.aclose()
+        await feed.close()
+        return first, latest, channel
+
+    first, latest, channel = asyncio.run(scenario())
+    assert first == "7:<ul>a</ul>"
+    assert latest == "d"
+    assert channel.subscribers == 0
+
+def test_idle_channels_are_evicted():
+    async def scenario():
+        render = Renderer()
+        feed = QueueFeed(render, interval=60, min_interval=0, keepalive=1, idle_ttl=0.05)
+        await feed.snapshot(1)
+        stream = feed.stream(2)
+        await stream.__anext__()
+        await asyncio.sleep(0.1)
+        feed.notify()
+        await asyncio.sleep(0.05)
+        channels = set(feed.channels)
+        await stream.aclose()
+        await feed.close()
+        return channels
+
+    # The unwatched cursor is dropped once idle; the watched one stays
+    assert asyncio.run(scenario()) == {2}
@@ -0,0 +1,74 @@
+import os
+import sys
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from song_events import Subscription, SongEventHub
+
+def event(song_id, status="generating"):
+    return {"event": "updated", "id": song_id, "status": status}
+
+def drain(subscription):
+    async def scenario():
+        events = []
+        while (pending := await subscription.get(timeout=0.01)) is not None:
+            events.append(pending)
+        return events
+    return asyncio.run(scenario())
+
+def test_newer_event_replaces_pending_one_for_same_song():
+    subscription = Subscription(maxsize=10)
+    subscription.put(event(1, "generating"))
+    subscription.put(event(2, "generating"))
+    subscription.put(event(1, "complete"))
+
+    # Only the latest state of song 1 is delivered, queued behind song 2
+    assert drain(subscription) == [event(2, "generating"), event(1, "complete")]
+    assert subscription.dropped == 1
+
+def test_full_queue_drops_oldest_events():
+    subscription = Subscription(maxsize=3)
+    for song_id in range(5):
+        subscription.put(event(song_id))
+
+    assert [pending["id"] for pending in drain(subscription)] == [2, 3, 4]
+    assert subscription.dropped == 2
+
+def test_get_returns_none_on_timeout():
+    subscription = Subscription()
+    assert asyncio.run(subscription.get(timeout=0.01)) is None
+
+def test_get_wakes_on_put():
+    subscription = Subscription()
+
+    async def scenario():
+        waiter = asyncio.create_task(subscription.get(timeout=1))
+        await asyncio.sleep(0.01)
+        subscription.put(event(1))
+        return await waiter
+
+    assert asyncio.run(scenario()) == event(1)
+
+def test_failing_callback_does_not_block_subscribers():
+    hub = SongEventHub()
+    seen = []
+
+    def broken(published):
+        raise RuntimeError("callback failed")
+
+    hub.add_callback(broken)
+    hub.add_callback(seen.append)
+    first, second = hub.subscribe(), hub.subscribe()
+    hub.publish(event(1))
+
+    assert seen == [event(1)]
+    assert drain(first) == [event(1)]
+    assert drain(second) == [event(1)]
+
+def test_unsubscribed_clients_get_nothing():
+    hub = SongEventHub()
+    subscription = hub.subscribe()
+    hub.unsubscribe(subscription)
+    hub.publish(event(1))
+    assert drain(subscription) == []
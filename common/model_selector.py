@@ -0,0 +1,83 @@
+import os
+import random
+
+MODEL_EXPLORATION_FLOOR = float(os.getenv("MODEL_EXPLORATION_FLOOR", "0.2"))  # Share of picks spread uniformly across all models
+MODEL_MIN_SAMPLES = int(os.getenv("MODEL_MIN_SAMPLES", "5"))  # Calls needed before a model's stats affect its weight
+
+MODEL_NICKNAMES = {
+    "o3-mini": "Ozone 3",
+    "chatgpt-4o-latest": "GPT-4O Maestro",
+    "deepseek-reasoner": "Deep Seeker",
+    "grok-3": "Grok Rhymes",
+    "r1-1776": "Perplexity Renegade",
+    #"claude-3-5-sonnet-20241022": "Sonnet 3.5",
+    'claude-3-7-sonnet-20250219': "Sonnet 3.7",
+    "gemini-2.0-pro-exp-02-05": "G-Mini Pro",
+    "gemini-2.0-flash-thinking-exp-01-21": "G-Mini Flash"
+}
+
+def get_model_nickname(model_name):
+    """
+    Returns a tuple of (model_name, nickname).
+    If a nickname is not predefined, it defaults to the model name.
+    """
+    return (model_name, MODEL_NICKNAMES.get(model_name, model_name))
+
+def get_random_model_name():
+    """
+    Returns a random model name from a predefined list of models.
+    """
+    models = list(MODEL_NICKNAMES.keys())
+    return random.choice(models)
+
+def get_model_weights(stats, exploration=MODEL_EXPLORATION_FLOOR, min_samples=MODEL_MIN_SAMPLES):
+    """
+    Returns the probability of picking each model given its recent stats.
+
+    A model's score is its success rate squared divided by its p90 latency, so
+    slow and failing models both lose traffic. Models with fewer than min_samples
+    calls get the best observed score so they are tried. The exploration share
+    is split evenly across all models, so none ever drops to zero.
+
+    Args:
+        stats (dict): Model name to a summary with "calls", "failure_rate" and
+                      "latency_p90", as served by the agent's /model_stats.
+        exploration (float): Fraction of picks made uniformly, between 0 and 1.
+        min_samples (int): Calls needed before a model's stats are trusted.
+
+    Returns:
+        dict: Model name to probability, summing to 1.
+    """
+    models = list(MODEL_NICKNAMES.keys())
+    scores = {}
+    for model in models:
+        summary = stats.get(model)
+        if not summary or summary.get("calls", 0) < min_samples:
+            continue
+        success = 1.0 - summary.get("failure_rate", 0.0)
+        latency = summary.get("latency_p90") or 0.0
+        scores[model] = success * success / latency if latency > 0 else 0.0
+    unknown = max(scores.values(), default=0.0) or 1.0
+    scores = {model: scores.get(model, unknown) for model in models}
+    total = sum(scores.values())
+    if total <= 0:
+        exploration = 1.0
+    return {
+        model: exploration / len(models) + (1 - exploration) * (scores[model] / total if total > 0 else 0.0)
+        for model in models
+    }
+
+def get_weighted_model_name(stats, exploration=MODEL_EXPLORATION_FLOOR):
+    """
+    Returns a model name chosen by get_model_weights, or a uniform random one
+    when no stats are available.
+    """
+    if not stats:
+        return get_random_model_name()
+    weights = get_model_weights(stats, exploration)
+    return random.choices(list(weights), weights=list(weights.values()))[0]
+
+# Example usage:
+if __name__ == "__main__":
+    model_name = get_random_model_name()
+    print(get_model_nickname(model_name))
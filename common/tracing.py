@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import functools
+import contextlib
+import contextvars
+import httpx
+
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "")  # file:///path/traces.jsonl, a Zipkin URL like http://zipkin:9411, or empty to disable
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))  # Share of new traces recorded; continued traces follow the caller
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "100"))  # Finished spans buffered before an export
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", "5"))  # Seconds a finished span may wait for export
+
+# Attributes every child span copies from its parent, so any span of a song's trace can be found by them
+INHERITED_ATTRIBUTES = ("generation_uuid", "station", "model_name")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    def __init__(self, name, trace_id, parent_id=None, sampled=True, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    @property
+    def traceparent(self):
+        """The W3C traceparent header value that continues this span's trace."""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+    def to_zipkin(self, service_name):
+        tags = {key: str(value) for key, value in self.attributes.items() if value is not None}
+        if self.error:
+            tags["error"] = self.error
+        span = {
+            "traceId": self.trace_id,
+            "id": self.span_id,
+            "name": self.name,
+            "timestamp": int(self.started_at * 1e6),
+            "duration": max(1, int(self.duration * 1e6)),
+            "localEndpoint": {"serviceName": service_name},
+            "tags": tags
+        }
+        if self.parent_id:
+            span["parentId"] = self.parent_id
+        return span
+
+def parse_traceparent(traceparent):
+    """
+    Returns (trace_id, parent_span_id, sampled) from a W3C traceparent value, or
+    None if it is missing or malformed.
+    """
+    parts = (traceparent or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(int(parts[3], 16) & 1)
+
+class SpanExporter:
+    """
+    Buffers finished spans and writes them in batches as Zipkin v2 JSON: one
+    span per line to a file, or POSTed to a collector's /api/v2/spans.
+
+    Exports run as background tasks on the event loop, so a slow collector
+    never holds up the request being traced; if the buffer grows past ten
+    batches, the oldest spans are dropped.
+
+    Args:
+        target (str): file:///path or the collector's base URL.
+        service_name (str): Reported as every span's localEndpoint.
+    """
+    def __init__(self, target, service_name, batch_size=TRACE_BATCH_SIZE, flush_interval=TRACE_FLUSH_INTERVAL):
+        self.target = target
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._buffer = []
+        self._flush_task = None
+        self._client = None
+
+    def export(self, span):
+        self._buffer.append(span.to_zipkin(self.service_name))
+        if len(self._buffer) > 10 * self.batch_size:
+            self.dropped += len(self._buffer) - 10 * self.batch_size
+            del self._buffer[:len(self._buffer) - 10 * self.batch_size]
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_soon())
+
+    async def _flush_soon(self):
+        if len(self._buffer) < self.batch_size:
+            await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self):
+        while self._buffer:
+            batch, self._buffer = self._buffer[:self.batch_size], self._buffer[self.batch_size:]
+            try:
+                if self.target.startswith("file://"):
+                    await asyncio.to_thread(self._write_file, self.target[len("file://"):], batch)
+                else:
+                    await self._post(batch)
+            except Exception as e:
+                logging.warning(f"Exporting {len(batch)} spans to {self.target} failed: {e}")
+
+    def _write_file(self, path, batch):
+        with open(path, "a") as file:
+            file.write("".join(json.dumps(span) + "\n" for span in batch))
+
+    async def _post(self, batch):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=10)
+        response = await self._client.post(f"{self.target.rstrip('/')}/api/v2/spans", json=batch)
+        response.raise_for_status()
+
+    async def close(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        if self._client is not None:
+            await self._client.aclose()
+
+_exporter = None
+
+def configure(service_name, target=TRACE_EXPORT):
+    """
+    Turns tracing on for this process, exporting to target. Without a target,
+    spans are still created and propagated but never recorded.
+    """
+    global _exporter
+    _exporter = SpanExporter(target, service_name) if target else None
+
+def current_span():
+    return _current_span.get()
+
+def current_traceparent():
+    """The traceparent to send along with an outgoing request, or "" outside a trace."""
+    span = _current_span.get()
+    return span.traceparent if span is not None else ""
+
+def set_attribute(key, value):
+    """Sets an attribute on the current span, if there is one."""
+    span = _current_span.get()
+    if span is not None:
+        span.set_attribute(key, value)
+
+@contextlib.contextmanager
+def start_span(name, traceparent=None, **attributes):
+    """
+    Opens a span as a child of the current one. traceparent continues a trace
+    started in another process instead (the agent handlers receive it in the
+    request body). With neither, a new trace is started.
+
+    Yields:
+        Span: The open span; attributes can be added to it.
+    """
+    parent = _current_span.get()
+    remote = parse_traceparent(traceparent)
+    if remote is not None:
+        trace_id, parent_id, sampled = remote
+    elif parent is not None:
+        trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        attributes = {**{key: parent.attributes[key] for key in INHERITED_ATTRIBUTES if key in parent.attributes},
+                      **attributes}
+    else:
+        trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+        sampled = random.random() < TRACE_SAMPLE_RATE
+    span = Span(name, trace_id, parent_id, sampled, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        span.finish()
+        if span.sampled and _exporter is not None:
+            _exporter.export(span)
+
+def traced(name=None, **attributes):
+    """
+    Decorates a coroutine function to run inside a span named after it.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with start_span(name or fn.__name__, **attributes):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+async def shutdown():
+    """Exports any spans still buffered. Call before the event loop stops."""
+    if _exporter is not None:
+        await _exporter.close()